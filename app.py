@@ -4,6 +4,7 @@
 Interfaz visual para generar videos faceless.
 
 EJECUTAR:
+  python worker.py        (en otra terminal: corre los trabajos en segundo plano)
   streamlit run app.py
 
 REQUISITOS:
@@ -19,6 +20,20 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+from modules.job_queue import ColaJobs, PENDIENTE, CORRIENDO, TERMINADO, ERROR
+
+# Cada cuánto se consulta el progreso del trabajo en curso
+POLL_SEGUNDOS = 1.0
+
+# Etapas del pipeline en el orden en que se muestran
+ETAPAS = [
+    ("script", "Script"),
+    ("edl", "EDL"),
+    ("imagenes", "Imágenes"),
+    ("audio", "Audio"),
+    ("video", "Video"),
+]
+
 # === Página ===
 st.set_page_config(
     page_title="FacelessAI",
@@ -86,6 +101,8 @@ if "script" not in st.session_state:
     st.session_state.script = None
 if "edl" not in st.session_state:
     st.session_state.edl = None
+if "cambios" not in st.session_state:
+    st.session_state.cambios = None
 if "imagenes" not in st.session_state:
     st.session_state.imagenes = []
 if "audio" not in st.session_state:
@@ -94,23 +111,63 @@ if "video" not in st.session_state:
     st.session_state.video = None
 if "step" not in st.session_state:
     st.session_state.step = 0
+if "job_id" not in st.session_state:
+    # Recuperar el trabajo en curso después de un refresh del navegador
+    st.session_state.job_id = st.query_params.get("job")
+if "etapas" not in st.session_state:
+    st.session_state.etapas = {}
+
+
+@st.cache_resource
+def obtener_cola() -> ColaJobs:
+    return ColaJobs()
+
+
+cola = obtener_cola()
+
+
+def sincronizar_job():
+    """
+    Trae el progreso del trabajo en curso y vuelca en session_state el
+    resultado de cada etapa apenas termina.
+
+    Returns:
+        dict del trabajo o None si no hay ninguno
+    """
+    job_id = st.session_state.job_id
+    if not job_id:
+        return None
+    
+    job = cola.obtener(job_id)
+    if job is None:
+        st.session_state.job_id = None
+        return None
+    
+    for etapa, info in job["etapas"].items():
+        st.session_state.etapas[etapa] = info["estado"]
+        if info["estado"] == TERMINADO and info["resultado"] is not None:
+            st.session_state[etapa] = info["resultado"]
+    
+    st.session_state.step = sum(
+        1 for etapa, _ in ETAPAS if st.session_state.etapas.get(etapa) == TERMINADO
+    )
+    return job
+
+
+job = sincronizar_job()
 
 
 # === Sidebar ===
 with st.sidebar:
     st.title("⚙️ Configuración")
     
+    # Los trabajos corren en el worker con las keys del .env del servidor
     st.subheader("🔑 API Keys")
-    openai_key = st.text_input(
-        "OpenAI API Key", 
-        value=os.getenv("OPENAI_API_KEY", ""),
-        type="password",
-    )
-    elevenlabs_key = st.text_input(
-        "ElevenLabs Key (opcional)",
-        value=os.getenv("ELEVENLABS_API_KEY", ""),
-        type="password",
-    )
+    openai_key = os.getenv("OPENAI_API_KEY", "") not in ("", "sk-tu-key-aqui")
+    elevenlabs_key = bool(os.getenv("ELEVENLABS_API_KEY"))
+    st.markdown(f"{'✅' if openai_key else '❌'} OpenAI  \n"
+                f"{'✅' if elevenlabs_key else '➖'} ElevenLabs (opcional)")
+    st.caption("Se configuran en el .env del servidor que corre `python worker.py`")
     
     st.divider()
     
@@ -148,20 +205,45 @@ with st.sidebar:
     
     st.subheader("🛠️ Opciones")
     usar_dalle = st.toggle("Usar DALL-E (cuesta ~$0.04/img)", value=True)
-    usar_elevenlabs = st.toggle("Usar ElevenLabs", value=bool(elevenlabs_key))
+    usar_elevenlabs = st.toggle("Usar ElevenLabs", value=elevenlabs_key, disabled=not elevenlabs_key)
+    cache_llm = st.toggle(
+        "Reusar respuestas del LLM (cache)",
+        value=True,
+        help="Desactivalo para forzar output creativo nuevo",
+    )
+    cache_render = st.toggle(
+        "Reusar segmentos ya renderizados (cache)",
+        value=True,
+        help="Al regenerar, solo se re-renderizan los segmentos que cambiaron",
+    )
+    director_edl = st.radio(
+        "Guía de edición",
+        ["llm", "combinado", "local+llm", "local"],
+        format_func=lambda d: {
+            "llm": "GPT-4o",
+            "combinado": "GPT-4o junto con el guión (1 llamada)",
+            "local+llm": "Reglas + GPT-4o",
+            "local": "Reglas (instantánea, gratis)",
+        }[d],
+        help="Las reglas arman la EDL desde los cues del guión sin llamar al LLM",
+    )
+    perfil_render = st.radio(
+        "Calidad de render",
+        ["final", "draft"],
+        format_func=lambda p: {
+            "final": "Final (1080x1920, 30fps)",
+            "draft": "Borrador rápido (540x960, 15fps)",
+        }[p],
+        horizontal=True,
+    )
     
     st.divider()
     
     # Progreso
     st.subheader("📊 Progreso")
-    steps = ["Script", "EDL", "Imágenes", "Audio", "Video"]
-    for i, step_name in enumerate(steps):
-        if i < st.session_state.step:
-            st.markdown(f"✅ {step_name}")
-        elif i == st.session_state.step:
-            st.markdown(f"🔄 {step_name}")
-        else:
-            st.markdown(f"⬜ {step_name}")
+    iconos = {TERMINADO: "✅", CORRIENDO: "🔄", ERROR: "❌"}
+    for etapa, step_name in ETAPAS:
+        st.markdown(f"{iconos.get(st.session_state.etapas.get(etapa), '⬜')} {step_name}")
 
 
 # === Header ===
@@ -188,115 +270,84 @@ with col3:
     solo_edl = st.button("🎬 Solo EDL", use_container_width=True, disabled=not st.session_state.script)
 
 
-# === Funciones de generación ===
-def gen_script():
-    """Genera el script."""
-    if not openai_key:
-        st.error("❌ Necesitás la API key de OpenAI")
-        return
-    
-    os.environ["OPENAI_API_KEY"] = openai_key
-    
-    from modules.script_generator import generar_script
-    
-    with st.spinner("📝 Generando guión..."):
-        script = generar_script(
-            tema=tema,
-            duracion=duracion,
-            estilo=estilo,
-            tono=tono,
-            plataforma=plataforma,
-        )
-    
-    st.session_state.script = script
-    st.session_state.step = 1
-    return script
+# === Trabajos en segundo plano ===
+trabajando = bool(job and job["estado"] in (PENDIENTE, CORRIENDO))
 
 
-def gen_edl(script):
-    """Genera la EDL."""
-    from modules.editing_director import generar_edl
-    
-    with st.spinner("🎬 Analizando edición..."):
-        edl = generar_edl(script)
+def encolar(tipo: str, params: dict, limpiar: tuple = ()):
+    """
+    Manda un trabajo al worker y lo deja como trabajo en curso de la sesión.
     
-    st.session_state.edl = edl
-    st.session_state.step = 2
-    return edl
-
-
-def gen_imagenes(script):
-    """Genera imágenes."""
-    if usar_dalle:
-        from modules.image_generator import generar_imagenes_del_script
-        with st.spinner(f"🖼️ Generando {len(script.get('segmentos', []))} imágenes con DALL-E..."):
-            imagenes = generar_imagenes_del_script(script, "assets/images")
-    else:
-        from modules.image_generator import generar_placeholder
-        imagenes = []
-        with st.spinner("🖼️ Generando placeholders..."):
-            for seg in script.get("segmentos", []):
-                img = generar_placeholder(
-                    texto=seg.get("visual_prompt", "")[:80],
-                    filename=f"seg_{seg['id']:02d}",
-                )
-                imagenes.append(img)
+    Args:
+        tipo: "pipeline", "script", "edl" o "refinar"
+        params: Parámetros del trabajo
+        limpiar: Resultados de session_state que el trabajo va a reemplazar
+    """
+    for clave in limpiar:
+        st.session_state[clave] = [] if clave == "imagenes" else None
+    st.session_state.etapas = {}
+    st.session_state.step = 0
     
-    st.session_state.imagenes = imagenes
-    st.session_state.step = 3
-    return imagenes
-
-
-def gen_audio(script):
-    """Genera audio."""
-    if usar_elevenlabs and elevenlabs_key:
-        os.environ["ELEVENLABS_API_KEY"] = elevenlabs_key
+    job_id = cola.encolar(tipo, params)
+    st.session_state.job_id = job_id
+    st.query_params["job"] = job_id
+    st.rerun()
+
+
+if not openai_key and (generar_todo or solo_script):
+    st.error("❌ Falta la OPENAI_API_KEY en el .env del servidor")
+elif trabajando and (generar_todo or solo_script or solo_edl):
+    st.warning("⏳ Ya hay un trabajo en curso, esperá a que termine")
+else:
+    if solo_script and tema:
+        encolar("script", {
+            "tema": tema,
+            "duracion": duracion,
+            "estilo": estilo,
+            "tono": tono,
+            "plataforma": plataforma,
+            "usar_cache": cache_llm,
+        }, limpiar=("script", "cambios"))
     
-    from modules.audio_generator import generar_audio_del_script
+    if solo_edl and st.session_state.script:
+        encolar("edl", {
+            "script": st.session_state.script,
+            "usar_cache": cache_llm,
+            "director": director_edl,
+        }, limpiar=("edl",))
     
-    with st.spinner("🎙️ Generando narración..."):
-        audios = generar_audio_del_script(
-            script=script,
-            usar_elevenlabs=usar_elevenlabs and bool(elevenlabs_key),
+    if generar_todo and tema:
+        encolar("pipeline", {
+            "tema": tema,
+            "duracion": duracion,
+            "estilo": estilo,
+            "tono": tono,
+            "plataforma": plataforma,
+            "usar_dalle": usar_dalle,
+            "usar_elevenlabs": usar_elevenlabs and elevenlabs_key,
+            "perfil_render": perfil_render,
+            "usar_cache_llm": cache_llm,
+            "usar_cache_render": cache_render,
+            "director_edl": director_edl,
+        }, limpiar=("script", "cambios", "edl", "imagenes", "audio", "video"))
+
+
+# --- Estado del trabajo en curso ---
+if job:
+    if job["estado"] == PENDIENTE:
+        st.info(
+            f"⏳ Trabajo en cola ({job['posicion']} adelante). "
+            "Si no arranca, revisá que `python worker.py` esté corriendo."
         )
-    
-    st.session_state.audio = audios
-    st.session_state.step = 4
-    return audios
-
-
-def gen_video(script, imagenes, audio_path, edl):
-    """Ensambla video."""
-    from modules.video_assembler import ensamblar_video
-    
-    with st.spinner("🎥 Ensamblando video con motions..."):
-        video = ensamblar_video(
-            script=script,
-            imagenes=imagenes,
-            audio_path=audio_path,
-            edl=edl,
+    elif job["estado"] == CORRIENDO:
+        en_curso = [nombre for etapa, nombre in ETAPAS if st.session_state.etapas.get(etapa) == CORRIENDO]
+        total = len(ETAPAS) if job["tipo"] == "pipeline" else 1
+        st.progress(
+            min(st.session_state.step / total, 1.0),
+            text=f"🔄 {', '.join(en_curso) or 'Arrancando'}...",
         )
-    
-    st.session_state.video = video
-    st.session_state.step = 5
-    return video
-
-
-# === Ejecutar ===
-if solo_script and tema:
-    gen_script()
-
-if solo_edl and st.session_state.script:
-    gen_edl(st.session_state.script)
-
-if generar_todo and tema:
-    script = gen_script()
-    if script:
-        edl = gen_edl(script)
-        imagenes = gen_imagenes(script)
-        audios = gen_audio(script)
-        if imagenes and audios:
-            video = gen_video(script, imagenes, audios["completo"], edl)
+    elif job["estado"] == ERROR:
+        st.error(f"❌ El trabajo falló: {job['error']}")
 
 
 # === Mostrar Resultados ===
@@ -319,13 +370,22 @@ if st.session_state.script:
                 st.code(seg.get("visual_prompt", ""), language=None)
                 st.caption(f"Motion: {seg.get('motion', 'N/A')}")
         
+        # Qué tocó el último refinamiento
+        cambios = st.session_state.cambios
+        if cambios and cambios.get("segmentos"):
+            st.caption(
+                f"🔄 Último refinamiento: cambiaron los segmentos {', '.join(map(str, cambios['segmentos']))} "
+                f"(imágenes a regenerar: {len(cambios['imagenes'])}, audios: {len(cambios['audio'])})"
+            )
+        
         # Botón de refinamiento
         feedback = st.text_input("🔄 ¿Querés cambiar algo del guión?", placeholder="Ej: hacelo más dramático")
-        if feedback and st.button("Refinar"):
-            from modules.script_generator import refinar_script
-            with st.spinner("Refinando..."):
-                st.session_state.script = refinar_script(script, feedback)
-            st.rerun()
+        if feedback and st.button("Refinar", disabled=trabajando):
+            encolar("refinar", {
+                "script": script,
+                "feedback": feedback,
+                "usar_cache": cache_llm,
+            }, limpiar=("cambios",))
 
 # --- EDL ---
 if st.session_state.edl:
@@ -421,3 +481,9 @@ if st.session_state.video:
 # === Footer ===
 st.divider()
 st.caption("🎬 FacelessAI — Hecho con IA para creadores de contenido")
+
+
+# === Polling del trabajo en curso ===
+if trabajando:
+    time.sleep(POLL_SEGUNDOS)
+    st.rerun()
@@ -0,0 +1,300 @@
+"""
+🎬 FacelessAI — Modo Batch
+==========================
+Genera muchos videos a partir de un archivo de temas (CSV o JSONL),
+corriendo varios pipeline() a la vez con límites globales por recurso.
+
+USO:
+  python batch.py temas.csv
+  python batch.py temas.jsonl --jobs 4 --llm 4 --imagenes 2 --tts 2 --cpu 1
+
+FORMATO:
+  CSV con encabezado o JSONL (un objeto por línea) con las columnas:
+    tema (obligatoria), duracion, estilo, tono, plataforma
+  Las columnas vacías usan los defaults de pipeline().
+
+Cada video se genera en su propia carpeta (<output>/<NNN>_<tema>/), que es
+también su run id: si el batch se corta, volver a correrlo con el mismo
+archivo y --output retoma cada video desde su último checkpoint. Al
+final se imprime el throughput (videos/hora) y la utilización de cada
+recurso. El resumen también queda en <output>/batch_resumen.json.
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from main import pipeline, LIMITES_RECURSOS, RECURSOS_POR_REQUEST
+from modules.task_graph import Cupo
+
+
+CAMPOS_PIPELINE = ("tema", "duracion", "estilo", "tono", "plataforma")
+
+
+def leer_temas(path: str) -> list:
+    """
+    Lee el archivo de temas (CSV o JSONL, según la extensión).
+
+    Returns:
+        Lista de dicts con los kwargs de pipeline() de cada video
+    """
+
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            filas = [json.loads(linea) for linea in f if linea.strip()]
+        else:
+            filas = list(csv.DictReader(f))
+
+    trabajos = []
+    for n, fila in enumerate(filas, 1):
+        trabajo = {
+            k: v for k, v in fila.items()
+            if k in CAMPOS_PIPELINE and v not in (None, "")
+        }
+        if not trabajo.get("tema"):
+            print(f"⚠️  Fila {n} sin tema, saltando...")
+            continue
+        if "duracion" in trabajo:
+            trabajo["duracion"] = int(trabajo["duracion"])
+        trabajos.append(trabajo)
+
+    return trabajos
+
+
+def nombre_carpeta(indice: int, tema: str) -> str:
+    """Carpeta aislada de cada video: 001_mi_tema."""
+    slug = unicodedata.normalize("NFKD", tema).encode("ascii", "ignore").decode()
+    slug = re.sub(r"[^a-zA-Z0-9]+", "_", slug).strip("_").lower()[:40]
+    return f"{indice:03d}_{slug or 'video'}"
+
+
+def calcular_utilizacion(resultados: list, limites: dict, duracion_total: float,
+                         cupos: dict = None) -> dict:
+    """
+    Utilización de cada recurso: tiempo ocupado / (tiempo total × cupos).
+
+    El tiempo ocupado sale de los Cupo compartidos si se pasan (para
+    imágenes y TTS es la suma de los requests, no de las etapas); si no,
+    de la duración de las etapas que usaron cada recurso.
+
+    Args:
+        resultados: Resultados de pipeline() (con "etapas")
+        limites: Cupos por recurso
+        duracion_total: Duración total del batch en segundos
+        cupos: dict recurso -> Cupo usado en el batch (opcional)
+
+    Returns:
+        dict recurso -> {"cupos", "ocupado_s", "utilizacion", "por_request",
+                         "etapas": {nombre: {...}}}
+    """
+
+    cupos = cupos or {}
+    utilizacion = {}
+    for recurso, n in limites.items():
+        utilizacion[recurso] = {
+            "cupos": n, "ocupado_s": 0.0, "por_request": recurso in RECURSOS_POR_REQUEST,
+            "etapas": {},
+        }
+
+    for resultado in resultados:
+        for etapa, t in resultado.get("etapas", {}).items():
+            if "duracion" not in t:
+                continue
+            recurso = utilizacion.setdefault(
+                t["recurso"] or "-",
+                {"cupos": None, "ocupado_s": 0.0, "por_request": False, "etapas": {}},
+            )
+            recurso["ocupado_s"] += t["duracion"]
+            stats = recurso["etapas"].setdefault(etapa, {"cantidad": 0, "total_s": 0.0})
+            stats["cantidad"] += 1
+            stats["total_s"] += t["duracion"]
+
+    for nombre, recurso in utilizacion.items():
+        cupo = cupos.get(nombre)
+        if isinstance(cupo, Cupo):
+            recurso["ocupado_s"] = cupo.ocupado_s
+            recurso["usos"] = cupo.usos
+        for stats in recurso["etapas"].values():
+            stats["promedio_s"] = stats["total_s"] / stats["cantidad"]
+        if recurso["cupos"] and duracion_total > 0:
+            recurso["utilizacion"] = recurso["ocupado_s"] / (duracion_total * recurso["cupos"])
+        else:
+            recurso["utilizacion"] = None
+
+    return utilizacion
+
+
+def imprimir_resumen(resumen: dict):
+    """Muestra el throughput y la utilización por recurso."""
+
+    print("\n" + "=" * 60)
+    print("📊 RESUMEN DEL BATCH")
+    print("=" * 60)
+    print(f"   Videos OK: {resumen['ok']}/{resumen['total']}  |  Fallidos: {resumen['fallidos']}")
+    print(f"   Tiempo total: {resumen['duracion_s']:.1f}s")
+    print(f"   Throughput: {resumen['videos_por_hora']:.1f} videos/hora")
+
+    print("\n   Recurso    Cupos  Ocupado   Utilización")
+    for nombre, r in resumen["utilizacion"].items():
+        util = f"{r['utilizacion'] * 100:5.1f}%" if r["utilizacion"] is not None else "   - "
+        detalle = f"  ({r['usos']} requests)" if r.get("por_request") and "usos" in r else ""
+        print(f"   {nombre:<10} {r['cupos'] or '-':>5}  {r['ocupado_s']:6.1f}s   {util}{detalle}")
+        for etapa, stats in r["etapas"].items():
+            print(f"      └ {etapa:<10} x{stats['cantidad']}  promedio {stats['promedio_s']:.1f}s")
+
+    for error in resumen["errores"]:
+        print(f"\n   ❌ {error['carpeta']}: {error['error']}")
+
+
+def correr_batch(
+    trabajos: list,
+    output_dir: str = "assets/batch",
+    max_jobs: int = 2,
+    limites: dict = None,
+    usar_dalle: bool = True,
+    usar_elevenlabs: bool = True,
+    perfil_render: str = "final",
+    streaming: bool = False,
+    director_edl: str = None,
+    usar_cache_render: bool = None,
+) -> dict:
+    """
+    Corre pipeline() para cada trabajo, varios a la vez.
+
+    Los límites por recurso son globales: todos los pipelines comparten los
+    mismos semáforos, así nunca hay más de N etapas de LLM o de render, ni
+    más de N requests a DALL-E o al TTS en vuelo en total, sin importar
+    cuántos videos estén en curso.
+
+    Args:
+        trabajos: Lista de kwargs de pipeline() (output de leer_temas)
+        output_dir: Carpeta base; cada video va a su propia subcarpeta
+                    (run id con checkpoints, así re-correr el batch reanuda)
+        max_jobs: Videos en curso a la vez
+        limites: Cupos globales por recurso (default: LIMITES_RECURSOS)
+        usar_dalle: True para DALL-E, False para placeholders
+        usar_elevenlabs: True para ElevenLabs, False para gTTS
+        perfil_render: "final" o "draft"
+        streaming: Prefetch de assets durante el guión (sus requests también
+                   ocupan los cupos de imágenes y TTS)
+        director_edl: "llm", "local", "local+llm" o "combinado" (default: EDL_DIRECTOR)
+        usar_cache_render: Reutiliza segmentos ya renderizados al re-correr
+                           (default: RENDER_CACHE)
+
+    Returns:
+        dict resumen (también se guarda en <output_dir>/batch_resumen.json)
+    """
+
+    limites = dict(limites or LIMITES_RECURSOS)
+    semaforos = {r: Cupo(n) for r, n in limites.items()}
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"\n🎬 Batch: {len(trabajos)} videos, {max_jobs} a la vez")
+    print(f"   Cupos globales: {limites}")
+
+    def correr(indice, trabajo):
+        carpeta = nombre_carpeta(indice, trabajo["tema"])
+        try:
+            resultado = pipeline(
+                **trabajo,
+                usar_dalle=usar_dalle,
+                usar_elevenlabs=usar_elevenlabs,
+                output_dir=output_dir,
+                run_id=carpeta,
+                perfil_render=perfil_render,
+                streaming=streaming,
+                director_edl=director_edl,
+                usar_cache_render=usar_cache_render,
+                recursos=semaforos,
+            )
+            return carpeta, resultado, None
+        except Exception as e:
+            print(f"\n❌ Falló '{trabajo['tema']}': {e}")
+            return carpeta, None, e
+
+    inicio = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, max_jobs)) as pool:
+        futuros = [pool.submit(correr, i, t) for i, t in enumerate(trabajos, 1)]
+        salidas = [f.result() for f in futuros]
+    duracion_total = time.time() - inicio
+
+    resultados = [r for _, r, _ in salidas if r is not None]
+    errores = [
+        {"carpeta": carpeta, "error": str(e)}
+        for carpeta, _, e in salidas if e is not None
+    ]
+
+    resumen = {
+        "total": len(trabajos),
+        "ok": len(resultados),
+        "fallidos": len(errores),
+        "duracion_s": duracion_total,
+        "videos_por_hora": len(resultados) / duracion_total * 3600 if duracion_total > 0 else 0.0,
+        "utilizacion": calcular_utilizacion(resultados, limites, duracion_total, semaforos),
+        "videos": [
+            {"carpeta": carpeta, "video": r.get("video"), "etapas": r.get("etapas")}
+            for carpeta, r, _ in salidas if r is not None
+        ],
+        "errores": errores,
+    }
+
+    with open(os.path.join(output_dir, "batch_resumen.json"), "w", encoding="utf-8") as f:
+        json.dump(resumen, f, ensure_ascii=False, indent=2)
+
+    imprimir_resumen(resumen)
+    return resumen
+
+
+# === CLI ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera muchos videos desde un archivo de temas")
+    parser.add_argument("temas", help="CSV o JSONL con tema, duracion, estilo, tono, plataforma")
+    parser.add_argument("--output", default="assets/batch", help="Carpeta base de salida")
+    parser.add_argument("--jobs", type=int, default=2, help="Videos en curso a la vez")
+    parser.add_argument("--llm", type=int, default=LIMITES_RECURSOS["llm"], help="Etapas de LLM simultáneas")
+    parser.add_argument("--imagenes", type=int, default=LIMITES_RECURSOS["imagenes"], help="Requests a DALL-E en vuelo (global)")
+    parser.add_argument("--tts", type=int, default=LIMITES_RECURSOS["tts"], help="Requests de TTS en vuelo (global)")
+    parser.add_argument("--cpu", type=int, default=LIMITES_RECURSOS["cpu"], help="Renders simultáneos")
+    parser.add_argument("--sin-dalle", action="store_true", help="Usar placeholders en vez de DALL-E")
+    parser.add_argument("--gtts", action="store_true", help="Usar gTTS en vez de ElevenLabs")
+    parser.add_argument("--draft", action="store_true", help="Render borrador (540x960, 15fps)")
+    parser.add_argument("--streaming", action="store_true", help="Prefetch de assets durante el guión")
+    parser.add_argument("--director", choices=("llm", "local", "local+llm", "combinado"),
+                        help="Director de edición (default: EDL_DIRECTOR)")
+    parser.add_argument("--cache-render", action="store_true",
+                        help="Al re-correr, re-renderizar solo los segmentos que cambiaron")
+    args = parser.parse_args()
+
+    if not os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY") == "sk-tu-key-aqui":
+        print("❌ Configurá tu OPENAI_API_KEY en el archivo .env")
+        sys.exit(1)
+
+    trabajos = leer_temas(args.temas)
+    if not trabajos:
+        print("❌ El archivo no tiene temas")
+        sys.exit(1)
+
+    resumen = correr_batch(
+        trabajos,
+        output_dir=args.output,
+        max_jobs=args.jobs,
+        limites={"llm": args.llm, "imagenes": args.imagenes, "tts": args.tts, "cpu": args.cpu},
+        usar_dalle=not args.sin_dalle,
+        usar_elevenlabs=not args.gtts,
+        perfil_render="draft" if args.draft else "final",
+        streaming=args.streaming,
+        director_edl=args.director,
+        usar_cache_render=args.cache_render or None,
+    )
+
+    sys.exit(0 if resumen["fallidos"] == 0 else 1)
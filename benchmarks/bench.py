@@ -0,0 +1,467 @@
+"""
+🎬 FacelessAI — Benchmarks offline
+==================================
+Mide el rendimiento del pipeline sin salir a internet: OpenAI y ElevenLabs
+se reemplazan por los fakes de benchmarks/fakes.py (guiones y EDLs
+enlatados, imágenes placeholder, audio sintético y latencia configurable).
+
+USO:
+  python -m benchmarks.bench
+  python -m benchmarks.bench --suites motion,ensamblar --perfil final
+  python -m benchmarks.bench --niveles 1,2,4,8 --videos 8 --latencia-imagen 2
+  python -m benchmarks.bench --comparar benchmarks/resultados/bench_base.json
+
+SUITES:
+  motion      fps de aplicar_motion por tipo de motion (solo generación de frames)
+  ensamblar   tiempo de ensamblar_video por backend (pipe, ffmpeg, pipe paralelo)
+  rss         pico de memoria (RSS, proceso + hijos) por etapa del pipeline
+  throughput  videos/hora de punta a punta con batch a distintos niveles de concurrencia
+
+Los resultados se guardan como JSON en benchmarks/resultados/ con los datos
+de la máquina y el commit, así dos corridas se pueden comparar con
+--comparar. Todas las caches (LLM, imágenes, TTS, segmentos) y las trazas
+van a una carpeta temporal, salvo que se pase --con-cache.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+
+SUITES = ("motion", "ensamblar", "rss", "throughput")
+RESULTADOS_DIR = os.path.join(RAIZ, "benchmarks", "resultados")
+
+
+def preparar_entorno(workdir: str, con_cache: bool = False, rpm: int = 0):
+    """
+    Configura el entorno antes de importar los módulos (leen las variables
+    al importarse): caches y trazas aisladas en workdir y keys de mentira.
+    """
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("ELEVENLABS_API_KEY", "fake")
+    os.environ["IMAGE_REQUESTS_PER_MINUTE"] = str(rpm)
+    os.environ["TRACE_DIR"] = os.path.join(workdir, "traces")
+    if not con_cache:
+        os.environ["LLM_CACHE"] = "0"
+        os.environ["IMAGE_CACHE_DIR"] = os.path.join(workdir, "cache", "imagenes")
+        os.environ["TTS_CACHE_DIR"] = os.path.join(workdir, "cache", "tts")
+        os.environ["RENDER_CACHE_DIR"] = os.path.join(workdir, "cache", "segmentos")
+
+
+@contextlib.contextmanager
+def silencio(activo: bool = True):
+    """Oculta los prints del pipeline durante una medición."""
+    if not activo:
+        yield
+        return
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        yield
+
+
+# === Memoria ===
+_PAGINA = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _rss(pid: int) -> int:
+    """RSS de un proceso en bytes (0 si ya no existe)."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGINA
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def _descendientes(pid: int) -> list:
+    hijos = []
+    try:
+        tareas = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return hijos
+    for tarea in tareas:
+        try:
+            with open(f"/proc/{pid}/task/{tarea}/children") as f:
+                directos = [int(p) for p in f.read().split()]
+        except OSError:
+            continue
+        for hijo in directos:
+            hijos.append(hijo)
+            hijos.extend(_descendientes(hijo))
+    return hijos
+
+
+class MuestreadorRSS:
+    """
+    Muestrea en un thread el RSS del proceso y de todos sus hijos (ffmpeg,
+    workers de render). Sin /proc (macOS, Windows) solo queda el pico del
+    proceso según getrusage.
+
+    Args:
+        intervalo: Segundos entre muestras
+    """
+
+    def __init__(self, intervalo: float = 0.05):
+        self.intervalo = intervalo
+        self.muestras = []  # (t, rss_proceso, rss_total)
+        self.con_proc = os.path.exists(f"/proc/{os.getpid()}/statm")
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _loop(self):
+        pid = os.getpid()
+        while not self._parar.is_set():
+            propio = _rss(pid)
+            total = propio + sum(_rss(h) for h in _descendientes(pid))
+            self.muestras.append((time.perf_counter(), propio, total))
+            self._parar.wait(self.intervalo)
+
+    def __enter__(self):
+        if self.con_proc:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        if self.con_proc:
+            self._thread.join()
+
+    def pico(self, desde: float = None, hasta: float = None) -> dict:
+        """Pico de RSS (MB) en la ventana [desde, hasta]."""
+        if not self.con_proc:
+            import resource
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            escala = 1 if sys.platform == "darwin" else 1024
+            return {"proceso_mb": round(maxrss * escala / 2**20, 1), "total_mb": None}
+
+        ventana = [
+            m for m in self.muestras
+            if (desde is None or m[0] >= desde) and (hasta is None or m[0] <= hasta)
+        ]
+        if not ventana:
+            return {"proceso_mb": None, "total_mb": None}
+        return {
+            "proceso_mb": round(max(m[1] for m in ventana) / 2**20, 1),
+            "total_mb": round(max(m[2] for m in ventana) / 2**20, 1),
+        }
+
+
+# === Datos sintéticos ===
+def _script_sintetico(segmentos: int, duracion: float) -> dict:
+    from benchmarks.fakes import script_enlatado
+    script = script_enlatado("benchmark de render", int(duracion))
+    dur_seg = duracion / segmentos
+    base = script["segmentos"]
+    script["segmentos"] = []
+    for i in range(segmentos):
+        seg = dict(base[i % len(base)], id=i + 1)
+        seg["tiempo_inicio"] = round(i * dur_seg, 2)
+        seg["tiempo_fin"] = round((i + 1) * dur_seg, 2)
+        script["segmentos"].append(seg)
+    return script
+
+
+def _imagenes_sinteticas(directorio: str, n: int) -> list:
+    from modules.image_generator import generar_placeholder
+    with silencio():
+        return [
+            generar_placeholder(f"Benchmark imagen {i + 1}", directorio, f"img_{i:03d}", size=(1024, 1792))
+            for i in range(n)
+        ]
+
+
+def _audio_sintetico(path: str, segundos: float) -> str:
+    from benchmarks.fakes import audio_sintetico
+    with open(path, "wb") as f:
+        f.write(audio_sintetico(segundos))
+    return path
+
+
+# === Suites ===
+def bench_motion(workdir: str, perfil: str, duracion: float) -> dict:
+    """
+    fps de aplicar_motion para cada motion canónico (sin encode). "static" no
+    genera frames (devuelve la imagen tal cual): queda como línea de base.
+    """
+    from moviepy.editor import ImageClip
+    from modules.motion_engine import MOTION_ALIASES
+    from modules.video_assembler import aplicar_motion, obtener_perfil
+
+    cfg = obtener_perfil(perfil)
+    imagen = _imagenes_sinteticas(os.path.join(workdir, "motion"), 1)[0]
+    motions = sorted(set(MOTION_ALIASES.values())) + ["static"]
+
+    resultados = {}
+    for motion in motions:
+        clip = aplicar_motion(
+            ImageClip(imagen).set_duration(duracion), motion, 1.15,
+            size=(cfg["width"], cfg["height"]),
+        )
+        frames = max(1, int(duracion * cfg["fps"]))
+        t0 = time.perf_counter()
+        for k in range(frames):
+            clip.get_frame(k / cfg["fps"])
+        segundos = time.perf_counter() - t0
+        resultados[motion] = {
+            "frames": frames,
+            "segundos": round(segundos, 4),
+            "fps": round(frames / segundos, 1),
+            "base": motion == "static",
+        }
+        etiqueta = "  (base, sin generar frames)" if motion == "static" else ""
+        print(f"   {motion:<16} {resultados[motion]['fps']:>8.1f} fps{etiqueta}")
+
+    return {"perfil": perfil, "resolucion": f"{cfg['width']}x{cfg['height']}", "motions": resultados}
+
+
+def bench_ensamblar(workdir: str, perfil: str, duracion: float, segmentos: int,
+                    con_moviepy: bool = False, verbose: bool = False) -> dict:
+    """Tiempo de pared de ensamblar_video por backend, sin cache de segmentos."""
+    from modules.video_assembler import ensamblar_video
+
+    directorio = os.path.join(workdir, "ensamblar")
+    script = _script_sintetico(segmentos, duracion)
+    imagenes = _imagenes_sinteticas(directorio, segmentos)
+    audio = _audio_sintetico(os.path.join(directorio, "audio.mp3"), duracion)
+
+    variantes = {
+        "pipe": {"backend": "pipe"},
+        "ffmpeg": {"backend": "ffmpeg"},
+        "pipe_paralelo": {"backend": "pipe", "paralelo": True},
+    }
+    if con_moviepy:
+        variantes["moviepy"] = {"backend": "moviepy"}
+
+    resultados = {}
+    for nombre, opciones in variantes.items():
+        salida = os.path.join(directorio, f"{nombre}.mp4")
+        t0 = time.perf_counter()
+        with silencio(not verbose):
+            ensamblar_video(script, imagenes, audio, output_path=salida,
+                            usar_cache=False, perfil=perfil, **opciones)
+        segundos = time.perf_counter() - t0
+        resultados[nombre] = {
+            "segundos": round(segundos, 3),
+            "tiempo_real_x": round(duracion / segundos, 2),
+            "bytes": os.path.getsize(salida),
+        }
+        print(f"   {nombre:<16} {segundos:>7.2f}s ({resultados[nombre]['tiempo_real_x']}x tiempo real)")
+
+    return {"perfil": perfil, "duracion_video": duracion, "segmentos": segmentos, "backends": resultados}
+
+
+def bench_rss(workdir: str, perfil: str, duracion: int, director: str = None,
+              verbose: bool = False) -> dict:
+    """
+    Pico de RSS por etapa de un pipeline completo. El grafo corre con un solo
+    worker para que las etapas vayan de a una (imágenes y audio no ocupan
+    cupo de etapa, solo sus requests) y cada pico sea atribuible.
+    """
+    from main import pipeline
+
+    ventanas = {}
+
+    def on_evento(evento, etapa, dato):
+        if evento == "inicio":
+            ventanas[etapa] = [time.perf_counter(), None]
+        elif etapa in ventanas:
+            ventanas[etapa][1] = time.perf_counter()
+
+    with MuestreadorRSS() as muestreador, silencio(not verbose):
+        base = muestreador.pico()
+        pipeline(
+            "memoria del pipeline", duracion=duracion,
+            output_dir=os.path.join(workdir, "rss"), perfil_render=perfil,
+            streaming=False, max_etapas=1,
+            director_edl=director, on_evento=on_evento,
+        )
+
+    etapas = {}
+    for etapa, (inicio, fin) in ventanas.items():
+        etapas[etapa] = {"segundos": round((fin or inicio) - inicio, 3), **muestreador.pico(inicio, fin)}
+        print(f"   {etapa:<16} {etapas[etapa]['total_mb'] or etapas[etapa]['proceso_mb']:>8} MB")
+
+    return {
+        "perfil": perfil,
+        "duracion_video": duracion,
+        "con_hijos": muestreador.con_proc,
+        "inicial": base,
+        "etapas": etapas,
+        "pico": muestreador.pico(),
+    }
+
+
+def bench_throughput(workdir: str, perfil: str, duracion: int, niveles: list,
+                     videos: int, director: str = None, verbose: bool = False) -> dict:
+    """Throughput de punta a punta con correr_batch a cada nivel de concurrencia."""
+    from batch import correr_batch
+
+    resultados = {}
+    for nivel in niveles:
+        trabajos = [
+            {"tema": f"throughput nivel {nivel} video {i + 1}", "duracion": duracion}
+            for i in range(videos)
+        ]
+        limites = {"llm": 2 * nivel, "imagenes": nivel, "tts": nivel, "cpu": nivel}
+        with silencio(not verbose):
+            resumen = correr_batch(
+                trabajos, output_dir=os.path.join(workdir, f"throughput_{nivel}"),
+                max_jobs=nivel, limites=limites, perfil_render=perfil,
+                director_edl=director,
+            )
+        resultados[str(nivel)] = {
+            "videos": resumen["total"],
+            "ok": resumen["ok"],
+            "segundos": round(resumen["duracion_s"], 2),
+            "videos_por_hora": round(resumen["videos_por_hora"], 1),
+            "limites": limites,
+            "utilizacion": {
+                r: round(u["utilizacion"], 3) if u.get("utilizacion") is not None else None
+                for r, u in resumen["utilizacion"].items()
+            },
+        }
+        print(f"   concurrencia {nivel:<3} {resultados[str(nivel)]['videos_por_hora']:>8.1f} videos/hora "
+              f"({resumen['ok']}/{resumen['total']} ok)")
+
+    return {"perfil": perfil, "duracion_video": duracion, "niveles": resultados}
+
+
+# === Resultados ===
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def aplanar(datos, prefijo: str = "") -> dict:
+    """Hojas numéricas de un resultado como {"suite.a.b": valor}."""
+    planos = {}
+    if isinstance(datos, dict):
+        for clave, valor in datos.items():
+            planos.update(aplanar(valor, f"{prefijo}{clave}."))
+    elif isinstance(datos, (int, float)) and not isinstance(datos, bool):
+        planos[prefijo.rstrip(".")] = datos
+    return planos
+
+
+def comparar(base: dict, actual: dict):
+    """Imprime la diferencia porcentual de cada métrica presente en ambas corridas."""
+    b = aplanar(base.get("suites", {}))
+    a = aplanar(actual.get("suites", {}))
+    comunes = [k for k in a if k in b]
+
+    print(f"\n📊 Comparación contra {base['meta'].get('commit')} ({base['meta'].get('fecha')})")
+    if not comunes:
+        print("   (sin métricas en común)")
+        return
+    ancho = max(len(k) for k in comunes)
+    for clave in comunes:
+        antes, ahora = b[clave], a[clave]
+        delta = f"{(ahora - antes) / antes * 100:+.1f}%" if antes else "—"
+        print(f"   {clave:<{ancho}} {antes:>12g} → {ahora:<12g} {delta}")
+
+
+# === CLI ===
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks offline de FacelessAI")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Suites a correr ({', '.join(SUITES)})")
+    parser.add_argument("--perfil", default="draft", help="Perfil de render (draft/final)")
+    parser.add_argument("--duracion", type=int, default=16, help="Duración de los videos (segundos)")
+    parser.add_argument("--segmentos", type=int, default=4, help="Segmentos del video de la suite ensamblar")
+    parser.add_argument("--niveles", default="1,2,4", help="Niveles de concurrencia de la suite throughput")
+    parser.add_argument("--videos", type=int, default=4, help="Videos por nivel de la suite throughput")
+    parser.add_argument("--director", choices=("llm", "local", "local+llm", "combinado"),
+                        help="Director de edición de las suites rss y throughput")
+    parser.add_argument("--moviepy", action="store_true", help="Incluir el backend MoviePy en ensamblar")
+    parser.add_argument("--latencia-llm", type=float, help="Latencia del LLM falso (s)")
+    parser.add_argument("--latencia-imagen", type=float, help="Latencia de generación de imágenes (s)")
+    parser.add_argument("--latencia-tts", type=float, help="Latencia del TTS falso por segmento (s)")
+    parser.add_argument("--rpm", type=int, default=0, help="Límite de imágenes por minuto (0 = sin límite)")
+    parser.add_argument("--con-cache", action="store_true", help="Usar las caches reales en vez de una carpeta temporal")
+    parser.add_argument("--salida", default=RESULTADOS_DIR, help="Carpeta de resultados")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar la salida del pipeline")
+    parser.add_argument("--mantener", action="store_true", help="No borrar la carpeta temporal")
+    args = parser.parse_args()
+
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    desconocidas = [s for s in suites if s not in SUITES]
+    if desconocidas:
+        parser.error(f"Suites desconocidas: {', '.join(desconocidas)}")
+
+    workdir = tempfile.mkdtemp(prefix="facelessai_bench_")
+    preparar_entorno(workdir, args.con_cache, args.rpm)
+
+    from benchmarks.fakes import LATENCIAS_DEFAULT, instalar_fakes
+
+    latencias = {
+        clave: valor for clave, valor in {
+            "llm": args.latencia_llm, "imagen": args.latencia_imagen, "tts": args.latencia_tts,
+        }.items() if valor is not None
+    }
+    latencias = {**LATENCIAS_DEFAULT, **latencias}
+    servidor = instalar_fakes(latencias)
+
+    resultado = {
+        "meta": {
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("salida", "comparar")},
+            "latencias": latencias,
+        },
+        "suites": {},
+    }
+
+    print(f"🏁 Benchmarks ({', '.join(suites)}) — perfil {args.perfil}, trabajo en {workdir}")
+    try:
+        for suite in suites:
+            print(f"\n▶️  {suite}")
+            t0 = time.perf_counter()
+            if suite == "motion":
+                datos = bench_motion(workdir, args.perfil, min(args.duracion, 4))
+            elif suite == "ensamblar":
+                datos = bench_ensamblar(workdir, args.perfil, args.duracion, args.segmentos,
+                                        args.moviepy, args.verbose)
+            elif suite == "rss":
+                datos = bench_rss(workdir, args.perfil, args.duracion, args.director, args.verbose)
+            else:
+                niveles = [int(n) for n in args.niveles.split(",") if n.strip()]
+                datos = bench_throughput(workdir, args.perfil, args.duracion, niveles,
+                                         args.videos, args.director, args.verbose)
+            datos["segundos_suite"] = round(time.perf_counter() - t0, 2)
+            resultado["suites"][suite] = datos
+    finally:
+        servidor.cerrar()
+        if not args.mantener:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(args.salida, exist_ok=True)
+    path = os.path.join(args.salida, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados: {path}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            comparar(json.load(f), resultado)
+
+
+if __name__ == "__main__":
+    main()
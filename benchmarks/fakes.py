@@ -0,0 +1,311 @@
+"""
+Fakes para benchmarks offline
+Reemplazan al cliente de OpenAI (chat + imágenes) y al endpoint HTTP de
+ElevenLabs por versiones locales con latencia artificial configurable:
+
+- Chat: devuelve guiones y EDLs armados a partir del prompt (con y sin streaming)
+- Imágenes: genera un placeholder con generar_placeholder y lo sirve por HTTP
+  local, así la descarga pasa por el mismo http_client que en producción
+- TTS: un servidor HTTP que responde como ElevenLabs con audio sintético
+  (un tono codificado a MP3, con duración proporcional al texto)
+
+Nada de esto sale a internet ni gasta créditos.
+"""
+
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from modules.ffmpeg_utils import ffmpeg_exe
+from modules.image_generator import generar_placeholder
+
+
+# Latencias por defecto (segundos) de cada llamada simulada
+LATENCIAS_DEFAULT = {
+    "llm": 0.2,        # Hasta el primer token / respuesta completa
+    "llm_chunk": 0.002,  # Entre fragmentos del streaming
+    "imagen": 0.5,     # Generación de la imagen
+    "descarga": 0.05,  # Descarga de la imagen
+    "tts": 0.2,        # Síntesis de un segmento
+}
+
+MOTIONS_SCRIPT = [
+    "zoom_in_lento", "pan_izquierda", "ken_burns_arriba",
+    "zoom_out_lento", "pan_derecha", "ken_burns_abajo", "static",
+]
+MOTIONS_EDL = [
+    "zoom_in", "pan_left", "ken_burns_up", "zoom_out", "pan_right", "ken_burns_down", "shake",
+]
+
+SEGUNDOS_POR_PALABRA = 0.4
+
+
+# === Respuestas enlatadas ===
+def script_enlatado(tema: str, duracion: int = 60) -> dict:
+    """Guión con el formato de script_generator, con textos que dependen del tema."""
+    n = max(3, int(duracion) // 8)
+    dur_seg = duracion / n
+    segmentos = []
+    for i in range(n):
+        segmentos.append({
+            "id": i + 1,
+            "tiempo_inicio": round(i * dur_seg, 1),
+            "tiempo_fin": round((i + 1) * dur_seg, 1),
+            "narracion": f"Parte {i + 1} sobre {tema}: un dato que casi nadie conoce "
+                         f"y que te va a cambiar la forma de verlo.",
+            "visual_prompt": f"Cinematic scene {i + 1} about {tema}, dramatic lighting",
+            "motion": MOTIONS_SCRIPT[i % len(MOTIONS_SCRIPT)],
+            "motion_intensidad": "medio",
+            "broll_sugerido": f"toma de apoyo {i + 1} de {tema}",
+            "broll_timestamp": f"0:{int(i * dur_seg):02d}-0:{int(i * dur_seg) + 2:02d}",
+            "sfx_sugerido": "whoosh",
+            "sfx_timestamp": f"0:{int(i * dur_seg):02d}",
+            "transicion_siguiente": "crossfade",
+        })
+    return {
+        "titulo": f"Benchmark: {tema}",
+        "duracion_total": duracion,
+        "estilo_visual": "cinematic dark, high contrast",
+        "segmentos": segmentos,
+        "broll_resumen": [s["broll_sugerido"] for s in segmentos],
+        "sfx_resumen": ["whoosh"],
+        "notas_edicion": "Generado por los fakes del benchmark",
+    }
+
+
+def edl_enlatada(script: dict) -> dict:
+    """EDL con el formato de editing_director para un guión dado."""
+    timeline = []
+    for i, seg in enumerate(script.get("segmentos", [])):
+        ini, fin = seg.get("tiempo_inicio", 0), seg.get("tiempo_fin", 0)
+        timeline.append({
+            "segmento_id": seg.get("id", i + 1),
+            "tiempo": f"0:{int(ini):02d} - 0:{int(fin):02d}",
+            "narracion_preview": seg.get("narracion", "")[:40],
+            "motion": {
+                "tipo": MOTIONS_EDL[i % len(MOTIONS_EDL)],
+                "velocidad": "lento",
+                "desde": 1.0,
+                "hasta": 1.15,
+                "nota": "benchmark",
+            },
+            "broll_inserts": [{
+                "timestamp": f"0:{int(ini):02d}.0 - 0:{int(ini) + 2:02d}.0",
+                "descripcion": seg.get("broll_sugerido", ""),
+                "buscar_en_stock": "city night",
+                "razon": "benchmark",
+            }],
+            "sfx": [{"timestamp": f"0:{int(ini):02d}.0", "efecto": "whoosh", "intensidad": "sutil"}],
+            "texto_pantalla": {"mostrar": False},
+            "transicion_siguiente": {"tipo": "crossfade", "duracion": 0.5},
+        })
+    return {
+        "titulo": script.get("titulo", "Benchmark"),
+        "duracion_total": script.get("duracion_total", 0),
+        "resumen_edicion": "EDL enlatada del benchmark",
+        "timeline": timeline,
+        "broll_shopping_list": ["city night"],
+        "sfx_shopping_list": ["whoosh"],
+        "tips_finales": [],
+    }
+
+
+def _primer_json(texto: str):
+    """Primer objeto JSON completo que aparece en el texto (o None)."""
+    inicio = texto.find("{")
+    while inicio != -1:
+        try:
+            obj, _ = json.JSONDecoder().raw_decode(texto[inicio:])
+            return obj
+        except ValueError:
+            inicio = texto.find("{", inicio + 1)
+    return None
+
+
+def responder_chat(system_prompt: str, user_prompt: str) -> dict:
+    """Decide qué respuesta enlatada corresponde al prompt."""
+    tema = re.search(r'sobre: "(.*?)"', user_prompt)
+    if tema:
+        duracion = re.search(r"video de (\d+) segundos", user_prompt)
+        script = script_enlatado(tema.group(1), int(duracion.group(1)) if duracion else 60)
+        if "incluí la guía de edición" in user_prompt:
+            # Modo combinado: cada segmento trae su edición
+            edl = edl_enlatada(script)
+            for seg, item in zip(script["segmentos"], edl["timeline"]):
+                seg["edicion"] = {k: item[k] for k in (
+                    "motion", "broll_inserts", "sfx", "texto_pantalla", "transicion_siguiente")}
+            script["edicion"] = {k: edl[k] for k in (
+                "resumen_edicion", "broll_shopping_list", "sfx_shopping_list", "tips_finales")}
+        return script
+
+    embebido = _primer_json(user_prompt) or {}
+    if "GUÍA DE EDICIÓN" in system_prompt:
+        return edl_enlatada(embebido)
+    if "PARCHE" in user_prompt:
+        # Refinamiento por parche: reescribe la narración del primer segmento
+        segmentos = embebido.get("segmentos") or [{}]
+        narracion = segmentos[0].get("narracion", "") + " Y esto recién empieza."
+        return {"cambios": [{"id": segmentos[0].get("id", 1), "campos": {"narracion": narracion}}]}
+    return embebido  # Refinamiento completo: devuelve el mismo guión
+
+
+# === Cliente OpenAI falso ===
+class _ChatCompletions:
+    def __init__(self, latencias: dict):
+        self.latencias = latencias
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = next((m["content"] for m in messages if m["role"] == "user"), "")
+        contenido = json.dumps(responder_chat(system, user), ensure_ascii=False)
+        time.sleep(self.latencias["llm"])
+
+        if not stream:
+            mensaje = SimpleNamespace(content=contenido)
+            return SimpleNamespace(choices=[SimpleNamespace(message=mensaje)], usage=None)
+
+        def fragmentos():
+            for i in range(0, len(contenido), 40):
+                time.sleep(self.latencias["llm_chunk"])
+                delta = SimpleNamespace(content=contenido[i:i + 40])
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+        return fragmentos()
+
+
+class _Imagenes:
+    def __init__(self, latencias: dict, servidor: "ServidorFake"):
+        self.latencias = latencias
+        self.servidor = servidor
+
+    def generate(self, model=None, prompt="", size="1024x1792", **kwargs):
+        time.sleep(self.latencias["imagen"])
+        ancho, alto = (int(x) for x in size.split("x"))
+        nombre = uuid.uuid4().hex
+        generar_placeholder(prompt[-100:], self.servidor.directorio, nombre, size=(ancho, alto))
+        dato = SimpleNamespace(url=f"{self.servidor.url}/imagenes/{nombre}.png", revised_prompt=prompt)
+        return SimpleNamespace(data=[dato])
+
+
+class OpenAIFake:
+    """Cliente con la misma forma que openai.OpenAI para chat e imágenes."""
+
+    def __init__(self, latencias: dict, servidor: "ServidorFake"):
+        self.chat = SimpleNamespace(completions=_ChatCompletions(latencias))
+        self.images = _Imagenes(latencias, servidor)
+
+
+# === Servidor HTTP (ElevenLabs + descargas de imágenes) ===
+def audio_sintetico(segundos: float, sample_rate: int = 44100) -> bytes:
+    """MP3 con un tono de la duración pedida."""
+    cmd = [
+        ffmpeg_exe(), "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"sine=frequency=220:sample_rate={sample_rate}:duration={segundos:.2f}",
+        "-ac", "1", "-c:a", "libmp3lame", "-b:a", "128k", "-f", "mp3", "-",
+    ]
+    return subprocess.run(cmd, stdout=subprocess.PIPE, check=True).stdout
+
+
+class ServidorFake:
+    """
+    Servidor HTTP local que imita la API de ElevenLabs y sirve las imágenes
+    "generadas" por OpenAIFake.
+
+    Args:
+        latencias: Latencias artificiales (ver LATENCIAS_DEFAULT)
+        directorio: Carpeta donde quedan las imágenes servidas
+    """
+
+    def __init__(self, latencias: dict, directorio: str = None):
+        self.latencias = latencias
+        self.directorio = directorio or tempfile.mkdtemp(prefix="bench_fake_")
+        self._audios = {}
+        self._lock = threading.Lock()
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, codigo: int, cuerpo: bytes, tipo: str):
+                self.send_response(codigo)
+                self.send_header("Content-Type", tipo)
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def do_GET(self):
+                if self.path.startswith("/imagenes/"):
+                    time.sleep(servidor.latencias["descarga"])
+                    path = os.path.join(servidor.directorio, os.path.basename(self.path))
+                    try:
+                        with open(path, "rb") as f:
+                            self._responder(200, f.read(), "image/png")
+                    except FileNotFoundError:
+                        self._responder(404, b"not found", "text/plain")
+                elif self.path == "/v1/voices":
+                    cuerpo = json.dumps({"voices": [
+                        {"name": "Fake", "voice_id": "fake", "labels": {}},
+                    ]}).encode()
+                    self._responder(200, cuerpo, "application/json")
+                else:
+                    self._responder(404, b"not found", "text/plain")
+
+            def do_POST(self):
+                largo = int(self.headers.get("Content-Length", 0))
+                datos = json.loads(self.rfile.read(largo) or b"{}")
+                if not self.path.startswith("/v1/text-to-speech/"):
+                    self._responder(404, b"not found", "text/plain")
+                    return
+                time.sleep(servidor.latencias["tts"])
+                palabras = len(datos.get("text", "").split())
+                self._responder(200, servidor.audio(palabras * SEGUNDOS_POR_PALABRA), "audio/mpeg")
+
+        self._http = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._http.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._http.server_address[1]}"
+        self._thread = threading.Thread(target=self._http.serve_forever, daemon=True)
+        self._thread.start()
+
+    def audio(self, segundos: float) -> bytes:
+        """Audio sintético cacheado por duración (redondeada a 0.1s)."""
+        segundos = max(0.5, round(segundos, 1))
+        with self._lock:
+            if segundos not in self._audios:
+                self._audios[segundos] = audio_sintetico(segundos)
+            return self._audios[segundos]
+
+    def cerrar(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+
+def instalar_fakes(latencias: dict = None) -> ServidorFake:
+    """
+    Reemplaza los clientes reales por los fakes en todos los módulos.
+
+    Returns:
+        ServidorFake en marcha (cerrarlo al terminar)
+    """
+    from modules import audio_generator, editing_director, image_generator, script_generator
+
+    latencias = {**LATENCIAS_DEFAULT, **(latencias or {})}
+    servidor = ServidorFake(latencias)
+    cliente = OpenAIFake(latencias, servidor)
+
+    script_generator.client = cliente
+    editing_director.client = cliente
+    image_generator.client = cliente
+    audio_generator.ELEVENLABS_API_BASE = servidor.url
+    os.environ.setdefault("ELEVENLABS_API_KEY", "fake")
+
+    return servidor
@@ -19,15 +19,99 @@ import json
 import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from modules.script_generator import generar_script, refinar_script
-from modules.image_generator import generar_imagenes_del_script, generar_placeholder
-from modules.audio_generator import generar_audio_del_script
-from modules.editing_director import generar_edl, imprimir_edl, guardar_edl
+from modules.script_generator import generar_script, generar_script_y_edl, refinar_script
+from modules.image_generator import (
+    generar_imagenes_del_script,
+    generar_imagen,
+    generar_placeholders,
+    obtener_limitador,
+    IMAGE_CONCURRENCY,
+)
+from modules.audio_generator import (
+    generar_audio_del_script,
+    generar_audio_elevenlabs,
+    generar_audio_gtts,
+    TTS_CONCURRENCY,
+)
+from modules.editing_director import (
+    generar_edl,
+    generar_edl_local,
+    imprimir_edl,
+    guardar_edl,
+    EDL_DIRECTOR,
+)
 from modules.video_assembler import ensamblar_video, generar_reporte_edicion
+from modules.task_graph import Cupo, GrafoTareas
+from modules.run_manifest import ManifiestoRun
+from modules.tracing import propagar, traza
+
+
+# Cupos por recurso de cada pipeline (EDL, imágenes y audio corren a la vez).
+# "llm" y "cpu" limitan etapas; "imagenes" y "tts" limitan requests a la API
+# (cada llamada a DALL-E o al TTS ocupa un cupo mientras dura).
+LIMITES_RECURSOS = {
+    "llm": 2,
+    "imagenes": IMAGE_CONCURRENCY,
+    "tts": TTS_CONCURRENCY,
+    "cpu": 1,
+}
+
+# Recursos que se ocupan por request al provider y no por etapa
+RECURSOS_POR_REQUEST = ("imagenes", "tts")
+
+
+def _como_cupo(limite):
+    """int -> Cupo; un semáforo compartido (o None) queda tal cual."""
+    return Cupo(limite) if isinstance(limite, int) else limite
+
+
+def _prefetch_por_segmento(usar_dalle: bool, usar_elevenlabs: bool, img_dir: str, audio_dir: str,
+                           cupo_imagenes=None, cupo_tts=None):
+    """
+    Prepara el arranque anticipado de imágenes y TTS mientras el guión se genera en streaming.
+    
+    Cada segmento que emite el modelo dispara su imagen y su narración con
+    los mismos argumentos que usan los pasos 3 y 4, así esos pasos después
+    los toman de los caches de imágenes y TTS sin volver a llamar a las APIs.
+    Cada request ocupa el mismo cupo de imágenes / TTS que los pasos 3 y 4.
+    
+    Returns:
+        Tupla (pool, futuros, on_segmento) con futuros = {"imagenes": [...], "audio": [...]}
+    """
+    
+    pool = ThreadPoolExecutor(max_workers=IMAGE_CONCURRENCY + TTS_CONCURRENCY)
+    limitador = obtener_limitador()
+    gen_audio = generar_audio_elevenlabs if usar_elevenlabs else generar_audio_gtts
+    futuros = {"imagenes": [], "audio": []}
+    
+    def on_segmento(seg, cabecera):
+        print(f"   ⚡ Segmento {seg['id']} listo, arrancando assets...")
+        prompt = seg.get("visual_prompt", seg.get("visual", ""))
+        if usar_dalle and prompt:
+            futuros["imagenes"].append(pool.submit(
+                propagar(generar_imagen),
+                prompt=prompt,
+                estilo_global=cabecera.get("estilo_visual", ""),
+                output_path=img_dir,
+                filename=f"seg_{seg['id']:02d}",
+                limitador=limitador,
+                cupo=cupo_imagenes,
+            ))
+        if seg.get("narracion"):
+            futuros["audio"].append(pool.submit(
+                propagar(gen_audio),
+                texto=seg["narracion"],
+                output_path=audio_dir,
+                filename=f"seg_{seg['id']:02d}",
+                cupo=cupo_tts,
+            ))
+    
+    return pool, futuros, on_segmento
 
 
 def pipeline(
@@ -39,10 +123,22 @@ def pipeline(
     usar_dalle: bool = True,
     usar_elevenlabs: bool = True,
     output_dir: str = "assets",
+    perfil_render: str = "final",
+    streaming: bool = True,
+    recursos: dict = None,
+    run_id: str = None,
+    usar_cache_llm: bool = None,
+    director_edl: str = None,
+    on_evento=None,
+    max_etapas: int = None,
+    usar_cache_render: bool = None,
 ) -> dict:
     """
     Pipeline completo: tema → video con guía de edición.
     
+    Corre como un grafo de etapas: EDL, imágenes y audio dependen solo del
+    guión, así que arrancan juntas apenas está listo; el video espera a las tres.
+    
     Args:
         tema: Tema del video
         duracion: Duración en segundos
@@ -52,107 +148,228 @@ def pipeline(
         usar_dalle: True para DALL-E, False para placeholders
         usar_elevenlabs: True para ElevenLabs, False para gTTS
         output_dir: Carpeta base de assets
+        perfil_render: "final" (calidad publicación) o "draft" (540x960, rápido)
+        streaming: Genera el guión en streaming y arranca imágenes y TTS de
+                   cada segmento apenas el modelo lo termina de escribir
+        recursos: Límites por recurso como int, Cupo o threading.Semaphore
+                  compartido (default: LIMITES_RECURSOS). "llm" y "cpu" limitan
+                  etapas; "imagenes" y "tts", requests simultáneos a esas APIs
+        run_id: Identificador de la corrida. Los archivos van a output_dir/<run_id>/
+                con un manifest.json de checkpoints; volver a correr con el mismo
+                run_id saltea las etapas cuyos archivos siguen intactos
+        usar_cache_llm: False para pedirle al LLM respuestas nuevas (default: LLM_CACHE)
+        director_edl: "llm", "local" (EDL por reglas, sin LLM), "local+llm" o
+                      "combinado" (guión y EDL en una sola llamada al LLM)
+                      (default: EDL_DIRECTOR)
+        on_evento: Callback (evento, etapa, dato) con evento "inicio", "fin"
+                   (dato = resultado de la etapa) o "error", para reportar progreso
+        max_etapas: Etapas corriendo a la vez (default: sin límite; 1 las
+                    corre de a una, ej: para medir la memoria de cada una)
+        usar_cache_render: Reutiliza los segmentos de video ya renderizados que
+                           no cambiaron, para re-renders incrementales
+                           (default: RENDER_CACHE)
     
     Returns:
-        dict con paths a todos los archivos generados
+        dict con paths a todos los archivos generados, "etapas" con los
+        tiempos de inicio/fin de cada etapa (relativos a "inicio_etapas", epoch)
+        y "traza" con el JSONL de spans de la corrida
     """
     
     resultado = {}
     inicio = time.time()
+    director_edl = director_edl or EDL_DIRECTOR
+    combinado = director_edl == "combinado"
     
     print("\n" + "🎬" * 30)
     print(f"  FACELESSAI — Generando video sobre: '{tema}'")
     print("🎬" * 30 + "\n")
     
-    # === PASO 1: Generar Script ===
-    print("\n📝 PASO 1/5: Generando guión...")
-    print("-" * 40)
+    manifiesto = None
+    if run_id:
+        output_dir = os.path.join(output_dir, run_id)
+        manifiesto = ManifiestoRun(os.path.join(output_dir, "manifest.json"), run_id)
+        print(f"🔖 Corrida '{run_id}' (checkpoints en {manifiesto.path})")
     
-    script = generar_script(
-        tema=tema,
-        duracion=duracion,
-        estilo=estilo,
-        tono=tono,
-        plataforma=plataforma,
-    )
-    
-    # Guardar script
+    img_dir = os.path.join(output_dir, "images")
+    audio_dir = os.path.join(output_dir, "audio")
     script_path = os.path.join(output_dir, "output", "script.json")
-    os.makedirs(os.path.dirname(script_path), exist_ok=True)
-    with open(script_path, "w", encoding="utf-8") as f:
-        json.dump(script, f, ensure_ascii=False, indent=2)
-    resultado["script"] = script_path
-    
-    # === PASO 2: Generar EDL (Guía de Edición) ===
-    print("\n🎬 PASO 2/5: Generando guía de edición...")
-    print("-" * 40)
-    
-    edl = generar_edl(script)
-    
     edl_path = os.path.join(output_dir, "output", "edl.json")
-    guardar_edl(edl, edl_path)
-    resultado["edl"] = edl_path
-    
-    # Generar reporte de edición legible
     reporte_path = os.path.join(output_dir, "output", "reporte_edicion.txt")
-    generar_reporte_edicion(edl, reporte_path)
-    resultado["reporte"] = reporte_path
+    nombre_video = "video_final.mp4" if perfil_render == "final" else f"video_{perfil_render}.mp4"
+    video_path = os.path.join(output_dir, "output", nombre_video)
     
-    # Mostrar EDL
-    imprimir_edl(edl)
+    # Imágenes y TTS se limitan por request (ver LIMITES_RECURSOS)
+    limites = dict(recursos or LIMITES_RECURSOS)
+    cupo_imagenes = _como_cupo(limites.pop("imagenes", None))
+    cupo_tts = _como_cupo(limites.pop("tts", None))
     
-    # === PASO 3: Generar Imágenes ===
-    print("\n🖼️  PASO 3/5: Generando imágenes...")
-    print("-" * 40)
+    prefetch_pool, prefetch_futuros, on_segmento = None, {}, None
+    if streaming:
+        prefetch_pool, prefetch_futuros, on_segmento = _prefetch_por_segmento(
+            usar_dalle, usar_elevenlabs, img_dir, audio_dir, cupo_imagenes, cupo_tts,
+        )
     
-    img_dir = os.path.join(output_dir, "images")
+    # === PASO 1: Generar Script ===
+    def etapa_script():
+        print("\n📝 PASO 1/5: Generando guión...")
+        print("-" * 40)
+        
+        kwargs = dict(
+            tema=tema,
+            duracion=duracion,
+            estilo=estilo,
+            tono=tono,
+            plataforma=plataforma,
+            usar_cache=usar_cache_llm,
+            on_segmento=on_segmento,
+        )
+        if combinado:
+            # La EDL viene en la misma respuesta: queda en edl.json para la etapa EDL
+            script, edl = generar_script_y_edl(**kwargs)
+            guardar_edl(edl, edl_path)
+        else:
+            script = generar_script(**kwargs)
+        
+        # Guardar script
+        os.makedirs(os.path.dirname(script_path), exist_ok=True)
+        with open(script_path, "w", encoding="utf-8") as f:
+            json.dump(script, f, ensure_ascii=False, indent=2)
+        return script
+    
+    # === PASO 2: Generar EDL (Guía de Edición) ===
+    def etapa_edl(script):
+        print("\n🎬 PASO 2/5: Generando guía de edición...")
+        print("-" * 40)
+        
+        if combinado:
+            try:
+                with open(edl_path, "r", encoding="utf-8") as f:
+                    edl = json.load(f)
+                print("✅ EDL generada junto con el guión")
+            except (OSError, json.JSONDecodeError):
+                edl = generar_edl_local(script)
+                guardar_edl(edl, edl_path)
+        else:
+            edl = generar_edl(script, usar_cache=usar_cache_llm, director=director_edl)
+            guardar_edl(edl, edl_path)
+        
+        # Generar reporte de edición legible
+        generar_reporte_edicion(edl, reporte_path)
+        
+        # Mostrar EDL
+        imprimir_edl(edl)
+        return edl
     
-    if usar_dalle:
-        imagenes = generar_imagenes_del_script(script, img_dir)
-    else:
-        # Modo gratis: placeholders
-        imagenes = []
-        for seg in script.get("segmentos", []):
-            placeholder = generar_placeholder(
-                texto=seg.get("visual_prompt", seg.get("narracion", ""))[:100],
+    # === PASO 3: Generar Imágenes ===
+    def etapa_imagenes(script):
+        # Esperar las imágenes arrancadas durante el streaming (quedan en cache)
+        wait(prefetch_futuros.get("imagenes", []))
+        
+        print("\n🖼️  PASO 3/5: Generando imágenes...")
+        print("-" * 40)
+        
+        if usar_dalle:
+            imagenes = generar_imagenes_del_script(script, img_dir, cupo=cupo_imagenes)
+        else:
+            # Modo gratis: placeholders (en paralelo)
+            segmentos = script.get("segmentos", [])
+            imagenes = generar_placeholders(
+                textos=[seg.get("visual_prompt", seg.get("narracion", ""))[:100] for seg in segmentos],
                 output_path=img_dir,
-                filename=f"seg_{seg['id']:02d}",
+                nombres=[f"seg_{seg['id']:02d}" for seg in segmentos],
             )
-            imagenes.append(placeholder)
-    
-    resultado["imagenes"] = imagenes
+        
+        return imagenes
     
     # === PASO 4: Generar Audio ===
-    print("\n🎙️  PASO 4/5: Generando audio...")
-    print("-" * 40)
-    
-    audio_dir = os.path.join(output_dir, "audio")
-    
-    audios = generar_audio_del_script(
-        script=script,
-        output_path=audio_dir,
-        usar_elevenlabs=usar_elevenlabs,
-    )
-    
-    resultado["audio_completo"] = audios["completo"]
-    resultado["audio_segmentos"] = audios["segmentos"]
+    def etapa_audio(script):
+        # Esperar los audios arrancados durante el streaming (quedan en cache)
+        wait(prefetch_futuros.get("audio", []))
+        
+        print("\n🎙️  PASO 4/5: Generando audio...")
+        print("-" * 40)
+        
+        audios = generar_audio_del_script(
+            script=script,
+            output_path=audio_dir,
+            usar_elevenlabs=usar_elevenlabs,
+            cupo=cupo_tts,
+        )
+        
+        return audios
     
     # === PASO 5: Ensamblar Video ===
-    print("\n🎥 PASO 5/5: Ensamblando video...")
-    print("-" * 40)
-    
-    video_path = os.path.join(output_dir, "output", "video_final.mp4")
-    
-    video = ensamblar_video(
-        script=script,
-        imagenes=imagenes,
-        audio_path=audios["completo"],
-        edl=edl,
-        output_path=video_path,
-        usar_motions=True,
-    )
+    def etapa_video(script, edl, imagenes, audio):
+        print("\n🎥 PASO 5/5: Ensamblando video...")
+        print("-" * 40)
+        
+        return ensamblar_video(
+            script=script,
+            imagenes=imagenes,
+            audio_path=audio["completo"],
+            edl=edl,
+            output_path=video_path,
+            usar_motions=True,
+            perfil=perfil_render,
+            tiempos=audio.get("tiempos"),
+            usar_cache=usar_cache_render,
+        )
+    
+    # Con run_id cada etapa queda checkpointeada en el manifest
+    if manifiesto is not None:
+        etapa_script = manifiesto.etapa(
+            "script", etapa_script,
+            parametros=[tema, duracion, estilo, tono, plataforma] + (["combinado"] if combinado else []),
+            artefactos=lambda _: [script_path] + ([edl_path] if combinado else []),
+        )
+        etapa_edl = manifiesto.etapa(
+            "edl", etapa_edl,
+            parametros=[director_edl],
+            artefactos=lambda _: [edl_path, reporte_path],
+        )
+        etapa_imagenes = manifiesto.etapa(
+            "imagenes", etapa_imagenes,
+            parametros=[usar_dalle],
+            artefactos=lambda imagenes: imagenes,
+        )
+        etapa_audio = manifiesto.etapa(
+            "audio", etapa_audio,
+            parametros=[usar_elevenlabs],
+            artefactos=lambda audios: audios["segmentos"] + [audios["completo"]],
+        )
+        etapa_video = manifiesto.etapa(
+            "video", etapa_video,
+            parametros=[perfil_render],
+            artefactos=lambda video: [video],
+        )
+    
+    # Las etapas de imágenes y audio no ocupan cupo: lo ocupan sus requests
+    grafo = GrafoTareas(limites=limites, on_evento=on_evento)
+    grafo.agregar("script", etapa_script, recurso="llm")
+    # La EDL por reglas (o la que vino con el guión) no ocupa un cupo de LLM
+    recurso_edl = None if director_edl in ("local", "combinado") else "llm"
+    grafo.agregar("edl", etapa_edl, ("script",), recurso=recurso_edl)
+    grafo.agregar("imagenes", etapa_imagenes, ("script",), recurso="imagenes")
+    grafo.agregar("audio", etapa_audio, ("script",), recurso="tts")
+    grafo.agregar("video", etapa_video, ("script", "edl", "imagenes", "audio"), recurso="cpu")
+    
+    with traza(run_id=run_id) as traza_run:
+        try:
+            salidas = grafo.ejecutar(max_workers=max_etapas)
+        finally:
+            if prefetch_pool is not None:
+                prefetch_pool.shutdown(cancel_futures=True)
     
-    resultado["video"] = video
+    resultado["script"] = script_path
+    resultado["edl"] = edl_path
+    resultado["reporte"] = reporte_path
+    resultado["imagenes"] = salidas["imagenes"]
+    resultado["audio_completo"] = salidas["audio"]["completo"]
+    resultado["audio_segmentos"] = salidas["audio"]["segmentos"]
+    resultado["video"] = salidas["video"]
+    resultado["etapas"] = grafo.tiempos
+    resultado["inicio_etapas"] = grafo.inicio_epoch
+    resultado["traza"] = traza_run.path if traza_run else None
     
     # === RESUMEN ===
     tiempo_total = time.time() - inicio
@@ -161,6 +378,7 @@ def pipeline(
     print(f"  VIDEO GENERADO EXITOSAMENTE")
     print("✅" * 30)
     print(f"\n⏱️  Tiempo total: {tiempo_total:.1f}s")
+    print(grafo.resumen())
     print(f"\n📁 Archivos generados:")
     print(f"   📝 Script: {resultado.get('script', '')}")
     print(f"   🎬 EDL: {resultado.get('edl', '')}")
@@ -168,6 +386,8 @@ def pipeline(
     print(f"   🖼️  Imágenes: {len(resultado.get('imagenes', []))} archivos")
     print(f"   🎙️  Audio: {resultado.get('audio_completo', '')}")
     print(f"   🎥 Video: {resultado.get('video', '')}")
+    if resultado["traza"]:
+        print(f"   📈 Traza: {resultado['traza']}")
     print(f"\n💡 SIGUIENTE PASO:")
     print(f"   1. Abrí el reporte de edición: {resultado.get('reporte', '')}")
     print(f"   2. Buscá el b-roll listado en Pexels/Pixabay")
@@ -204,10 +424,19 @@ if __name__ == "__main__":
     usar_elevenlabs = input("🎙️  Usar ElevenLabs para voz? (s/n) [n]: ").strip().lower()
     usar_elevenlabs = usar_elevenlabs == "s"
     
+    draft = input("🎞️  Render borrador rápido (540x960, 15fps)? (s/n) [n]: ").strip().lower()
+    perfil_render = "draft" if draft == "s" else "final"
+    
+    run_id = input("🔖 ID de corrida para guardar checkpoints / reanudar (vacío = sin checkpoints): ").strip()
+    
     # Ejecutar pipeline
     resultado = pipeline(
         tema=tema,
         duracion=duracion,
         usar_dalle=usar_dalle,
         usar_elevenlabs=usar_elevenlabs,
+        perfil_render=perfil_render,
+        run_id=run_id or None,
+        # Reanudar una corrida re-renderiza solo los segmentos que cambiaron
+        usar_cache_render=True if run_id else None,
     )
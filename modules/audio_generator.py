@@ -4,12 +4,55 @@ Genera narración con ElevenLabs (premium) o gTTS (gratis).
 """
 
 import os
+import subprocess
+import wave
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import requests
 import json
 from dotenv import load_dotenv
 
+from modules import http_client
+from modules.cache import DiskCache
+from modules.ffmpeg_utils import ffmpeg_exe
+from modules.task_graph import ocupar
+from modules.tracing import propagar, span
+
 load_dotenv()
 
+# Formato del track completo armado localmente
+SAMPLE_RATE = 44100
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+
+ELEVENLABS_MODEL_ID = "eleven_multilingual_v2"
+ELEVENLABS_API_BASE = os.getenv("ELEVENLABS_API_BASE", "https://api.elevenlabs.io")
+
+# Cache de TTS por texto + voz + settings (compartible entre procesos)
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "assets/cache/tts")
+TTS_CACHE_MAX_MB = int(os.getenv("TTS_CACHE_MAX_MB", "1024"))
+
+_cache_tts = None
+
+
+def obtener_cache_tts() -> DiskCache:
+    """Cache de audios TTS (compartido por todo el proceso)."""
+    global _cache_tts
+    if _cache_tts is None:
+        _cache_tts = DiskCache(TTS_CACHE_DIR, TTS_CACHE_MAX_MB * 1024 * 1024, ".mp3")
+    return _cache_tts
+
+
+def _desde_cache(cache: DiskCache, clave: str, output_path: str, filename: str):
+    """Copia el audio cacheado al destino si existe. Devuelve el path o None."""
+    if cache is None:
+        return None
+    os.makedirs(output_path, exist_ok=True)
+    filepath = os.path.join(output_path, f"{filename}.mp3")
+    if not cache.copiar(clave, filepath):
+        return None
+    print(f"♻️  Audio desde cache: {filepath}")
+    return filepath
+
 
 def generar_audio_elevenlabs(
     texto: str,
@@ -19,6 +62,8 @@ def generar_audio_elevenlabs(
     stability: float = 0.5,
     similarity: float = 0.75,
     style: float = 0.3,
+    usar_cache: bool = True,
+    cupo=None,
 ) -> str:
     """
     Genera audio con ElevenLabs API.
@@ -31,6 +76,9 @@ def generar_audio_elevenlabs(
         stability: Estabilidad de voz (0-1, más bajo = más expresivo)
         similarity: Similitud (0-1)
         style: Estilo (0-1)
+        usar_cache: Reutiliza el audio si ya se generó con el mismo texto, voz y settings
+        cupo: Semáforo (o Cupo) que se ocupa durante el request, para limitar
+              los requests de TTS simultáneos entre varios pipelines
     
     Returns:
         Path al archivo .mp3
@@ -41,44 +89,66 @@ def generar_audio_elevenlabs(
     
     if not api_key:
         print("⚠️  No hay API key de ElevenLabs, usando gTTS como fallback...")
-        return generar_audio_gtts(texto, output_path, filename)
-    
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+        return generar_audio_gtts(texto, output_path, filename, cupo=cupo)
     
-    headers = {
-        "Accept": "audio/mpeg",
-        "Content-Type": "application/json",
-        "xi-api-key": api_key,
+    voice_settings = {
+        "stability": stability,
+        "similarity_boost": similarity,
+        "style": style,
+        "use_speaker_boost": True,
     }
     
-    data = {
-        "text": texto,
-        "model_id": "eleven_multilingual_v2",
-        "voice_settings": {
-            "stability": stability,
-            "similarity_boost": similarity,
-            "style": style,
-            "use_speaker_boost": True,
-        },
-    }
-    
-    print(f"🎙️  Generando audio ElevenLabs: {filename}...")
-    
-    response = requests.post(url, json=data, headers=headers)
-    
-    if response.status_code != 200:
-        print(f"❌ Error ElevenLabs ({response.status_code}): {response.text[:200]}")
-        print("   Usando gTTS como fallback...")
-        return generar_audio_gtts(texto, output_path, filename)
-    
-    os.makedirs(output_path, exist_ok=True)
-    filepath = os.path.join(output_path, f"{filename}.mp3")
-    
-    with open(filepath, "wb") as f:
-        f.write(response.content)
-    
-    print(f"✅ Audio guardado: {filepath}")
-    return filepath
+    with span("tts.elevenlabs", archivo=filename, caracteres=len(texto)) as s:
+        cache = obtener_cache_tts() if usar_cache else None
+        clave = DiskCache.clave("elevenlabs", texto, voice_id, ELEVENLABS_MODEL_ID, voice_settings)
+        cacheado = _desde_cache(cache, clave, output_path, filename)
+        s["cache"] = "hit" if cacheado else ("miss" if cache is not None else "off")
+        if cacheado:
+            return cacheado
+        
+        url = f"{ELEVENLABS_API_BASE}/v1/text-to-speech/{voice_id}"
+        
+        headers = {
+            "Accept": "audio/mpeg",
+            "Content-Type": "application/json",
+            "xi-api-key": api_key,
+        }
+        
+        data = {
+            "text": texto,
+            "model_id": ELEVENLABS_MODEL_ID,
+            "voice_settings": voice_settings,
+        }
+        
+        print(f"🎙️  Generando audio ElevenLabs: {filename}...")
+        
+        # El fallback a gTTS corre dentro del mismo cupo
+        with ocupar(cupo):
+            try:
+                response = http_client.post(url, json=data, headers=headers, stream=True)
+            except requests.RequestException as e:
+                print(f"❌ Error de red con ElevenLabs: {e}")
+                s["fallback"] = "gtts"
+                print("   Usando gTTS como fallback...")
+                return generar_audio_gtts(texto, output_path, filename)
+            
+            s["status"] = response.status_code
+            s["reintentos"] = http_client.reintentos(response)
+            if response.status_code != 200:
+                s["fallback"] = "gtts"
+                print(f"❌ Error ElevenLabs ({response.status_code}): {response.text[:200]}")
+                response.close()
+                print("   Usando gTTS como fallback...")
+                return generar_audio_gtts(texto, output_path, filename)
+            
+            filepath = os.path.join(output_path, f"{filename}.mp3")
+            s["bytes"] = http_client.guardar_stream(response, filepath)
+        
+        if cache is not None:
+            cache.guardar(clave, filepath)
+        
+        print(f"✅ Audio guardado: {filepath}")
+        return filepath
 
 
 def generar_audio_gtts(
@@ -87,6 +157,8 @@ def generar_audio_gtts(
     filename: str = "narracion",
     lang: str = "es",
     slow: bool = False,
+    usar_cache: bool = True,
+    cupo=None,
 ) -> str:
     """
     Genera audio con Google Text-to-Speech (gratis, menor calidad).
@@ -97,78 +169,200 @@ def generar_audio_gtts(
         filename: Nombre sin extensión
         lang: Idioma (es = español)
         slow: Si habla más lento
+        usar_cache: Reutiliza el audio si ya se generó con el mismo texto e idioma
+        cupo: Semáforo (o Cupo) que se ocupa durante el request
     
     Returns:
         Path al archivo .mp3
     """
     from gtts import gTTS
     
-    print(f"🎙️  Generando audio gTTS: {filename}...")
-    
-    tts = gTTS(text=texto, lang=lang, slow=slow)
-    
-    os.makedirs(output_path, exist_ok=True)
-    filepath = os.path.join(output_path, f"{filename}.mp3")
-    tts.save(filepath)
+    with span("tts.gtts", archivo=filename, caracteres=len(texto)) as s:
+        cache = obtener_cache_tts() if usar_cache else None
+        clave = DiskCache.clave("gtts", texto, lang, slow)
+        cacheado = _desde_cache(cache, clave, output_path, filename)
+        s["cache"] = "hit" if cacheado else ("miss" if cache is not None else "off")
+        if cacheado:
+            return cacheado
+        
+        print(f"🎙️  Generando audio gTTS: {filename}...")
+        
+        tts = gTTS(text=texto, lang=lang, slow=slow)
+        
+        os.makedirs(output_path, exist_ok=True)
+        filepath = os.path.join(output_path, f"{filename}.mp3")
+        with ocupar(cupo):
+            tts.save(filepath)
+        s["bytes"] = os.path.getsize(filepath)
+        
+        if cache is not None:
+            cache.guardar(clave, filepath)
     
     print(f"✅ Audio guardado: {filepath}")
     return filepath
 
 
+def decodificar_pcm(path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Decodifica un archivo de audio a PCM 16-bit mono con ffmpeg.
+    
+    Returns:
+        Array int16 con las muestras
+    """
+    cmd = [
+        ffmpeg_exe(), "-hide_banner", "-loglevel", "error",
+        "-i", path,
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ac", "1", "-ar", str(sample_rate),
+        "-",
+    ]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise RuntimeError(f"No se pudo decodificar {path}: "
+                           f"{proc.stderr.decode(errors='replace')[-300:]}")
+    return np.frombuffer(proc.stdout, dtype=np.int16)
+
+
+def concatenar_audios(
+    pistas: list,
+    output_path: str,
+    sample_rate: int = SAMPLE_RATE,
+    pausa: float = 0.0,
+) -> list:
+    """
+    Concatena pistas PCM en un WAV con precisión de muestra.
+    
+    Args:
+        pistas: Lista de arrays int16 (una por segmento)
+        output_path: Path del .wav final
+        sample_rate: Sample rate de las pistas
+        pausa: Silencio (segundos) agregado al final de cada segmento
+    
+    Returns:
+        Lista de (inicio, duracion) en segundos para cada pista
+    """
+    
+    silencio = np.zeros(int(round(pausa * sample_rate)), dtype=np.int16)
+    tiempos = []
+    muestras = 0
+    
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with wave.open(output_path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        for pcm in pistas:
+            n = len(pcm) + len(silencio)
+            tiempos.append((muestras / sample_rate, n / sample_rate))
+            wav.writeframes(pcm.tobytes())
+            wav.writeframes(silencio.tobytes())
+            muestras += n
+    
+    return tiempos
+
+
 def generar_audio_del_script(
     script: dict,
     output_path: str = "assets/audio",
     usar_elevenlabs: bool = True,
+    por_segmento: bool = True,
+    max_concurrencia: int = None,
+    pausa_entre_segmentos: float = 0.0,
+    cupo=None,
 ) -> dict:
     """
     Genera todo el audio del guión.
-    Puede generar un solo archivo con toda la narración o uno por segmento.
+    
+    Por defecto sintetiza SOLO los clips por segmento (en paralelo) y arma
+    el track completo localmente, con el inicio y la duración exactos de
+    cada segmento. Los segmentos sin narración entran al track como silencio
+    con su duración del guión. Con por_segmento=False además manda la narración completa
+    al TTS (modo anterior, doble costo).
     
     Args:
         script: Guión estructurado
         output_path: Carpeta de salida
         usar_elevenlabs: True para ElevenLabs, False para gTTS
+        por_segmento: Arma el track completo concatenando los segmentos
+        max_concurrencia: Requests de TTS simultáneos (default: TTS_CONCURRENCY)
+        pausa_entre_segmentos: Silencio (segundos) al final de cada segmento
+        cupo: Cupo global de requests de TTS (compartido entre pipelines);
+              si es un Cupo, también acota max_concurrencia
     
     Returns:
-        dict con paths: {"completo": path, "segmentos": [paths]}
+        dict con paths: {"completo": path, "segmentos": [paths],
+                         "tiempos": [{"id", "inicio", "duracion"}]}
     """
     
     segmentos = script.get("segmentos", [])
-    
-    # === Audio completo (toda la narración junta) ===
-    narracion_completa = " ".join(
-        seg.get("narracion", "") for seg in segmentos
-    )
+    con_narracion = [seg for seg in segmentos if seg.get("narracion", "")]
     
     print(f"\n🎙️  Generando audio para {len(segmentos)} segmentos...")
     
     gen_func = generar_audio_elevenlabs if usar_elevenlabs else generar_audio_gtts
     
-    audio_completo = gen_func(
-        texto=narracion_completa,
-        output_path=output_path,
-        filename="narracion_completa",
-    )
+    if not por_segmento:
+        # === Audio completo (toda la narración junta) ===
+        narracion_completa = " ".join(
+            seg.get("narracion", "") for seg in segmentos
+        )
+        audio_completo = gen_func(
+            texto=narracion_completa,
+            output_path=output_path,
+            filename="narracion_completa",
+            cupo=cupo,
+        )
     
-    # === Audio por segmento (útil para sincronización precisa) ===
-    audios_segmentos = []
-    for seg in segmentos:
-        narracion = seg.get("narracion", "")
-        if not narracion:
-            continue
-        
-        audio_seg = gen_func(
-            texto=narracion,
+    # === Audio por segmento (en paralelo) ===
+    def sintetizar(seg):
+        path = gen_func(
+            texto=seg["narracion"],
             output_path=output_path,
             filename=f"seg_{seg['id']:02d}",
+            cupo=cupo,
         )
-        audios_segmentos.append(audio_seg)
+        pcm = decodificar_pcm(path) if por_segmento else None
+        return path, pcm
+    
+    workers = max(1, max_concurrencia or TTS_CONCURRENCY)
+    if getattr(cupo, "cupos", None):
+        workers = min(workers, cupo.cupos)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        resultados = list(pool.map(propagar(sintetizar), con_narracion))
+    
+    audios_segmentos = [path for path, _ in resultados]
     
     resultado = {
-        "completo": audio_completo,
         "segmentos": audios_segmentos,
     }
     
+    if por_segmento:
+        # === Track completo armado localmente ===
+        audio_completo = os.path.join(output_path, "narracion_completa.wav")
+        # Un segmento sin narración sigue en pantalla: su lugar en el track es silencio
+        pcms = iter(pcm for _, pcm in resultados)
+        pistas = []
+        for seg in segmentos:
+            if seg.get("narracion"):
+                pistas.append(next(pcms))
+            else:
+                silencio = max(seg.get("tiempo_fin", 0) - seg.get("tiempo_inicio", 0), 0)
+                pistas.append(np.zeros(int(round(silencio * SAMPLE_RATE)), dtype=np.int16))
+        with span("audio.concatenar", pistas=len(pistas)) as s:
+            tiempos = concatenar_audios(
+                pistas,
+                audio_completo,
+                pausa=pausa_entre_segmentos,
+            )
+            s["bytes"] = os.path.getsize(audio_completo)
+        resultado["tiempos"] = [
+            {"id": seg["id"], "inicio": inicio, "duracion": duracion}
+            for seg, (inicio, duracion) in zip(segmentos, tiempos)
+        ]
+        print(f"   Track completo armado localmente: {audio_completo}")
+    
+    resultado["completo"] = audio_completo
+    
     print(f"\n✅ Audio generado: 1 completo + {len(audios_segmentos)} segmentos")
     return resultado
 
@@ -181,10 +375,10 @@ def listar_voces_elevenlabs() -> list:
         print("❌ No hay API key de ElevenLabs")
         return []
     
-    url = "https://api.elevenlabs.io/v1/voices"
+    url = f"{ELEVENLABS_API_BASE}/v1/voices"
     headers = {"xi-api-key": api_key}
     
-    response = requests.get(url, headers=headers)
+    response = http_client.get(url, headers=headers)
     
     if response.status_code != 200:
         print(f"❌ Error: {response.status_code}")
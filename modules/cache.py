@@ -0,0 +1,252 @@
+"""
+Cache en disco direccionado por contenido.
+Cada entrada es un archivo cuyo nombre es el hash de su clave. Las escrituras
+son atómicas (archivo temporal + os.replace) y la expulsión es LRU por
+tamaño total, usando el mtime como marca de último uso. Es seguro compartir
+el mismo directorio entre varios procesos.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+
+def hash_archivo(path: str, chunk: int = 1 << 20) -> str:
+    """SHA-256 del contenido de un archivo."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(chunk), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _tamano(path: str) -> int:
+    """Tamaño del archivo, o 0 si no existe."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class DiskCache:
+    """
+    Cache de archivos en disco con expulsión LRU por bytes y contadores de hits/misses.
+
+    Args:
+        directorio: Carpeta del cache
+        max_bytes: Tamaño máximo total antes de expulsar entradas viejas
+        extension: Extensión de los archivos guardados (ej: ".mp4")
+    """
+
+    # Al pasarse de max_bytes se expulsa hasta esta fracción, así no se
+    # recorre el directorio en cada guardar() cuando el cache está lleno
+    FRACCION_OBJETIVO = 0.9
+
+    def __init__(self, directorio: str, max_bytes: int, extension: str = ""):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self.hits = 0
+        self.misses = 0
+        # Bytes en disco según este proceso (None = hay que recorrer el directorio)
+        self._bytes = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def clave(*partes) -> str:
+        """Arma una clave estable (hash) a partir de cualquier dato serializable a JSON."""
+        crudo = json.dumps(partes, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(crudo.encode("utf-8")).hexdigest()
+
+    def ruta(self, clave: str) -> str:
+        """Path donde vive (o viviría) la entrada."""
+        return os.path.join(self.directorio, clave[:2], clave + self.extension)
+
+    def obtener(self, clave: str, valida=None):
+        """
+        Devuelve el path de la entrada si existe (y la marca como usada), o None.
+
+        Args:
+            clave: Clave de la entrada
+            valida: Función opcional path -> bool; si devuelve False la entrada
+                    se borra y cuenta como miss (ej: vencida por TTL)
+        """
+        path = self.ruta(clave)
+        try:
+            if valida is not None and not valida(path):
+                os.remove(path)
+                raise FileNotFoundError(path)
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def copiar(self, clave: str, destino: str, enlazar: bool = False):
+        """
+        Copia la entrada a destino si existe. Si otro proceso la expulsa entre
+        obtener() y la copia, cuenta como miss en vez de fallar.
+
+        Args:
+            clave: Clave de la entrada
+            destino: Path del archivo a crear
+            enlazar: Intentar un hard link antes de copiar (mismo filesystem)
+
+        Returns:
+            destino, o None si la entrada no está
+        """
+        path = self.obtener(clave)
+        if not path:
+            return None
+        try:
+            if enlazar:
+                try:
+                    os.link(path, destino)
+                    return destino
+                except FileNotFoundError:
+                    raise
+                except OSError:
+                    pass  # Otro filesystem o destino existente: copiamos
+            shutil.copyfile(path, destino)
+        except FileNotFoundError:
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return destino
+
+    def _escribir(self, clave: str, escribir) -> str:
+        destino = self.ruta(clave)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                escribir(f)
+            previo = _tamano(destino)
+            os.replace(tmp, destino)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        self._registrar(destino, previo)
+        return destino
+
+    def _registrar(self, path: str, previo: int):
+        """Suma la entrada nueva al total y solo expulsa si se pasó de max_bytes."""
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += _tamano(path) - previo
+            excedido = self._bytes is None or self._bytes > self.max_bytes
+        if excedido:
+            self.evictar(int(self.max_bytes * self.FRACCION_OBJETIVO))
+
+    def guardar(self, clave: str, origen: str, mover: bool = False) -> str:
+        """
+        Guarda un archivo existente en el cache de forma atómica.
+
+        Returns:
+            Path de la entrada en el cache
+        """
+        if mover:
+            destino = self.ruta(clave)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            try:
+                previo = _tamano(destino)
+                os.replace(origen, destino)
+                self._registrar(destino, previo)
+                return destino
+            except OSError:
+                pass  # Otro filesystem: copiamos
+
+        def copiar(f):
+            with open(origen, "rb") as src:
+                shutil.copyfileobj(src, f)
+
+        return self._escribir(clave, copiar)
+
+    def guardar_bytes(self, clave: str, data: bytes) -> str:
+        """Guarda bytes en el cache de forma atómica."""
+        return self._escribir(clave, lambda f: f.write(data))
+
+    def _entradas(self) -> list:
+        entradas = []
+        if not os.path.isdir(self.directorio):
+            return entradas
+        for raiz, _, archivos in os.walk(self.directorio):
+            for nombre in archivos:
+                if nombre.endswith(".tmp"):
+                    continue
+                path = os.path.join(raiz, nombre)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entradas.append((st.st_mtime, st.st_size, path))
+        return entradas
+
+    def evictar(self, objetivo: int = None) -> int:
+        """
+        Borra las entradas usadas hace más tiempo hasta quedar bajo max_bytes.
+        Recorre el directorio, así que también cuenta lo que escribieron otros
+        procesos; guardar() solo la llama cuando el total propio se pasa.
+
+        Args:
+            objetivo: Bytes a los que bajar (default: max_bytes)
+
+        Returns:
+            Cantidad de entradas borradas
+        """
+        objetivo = self.max_bytes if objetivo is None else objetivo
+        entradas = self._entradas()
+        total = sum(size for _, size, _ in entradas)
+        borradas = 0
+        for _, size, path in sorted(entradas):
+            if total <= objetivo:
+                break
+            try:
+                os.remove(path)
+                borradas += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self._bytes = total
+        return borradas
+
+    def estadisticas(self) -> dict:
+        """Resumen del cache: entradas, bytes usados y hits/misses de este proceso."""
+        entradas = self._entradas()
+        return {
+            "directorio": self.directorio,
+            "entradas": len(entradas),
+            "bytes": sum(size for _, size, _ in entradas),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def purgar(self) -> int:
+        """
+        Borra todas las entradas del cache.
+
+        Returns:
+            Cantidad de entradas borradas
+        """
+        borradas = 0
+        for _, _, path in self._entradas():
+            try:
+                os.remove(path)
+                borradas += 1
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._bytes = None
+        return borradas
@@ -4,15 +4,26 @@ Analiza el guión y genera instrucciones detalladas de edición.
 Indica EXACTAMENTE dónde van motions, b-roll y SFX.
 """
 
+import copy
 import json
 import os
+import re
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from modules.llm_cache import completar_json
+from modules.motion_engine import normalizar_motion
+
 load_dotenv()
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# "llm": EDL completa con GPT-4o | "local": por reglas, sin LLM (milisegundos)
+# "local+llm": por reglas + una pasada del LLM que solo agrega notas, b-roll y textos
+# "combinado": el pipeline pide guión y EDL en una sola llamada (generar_script_y_edl)
+EDL_DIRECTOR = os.getenv("EDL_DIRECTOR", "llm")
+DIRECTORES = ("llm", "local", "local+llm", "combinado")
+
 DIRECTOR_PROMPT = """Sos un editor de video profesional especializado en contenido faceless viral.
 Tu trabajo es analizar un guión y crear una GUÍA DE EDICIÓN DETALLADA.
 
@@ -54,17 +65,438 @@ Para cada segmento, definí:
 Respondé ÚNICAMENTE con JSON válido."""
 
 
-def generar_edl(script: dict) -> dict:
+# === Director local (por reglas) ===
+# Motions del guión que no son de cámara (el resto se normaliza con motion_engine)
+MOTIONS_EDL = {
+    "shake": "shake",
+    "shake_suave": "shake",
+    "scale_pulse": "scale_pulse",
+    "static": "static",
+}
+
+# motion_intensidad del guión → (velocidad, zoom máximo, intensidad de los SFX)
+INTENSIDADES = {
+    "suave": ("lento", 1.10, "sutil"),
+    "medio": ("medio", 1.15, "medio"),
+    "fuerte": ("rapido", 1.25, "fuerte"),
+}
+
+NOTAS_MOTION = {
+    "zoom_in": "Acercamiento para sostener la atención en lo que se revela",
+    "zoom_out": "Alejamiento para dar contexto",
+    "pan_left": "Paneo para recorrer la escena",
+    "pan_right": "Paneo para recorrer la escena",
+    "ken_burns_up": "Subida lenta, sensación de ascenso",
+    "ken_burns_down": "Bajada lenta, sensación de peso",
+    "shake": "Temblor para marcar el impacto",
+    "scale_pulse": "Pulso de zoom para enfatizar",
+    "static": "Imagen quieta para que se lea el dato",
+}
+
+# Palabras de transicion_siguiente del guión → (tipo, duración)
+TRANSICIONES = (
+    (("corte", "cut", "seco"), ("cut", 0.0)),
+    (("whip", "barrido", "latigazo"), ("whip", 0.3)),
+    (("glitch",), ("glitch", 0.2)),
+    (("fade", "fundido", "disolv", "crossfade"), ("crossfade", 0.5)),
+    (("zoom",), ("zoom", 0.4)),
+)
+
+# Palabras del visual_prompt que no sirven para buscar stock
+PALABRAS_STOCK_IGNORADAS = {
+    "the", "and", "with", "of", "in", "on", "at", "for", "from", "into", "an", "by",
+    "is", "are", "its", "that", "this", "about", "very", "their", "his", "her",
+    "shot", "scene", "cinematic", "dramatic", "lighting", "light", "dark", "high",
+    "contrast", "style", "photorealistic", "realistic", "detailed", "ultra", "quality",
+    "resolution", "close", "wide", "angle", "view", "image", "photo", "background",
+    "moody", "vertical", "format", "soft", "focus", "lens", "tones", "atmosphere",
+}
+
+TIPS_LOCALES = [
+    "Cortá los silencios de la narración antes de sumar b-roll",
+    "Mantené el b-roll por debajo de 2-3 segundos para no perder ritmo",
+    "Bajá la música 6-8 dB cuando entra la voz",
+    "Poné subtítulos grandes: la mayoría mira sin sonido",
+]
+
+
+def parsear_timestamp(texto):
+    """
+    Convierte un timestamp del guión a segundos ("0:03.5", "1:02", "3.5s", 4).
+    
+    Returns:
+        Segundos, o None si no se puede interpretar
+    """
+    if isinstance(texto, (int, float)):
+        return float(texto)
+    m = re.search(r"(?:(\d+):)?(\d+(?:[.,]\d+)?)", str(texto or ""))
+    if not m:
+        return None
+    return int(m.group(1) or 0) * 60 + float(m.group(2).replace(",", "."))
+
+
+def parsear_rango(texto) -> tuple:
+    """"0:03-0:05" o "0:03.0 - 0:05.0" → (3.0, 5.0); un solo valor → (valor, None)."""
+    partes = re.split(r"\s*[-–]\s*|\s+a\s+", str(texto if texto is not None else ""))
+    valores = [v for v in (parsear_timestamp(p) for p in partes if p.strip()) if v is not None]
+    if not valores:
+        return None, None
+    return valores[0], (valores[1] if len(valores) > 1 else None)
+
+
+def formatear_timestamp(segundos: float, decimas: bool = True) -> str:
+    """Segundos → "0:03.5" (o "0:03" sin décimas)."""
+    minutos, resto = divmod(max(0.0, segundos), 60)
+    if decimas:
+        return f"{int(minutos)}:{resto:04.1f}"
+    return f"{int(minutos)}:{int(resto):02d}"
+
+
+def _ubicar_en_segmento(rango: tuple, inicio: float, fin: float, por_defecto: tuple) -> tuple:
+    """
+    Lleva un rango del guión adentro del segmento. Los tiempos menores al
+    inicio del segmento se toman como relativos a él.
+    """
+    desde, hasta = rango
+    if desde is None:
+        desde, hasta = por_defecto
+    elif desde < inicio and inicio + desde <= fin:
+        desde = inicio + desde
+        hasta = inicio + hasta if hasta is not None else None
+    desde = min(max(desde, inicio), fin)
+    hasta = min(max(hasta if hasta is not None else desde, desde), fin)
+    return desde, hasta
+
+
+def _query_stock(visual_prompt: str, max_palabras: int = 4) -> str:
+    """Query corta en inglés para Pexels/Pixabay a partir del visual_prompt."""
+    palabras = []
+    for palabra in re.findall(r"[^\W\d_]+", (visual_prompt or "").lower()):
+        if len(palabra) > 2 and palabra not in PALABRAS_STOCK_IGNORADAS and palabra not in palabras:
+            palabras.append(palabra)
+    return " ".join(palabras[:max_palabras])
+
+
+def _unicos(items: list) -> list:
+    """Elimina repetidos (sin distinguir mayúsculas) manteniendo el orden."""
+    vistos, unicos = set(), []
+    for item in items:
+        clave = str(item).strip().lower()
+        if clave and clave not in vistos:
+            vistos.add(clave)
+            unicos.append(str(item).strip())
+    return unicos
+
+
+def _motion_edl(motion: str, indice: int, total: int) -> str:
+    """Motion del guión → tipo de motion de la EDL."""
+    if not motion:
+        # Sin motion en el guión: hook con zoom in, cierre con zoom out
+        if indice == 0:
+            return "zoom_in"
+        if indice == total - 1:
+            return "zoom_out"
+        return ("pan_right", "pan_left")[indice % 2]
+    return MOTIONS_EDL.get(motion, normalizar_motion(motion))
+
+
+def _transicion(texto: str, duracion_segmento: float, ultimo: bool) -> dict:
+    """Elige la transición al siguiente segmento."""
+    if ultimo:
+        return {"tipo": "cut", "duracion": 0.0}
+    texto = (texto or "").lower()
+    for claves, (tipo, duracion) in TRANSICIONES:
+        if any(clave in texto for clave in claves):
+            return {"tipo": tipo, "duracion": duracion}
+    # Sin indicación: los segmentos cortos van al corte para no perder ritmo
+    if duracion_segmento < 4:
+        return {"tipo": "cut", "duracion": 0.0}
+    return {"tipo": "crossfade", "duracion": 0.5}
+
+
+def _texto_pantalla(narracion: str, inicio: float, fin: float) -> dict:
+    """
+    Destaca en pantalla la cifra más llamativa de la narración: primero las
+    que tienen unidad (%, millones, mil), si no la primera de dos o más dígitos.
+    """
+    cifras = re.findall(r"\d+(?:[.,]\d+)?(?:\s*(?:%|por ciento|millones|mil)\b|%)?", narracion or "")
+    destacada = next((c for c in cifras if not c.replace(".", "").replace(",", "").isdigit()), None)
+    destacada = destacada or next((c for c in cifras if len(c) >= 2), None)
+    if not destacada:
+        return {"mostrar": False}
+    return {
+        "mostrar": True,
+        "texto": destacada.strip(),
+        "posicion": "centro",
+        "estilo": "número destacado",
+        "desde": formatear_timestamp(inicio),
+        "hasta": formatear_timestamp(inicio + (fin - inicio) * 0.6),
+    }
+
+
+def generar_edl_local(script: dict) -> dict:
+    """
+    Genera la EDL por reglas, sin LLM, con el mismo formato que generar_edl.
+    
+    Toma los cues que ya trae el guión (motion, b-roll, SFX, transición),
+    los ubica en la timeline y arma las listas de compras.
+    
+    Args:
+        script: Guión estructurado del script_generator
+    
+    Returns:
+        dict con instrucciones de edición completas
+    """
+    
+    segmentos = script.get("segmentos", [])
+    timeline = []
+    brolls, sfxs = [], []
+    
+    for i, seg in enumerate(segmentos):
+        inicio = float(seg.get("tiempo_inicio") or 0)
+        fin = max(float(seg.get("tiempo_fin") or 0), inicio)
+        duracion = fin - inicio
+        velocidad, zoom, intensidad_sfx = INTENSIDADES.get(
+            str(seg.get("motion_intensidad", "")).strip().lower(), INTENSIDADES["medio"],
+        )
+        
+        tipo = _motion_edl(seg.get("motion"), i, len(segmentos))
+        motion = {
+            "tipo": tipo,
+            "velocidad": velocidad,
+            "desde": 1.0,
+            "hasta": 1.0 if tipo == "static" else zoom,
+            "nota": NOTAS_MOTION.get(tipo, ""),
+        }
+        
+        broll_inserts = []
+        if seg.get("broll_sugerido"):
+            desde, hasta = _ubicar_en_segmento(
+                parsear_rango(seg.get("broll_timestamp")), inicio, fin,
+                por_defecto=(inicio + duracion * 0.3, inicio + duracion * 0.7),
+            )
+            query = _query_stock(seg.get("visual_prompt")) or seg["broll_sugerido"]
+            brolls.append(query)
+            broll_inserts.append({
+                "timestamp": f"{formatear_timestamp(desde)} - {formatear_timestamp(hasta)}",
+                "descripcion": seg["broll_sugerido"],
+                "buscar_en_stock": query,
+                "razon": "B-roll sugerido en el guión",
+            })
+        
+        sfx = []
+        if seg.get("sfx_sugerido"):
+            momento, _ = _ubicar_en_segmento(
+                parsear_rango(seg.get("sfx_timestamp")), inicio, fin, por_defecto=(inicio, inicio),
+            )
+            sfxs.append(seg["sfx_sugerido"])
+            sfx.append({
+                "timestamp": formatear_timestamp(momento),
+                "efecto": seg["sfx_sugerido"],
+                "intensidad": "fuerte" if tipo == "shake" else intensidad_sfx,
+            })
+        
+        palabras = (seg.get("narracion") or "").split()
+        timeline.append({
+            "segmento_id": seg.get("id", i + 1),
+            "tiempo": f"{formatear_timestamp(inicio, False)} - {formatear_timestamp(fin, False)}",
+            "narracion_preview": " ".join(palabras[:8]) + ("..." if len(palabras) > 8 else ""),
+            "motion": motion,
+            "broll_inserts": broll_inserts,
+            "sfx": sfx,
+            "texto_pantalla": _texto_pantalla(seg.get("narracion") or "", inicio, fin),
+            "transicion_siguiente": _transicion(
+                seg.get("transicion_siguiente"), duracion, ultimo=i == len(segmentos) - 1,
+            ),
+        })
+    
+    duracion_total = script.get("duracion_total") or (segmentos[-1].get("tiempo_fin", 0) if segmentos else 0)
+    tips = list(TIPS_LOCALES)
+    if script.get("notas_edicion"):
+        tips.insert(0, script["notas_edicion"])
+    
+    return {
+        "titulo": script.get("titulo", "Sin título"),
+        "duracion_total": duracion_total,
+        "resumen_edicion": (f"Edición por reglas: {len(timeline)} segmentos con los motions del guión, "
+                            f"{len(brolls)} inserts de b-roll y {len(sfxs)} SFX."),
+        "timeline": timeline,
+        "broll_shopping_list": _unicos(brolls),
+        "sfx_shopping_list": _unicos(sfxs + list(script.get("sfx_resumen", []))),
+        "tips_finales": tips,
+    }
+
+
+def separar_script_y_edl(combinado: dict) -> tuple:
+    """
+    Separa la respuesta combinada de generar_script_y_edl en el guión y la
+    EDL. Lo que el modelo no haya mandado (o mande con otra forma) se
+    completa con el director por reglas.
+    
+    Args:
+        combinado: Guión cuyos segmentos traen "edicion", más un "edicion"
+                   general con resumen, listas y tips
+    
+    Returns:
+        (script, edl)
+    """
+    
+    script = {k: v for k, v in combinado.items() if k != "edicion"}
+    script["segmentos"] = [
+        {k: v for k, v in seg.items() if k != "edicion"}
+        for seg in combinado.get("segmentos", [])
+    ]
+    
+    edl = generar_edl_local(script)
+    for item, seg in zip(edl["timeline"], combinado.get("segmentos", [])):
+        edicion = seg.get("edicion")
+        if not isinstance(edicion, dict):
+            continue
+        for campo in ("motion", "broll_inserts", "sfx", "texto_pantalla", "transicion_siguiente"):
+            if isinstance(edicion.get(campo), type(item[campo])):
+                item[campo] = edicion[campo]
+        if not item["motion"].get("tipo"):
+            item["motion"]["tipo"] = _motion_edl(seg.get("motion"), 0, 0)
+    
+    general = combinado.get("edicion")
+    if isinstance(general, dict):
+        for campo in ("resumen_edicion", "broll_shopping_list", "sfx_shopping_list", "tips_finales"):
+            if general.get(campo) and isinstance(general[campo], type(edl[campo])):
+                edl[campo] = general[campo]
+    
+    return script, edl
+
+
+def enriquecer_edl(edl: dict, script: dict, usar_cache: bool = None) -> dict:
+    """
+    Pasada opcional del LLM sobre una EDL por reglas: solo agrega notas de
+    motion, mejores búsquedas de b-roll y textos en pantalla. La estructura,
+    los motions y los tiempos quedan como los puso el director local.
+    
+    Args:
+        edl: EDL de generar_edl_local
+        script: Guión estructurado
+        usar_cache: False para forzar una respuesta nueva del LLM
+    
+    Returns:
+        dict con la EDL enriquecida
+    """
+    
+    narraciones = {seg.get("id"): seg.get("narracion") or "" for seg in script.get("segmentos", [])}
+    compacto = [
+        {
+            "id": item["segmento_id"],
+            "tiempo": item["tiempo"],
+            "narracion": narraciones.get(item["segmento_id"], ""),
+            "motion": item["motion"]["tipo"],
+            "broll": [br["buscar_en_stock"] for br in item["broll_inserts"]],
+        }
+        for item in edl.get("timeline", [])
+    ]
+    
+    prompt = f"""Esta guía de edición se armó por reglas. Mejorala sin cambiar motions ni tiempos:
+
+{json.dumps(compacto, ensure_ascii=False, separators=(",", ":"))}
+
+Respondé SOLO con los cambios, en este formato JSON:
+{{
+  "resumen_edicion": "descripción general del estilo de edición",
+  "tips_finales": ["consejos de edición para el video"],
+  "segmentos": [
+    {{
+      "segmento_id": number,
+      "nota_motion": "por qué este motion",
+      "broll": {{"descripcion": "qué mostrar", "buscar_en_stock": "query in english", "razon": "por qué"}},
+      "texto_pantalla": {{"mostrar": true, "texto": "texto", "posicion": "centro|arriba|abajo", "estilo": "bold grande|subtítulo|número destacado"}}
+    }}
+  ]
+}}
+Omití los segmentos y campos que no necesiten cambios."""
+    
+    cambios = completar_json(client, DIRECTOR_PROMPT, prompt, temperature=0.7, usar_cache=usar_cache)
+    return aplicar_enriquecimiento(edl, cambios)
+
+
+def aplicar_enriquecimiento(edl: dict, cambios: dict) -> dict:
+    """
+    Combina los cambios del LLM con la EDL por reglas, ignorando lo que no
+    tenga la forma esperada o apunte a segmentos que no existen.
+    """
+    
+    edl = copy.deepcopy(edl)
+    if not isinstance(cambios, dict):
+        return edl
+    
+    if isinstance(cambios.get("resumen_edicion"), str) and cambios["resumen_edicion"].strip():
+        edl["resumen_edicion"] = cambios["resumen_edicion"]
+    tips = cambios.get("tips_finales")
+    if isinstance(tips, list) and all(isinstance(t, str) for t in tips) and tips:
+        edl["tips_finales"] = tips
+    
+    por_id = {item["segmento_id"]: item for item in edl.get("timeline", [])}
+    for cambio in cambios.get("segmentos") or []:
+        if not isinstance(cambio, dict) or cambio.get("segmento_id") not in por_id:
+            continue
+        item = por_id[cambio["segmento_id"]]
+        
+        if isinstance(cambio.get("nota_motion"), str):
+            item["motion"]["nota"] = cambio["nota_motion"]
+        
+        broll = cambio.get("broll")
+        if isinstance(broll, dict) and broll.get("buscar_en_stock"):
+            base = item["broll_inserts"][0] if item["broll_inserts"] else {
+                "timestamp": item["tiempo"], "descripcion": "", "razon": "",
+            }
+            base.update({k: str(broll[k]) for k in ("descripcion", "buscar_en_stock", "razon") if broll.get(k)})
+            item["broll_inserts"][:1] = [base]
+        
+        texto = cambio.get("texto_pantalla")
+        if isinstance(texto, dict) and isinstance(texto.get("mostrar"), bool):
+            anterior = item.get("texto_pantalla", {})
+            inicio = parsear_rango(item["tiempo"])[0] or 0
+            item["texto_pantalla"] = {
+                "desde": anterior.get("desde", formatear_timestamp(inicio)),
+                "hasta": anterior.get("hasta", formatear_timestamp(inicio + 3)),
+                **{k: v for k, v in texto.items() if k in ("mostrar", "texto", "posicion", "estilo")},
+            }
+    
+    edl["broll_shopping_list"] = _unicos([
+        br["buscar_en_stock"] for item in edl.get("timeline", []) for br in item["broll_inserts"]
+    ])
+    return edl
+
+
+def generar_edl(script: dict, usar_cache: bool = None, director: str = None) -> dict:
     """
     Genera un Edit Decision List (EDL) detallado.
     
     Args:
         script: Guión estructurado del script_generator
+        usar_cache: False para forzar una respuesta nueva del LLM
+                    (None = según LLM_CACHE)
+        director: "llm" (GPT-4o), "local" (por reglas, sin LLM) o "local+llm"
+                  (por reglas + enriquecimiento del LLM). Default: EDL_DIRECTOR.
+                  "combinado" solo tiene sentido junto con el guión; para un
+                  guión ya hecho equivale a "local"
     
     Returns:
         dict con instrucciones de edición completas
     """
     
+    director = director or EDL_DIRECTOR
+    if director not in DIRECTORES:
+        raise ValueError(f"Director de edición desconocido: {director} "
+                         f"(disponibles: {', '.join(DIRECTORES)})")
+    
+    if director != "llm":
+        print("🎬 Generando guía de edición (EDL) por reglas...")
+        edl = generar_edl_local(script)
+        if director == "local+llm":
+            print("✨ Enriqueciendo la EDL con el LLM...")
+            edl = enriquecer_edl(edl, script, usar_cache=usar_cache)
+        print(f"✅ EDL generada: {len(edl.get('timeline', []))} segmentos editados")
+        return edl
+    
     prompt = f"""Analizá este guión y generá una guía de edición completa:
 
 {json.dumps(script, ensure_ascii=False, indent=2)}
@@ -129,18 +561,14 @@ Respondé con este formato JSON:
     
     print("🎬 Generando guía de edición (EDL)...")
     
-    response = client.chat.completions.create(
-        model=os.getenv("OPENAI_MODEL", "gpt-4o"),
-        messages=[
-            {"role": "system", "content": DIRECTOR_PROMPT},
-            {"role": "user", "content": prompt},
-        ],
+    edl = completar_json(
+        client,
+        DIRECTOR_PROMPT,
+        prompt,
         temperature=0.7,
-        response_format={"type": "json_object"},
+        usar_cache=usar_cache,
     )
     
-    edl = json.loads(response.choices[0].message.content)
-    
     print(f"✅ EDL generada: {len(edl.get('timeline', []))} segmentos editados")
     
     return edl
@@ -0,0 +1,60 @@
+"""
+Utilidades de ffmpeg compartidas por los backends de render y audio.
+"""
+
+import shutil
+import subprocess
+
+
+def ffmpeg_exe() -> str:
+    """
+    Devuelve el ejecutable de ffmpeg.
+    Usa el binario de imageio-ffmpeg (viene en requirements) y si no, el del sistema.
+    """
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        pass
+
+    exe = shutil.which("ffmpeg")
+    if not exe:
+        raise FileNotFoundError("No se encontró ffmpeg (pip install imageio-ffmpeg)")
+    return exe
+
+
+
+def args_h264(bitrate: str = "5000k", preset: str = "medium", threads: int = 4) -> list:
+    """
+    Parámetros del encoder H.264 comunes a todos los backends de render.
+    """
+    return [
+        "-c:v", "libx264",
+        "-preset", preset,
+        "-b:v", bitrate,
+        "-pix_fmt", "yuv420p",
+        "-threads", str(threads),
+    ]
+
+
+def ejecutar_ffmpeg(args: list) -> None:
+    """
+    Ejecuta ffmpeg con los argumentos dados y falla con el stderr si algo sale mal.
+    """
+    cmd = [ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error"] + list(args)
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg falló ({proc.returncode}): "
+                           f"{proc.stderr.decode(errors='replace')[-500:]}")
+
+
+def muxear_audio(video_path: str, audio_path: str, output_path: str) -> None:
+    """
+    Agrega el audio a un video ya codificado (stream copy del video, audio a AAC).
+    """
+    ejecutar_ffmpeg([
+        "-i", video_path, "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", "copy", "-c:a", "aac", "-shortest",
+        output_path,
+    ])
@@ -0,0 +1,167 @@
+"""
+Filtergraph Renderer
+Backend de render 100% ffmpeg: compila el motion y los fades de cada
+segmento a un único filtergraph (zoompan + fade + concat), sin callbacks
+de Python por frame.
+"""
+
+import os
+import tempfile
+
+from modules.ffmpeg_utils import args_h264, ejecutar_ffmpeg
+from modules.image_handoff import entrada_ffmpeg
+from modules.motion_engine import MARGEN_ESCALA, normalizar_motion
+from modules.pipe_renderer import FADE_SEGUNDOS, frames_por_segmento
+from modules.tracing import span
+
+
+def expresiones_zoompan(motion_type: str, intensidad: float, frames_totales: float) -> dict:
+    """
+    Traduce un motion a expresiones z/x/y de zoompan.
+
+    zoompan muestra una ventana de iw/zoom x ih/zoom con esquina en (x, y).
+    Es la misma ventana que calcula motion_engine.calcular_encuadre,
+    con el avance p = on / (fps * duración).
+
+    Args:
+        motion_type: Tipo de motion (acepta alias en español)
+        intensidad: Factor de zoom máximo
+        frames_totales: fps * duración del segmento (denominador del avance)
+
+    Returns:
+        dict con las expresiones "z", "x" e "y"
+    """
+
+    motion = normalizar_motion(motion_type)
+    scale = intensidad + MARGEN_ESCALA
+    p = f"min(on/{frames_totales:.4f},1)"
+    centro_x = "(iw-iw/zoom)/2"
+    centro_y = "(ih-ih/zoom)/2"
+
+    if motion == "static":
+        return {"z": "1", "x": "0", "y": "0"}
+
+    if motion == "zoom_in":
+        z = f"{scale:.6f}*(1+{intensidad - 1.0:.6f}*{p})"
+        return {"z": z, "x": centro_x, "y": centro_y}
+
+    if motion == "zoom_out":
+        z = f"{scale:.6f}*({intensidad:.6f}-{intensidad - 1.0:.6f}*{p})"
+        return {"z": z, "x": centro_x, "y": centro_y}
+
+    z = f"{scale:.6f}"
+    if motion == "pan_left":
+        return {"z": z, "x": f"(iw-iw/zoom)*(1-{p})", "y": centro_y}
+    if motion == "pan_right":
+        return {"z": z, "x": f"(iw-iw/zoom)*{p}", "y": centro_y}
+    if motion == "ken_burns_up":
+        return {"z": z, "x": centro_x, "y": f"(ih-ih/zoom)*(1-{p})"}
+    # ken_burns_down
+    return {"z": z, "x": centro_x, "y": f"(ih-ih/zoom)*{p}"}
+
+
+def compilar_filtergraph(
+    plan: list,
+    width: int,
+    height: int,
+    fps: int,
+    duracion_max: float = None,
+    fade: float = FADE_SEGUNDOS,
+    frames: list = None,
+) -> tuple:
+    """
+    Compila el plan completo a un filtergraph de ffmpeg.
+    La entrada i del comando tiene que ser la imagen del segmento i.
+    Con frames se usa exactamente esa cantidad por segmento.
+
+    Returns:
+        Tupla (filtergraph, etiqueta_de_salida, segmentos_usados)
+    """
+
+    cadenas = []
+    etiquetas = []
+    cantidades = frames if frames is not None else frames_por_segmento(plan, fps, duracion_max)
+
+    for i, (seg, n_frames) in enumerate(zip(plan, cantidades)):
+        if n_frames == 0:
+            continue
+
+        dur = seg["duracion"]
+        expr = expresiones_zoompan(seg["motion"], seg["intensidad"], fps * dur)
+        filtros = [
+            f"zoompan=z='{expr['z']}':x='{expr['x']}':y='{expr['y']}'"
+            f":d={n_frames}:s={width}x{height}:fps={fps}",
+        ]
+        if fade > 0:
+            filtros.append(f"fade=t=in:st=0:d={fade}")
+            filtros.append(f"fade=t=out:st={max(n_frames / fps - fade, 0):.4f}:d={fade}")
+        filtros += ["setsar=1", "format=yuv420p"]
+
+        etiqueta = f"v{i}"
+        cadenas.append(f"[{i}:v]" + ",".join(filtros) + f"[{etiqueta}]")
+        etiquetas.append(f"[{etiqueta}]")
+
+    cadenas.append("".join(etiquetas) + f"concat=n={len(etiquetas)}:v=1:a=0[vout]")
+    return ";".join(cadenas), "[vout]", len(etiquetas)
+
+
+def renderizar_filtergraph(
+    plan: list,
+    output_path: str,
+    audio_path: str = None,
+    duracion_max: float = None,
+    width: int = 1080,
+    height: int = 1920,
+    fps: int = 30,
+    bitrate: str = "5000k",
+    preset: str = "medium",
+    threads: int = 4,
+    frames: list = None,
+) -> str:
+    """
+    Renderiza un plan de timeline en un solo proceso ffmpeg.
+
+    Args:
+        plan: Lista de segmentos ({"imagen", "duracion", "motion", "intensidad"});
+              "imagen" puede ser un path o un frame en memoria
+        output_path: Path del video
+        audio_path: Narración a muxear (opcional)
+        duracion_max: Corta el video en esta duración (ej: duración del audio)
+        width, height, fps: Formato de salida
+        bitrate, preset, threads: Parámetros del encoder
+        frames: Cantidad exacta de frames por segmento (default: se calcula
+                con frames_por_segmento)
+
+    Returns:
+        Path al video generado
+    """
+
+    filtergraph, salida, usados = compilar_filtergraph(plan, width, height, fps, duracion_max,
+                                                       frames=frames)
+    if usados == 0:
+        raise RuntimeError("El plan no tiene frames para renderizar")
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="frames_", dir=os.path.dirname(output_path) or ".") as tmp_dir:
+        # Las imágenes en memoria se vuelcan crudas (ffmpeg necesita archivos)
+        args = []
+        for k, seg in enumerate(plan):
+            args += entrada_ffmpeg(seg["imagen"], tmp_dir, f"seg_{k:03d}")
+        if audio_path:
+            args += ["-i", audio_path]
+
+        args += ["-filter_complex", filtergraph, "-map", salida]
+        if audio_path:
+            args += ["-map", f"{len(plan)}:a:0"]
+
+        args += args_h264(bitrate, preset, threads)
+        args += ["-r", str(fps)]
+        if audio_path:
+            args += ["-c:a", "aac", "-shortest"]
+        else:
+            args += ["-an"]
+
+        with span("encode.filtergraph", segmentos=len(plan), size=f"{width}x{height}", fps=fps) as s:
+            ejecutar_ffmpeg(args + [output_path])
+            s["bytes"] = os.path.getsize(output_path)
+    return output_path
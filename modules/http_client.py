@@ -0,0 +1,117 @@
+"""
+Cliente HTTP compartido para los providers (DALL-E downloads, ElevenLabs).
+Una sola sesión con pool de conexiones keep-alive, timeouts por defecto,
+reintentos en GET y descargas en streaming directo a disco.
+"""
+
+import os
+import tempfile
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from modules.tracing import anotar
+
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "120"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+
+CHUNK_DESCARGA = 256 * 1024
+
+_sesion = None
+_lock = threading.Lock()
+
+
+def obtener_sesion() -> requests.Session:
+    """
+    Sesión HTTP compartida por todo el proceso (pool keep-alive por host).
+    Los GET se reintentan ante errores de red, 429 y 5xx; los POST no,
+    porque cada llamada a un provider se cobra.
+    """
+    global _sesion
+    if _sesion is None:
+        with _lock:
+            if _sesion is None:
+                reintentos = Retry(
+                    total=3,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset({"GET", "HEAD"}),
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_SIZE,
+                    pool_maxsize=HTTP_POOL_SIZE,
+                    max_retries=reintentos,
+                )
+                sesion = requests.Session()
+                sesion.mount("https://", adapter)
+                sesion.mount("http://", adapter)
+                _sesion = sesion
+    return _sesion
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """Hace un request con la sesión compartida y timeout por defecto."""
+    kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    return obtener_sesion().request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def reintentos(response: requests.Response) -> int:
+    """Cantidad de reintentos que hizo urllib3 hasta obtener la respuesta."""
+    historial = getattr(getattr(response.raw, "retries", None), "history", None)
+    return len(historial) if historial else 0
+
+
+def guardar_stream(response: requests.Response, path: str) -> int:
+    """
+    Escribe el body de una respuesta (abierta con stream=True) en disco por chunks.
+    La escritura es atómica: primero a un temporal y después os.replace.
+
+    Returns:
+        Bytes escritos
+    """
+    directorio = os.path.dirname(path) or "."
+    os.makedirs(directorio, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directorio, suffix=".part")
+    total = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_DESCARGA):
+                f.write(chunk)
+                total += len(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    finally:
+        response.close()
+    return total
+
+
+def descargar_a_archivo(url: str, path: str, **kwargs) -> int:
+    """
+    Descarga una URL a disco en streaming, sin cargar el archivo en memoria.
+
+    Returns:
+        Bytes descargados
+    """
+    response = get(url, stream=True, **kwargs)
+    anotar(reintentos=reintentos(response))
+    try:
+        response.raise_for_status()
+    except requests.HTTPError:
+        response.close()
+        raise
+    return guardar_stream(response, path)
@@ -3,11 +3,22 @@ Módulo 2: Image Generator
 Genera imágenes con DALL-E 3 basadas en los prompts del guión.
 """
 
+import functools
 import os
-import requests
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from modules.cache import DiskCache
+from modules.http_client import descargar_a_archivo
+from modules.image_handoff import obtener_almacen, publicar
+from modules.task_graph import ocupar
+from modules.tracing import propagar, span
+
 load_dotenv()
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -16,6 +27,84 @@ client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 STYLE_PREFIX = """Cinematic, high quality, 4K, dramatic lighting, 
 no text, no watermarks, no logos, no human faces visible, """
 
+IMAGE_MODEL = "dall-e-3"
+
+# Cache de imágenes por prompt (evita pagar dos veces la misma imagen)
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "assets/cache/imagenes")
+IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", "2048"))
+
+_cache_imagenes = None
+
+# Concurrencia y presupuesto de requests a DALL-E (ajustar según el tier de la cuenta)
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "4"))
+IMAGE_REQUESTS_PER_MINUTE = int(os.getenv("IMAGE_REQUESTS_PER_MINUTE", "15"))
+
+_limitador = None
+
+
+class LimitadorPorMinuto:
+    """
+    Limita la cantidad de llamadas en cualquier ventana de 60 segundos.
+    Es thread-safe: cada worker llama a esperar() antes de pegarle a la API.
+    """
+    
+    def __init__(self, max_por_minuto: int):
+        self.max_por_minuto = max_por_minuto
+        self._llamadas = deque()
+        self._lock = threading.Lock()
+    
+    def esperar(self):
+        """Bloquea hasta que haya presupuesto para una llamada más."""
+        if self.max_por_minuto <= 0:
+            return
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                while self._llamadas and ahora - self._llamadas[0] >= 60:
+                    self._llamadas.popleft()
+                if len(self._llamadas) < self.max_por_minuto:
+                    self._llamadas.append(ahora)
+                    return
+                espera = 60 - (ahora - self._llamadas[0])
+            time.sleep(espera)
+
+
+def obtener_limitador() -> LimitadorPorMinuto:
+    """
+    Limitador de requests por minuto compartido por todo el proceso.
+    El límite es de la cuenta, así que varios videos generándose a la vez
+    (batch) tienen que repartirse el mismo presupuesto.
+    """
+    global _limitador
+    if _limitador is None:
+        _limitador = LimitadorPorMinuto(IMAGE_REQUESTS_PER_MINUTE)
+    return _limitador
+
+
+def obtener_cache_imagenes() -> DiskCache:
+    """Cache de imágenes generadas (compartido por todo el proceso)."""
+    global _cache_imagenes
+    if _cache_imagenes is None:
+        _cache_imagenes = DiskCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB * 1024 * 1024, ".png")
+    return _cache_imagenes
+
+
+def info_cache_imagenes() -> dict:
+    """Muestra y devuelve el estado del cache de imágenes."""
+    stats = obtener_cache_imagenes().estadisticas()
+    print(f"🗂️  Cache de imágenes: {stats['directorio']}")
+    print(f"   {stats['entradas']} imágenes | {stats['bytes'] / 1024 / 1024:.1f} MB "
+          f"de {stats['max_bytes'] / 1024 / 1024:.0f} MB")
+    print(f"   Hits: {stats['hits']} | Misses: {stats['misses']}")
+    return stats
+
+
+def purgar_cache_imagenes() -> int:
+    """Borra todas las imágenes del cache."""
+    borradas = obtener_cache_imagenes().purgar()
+    print(f"🗑️  Cache de imágenes purgado: {borradas} imágenes borradas")
+    return borradas
+
 
 def generar_imagen(
     prompt: str,
@@ -24,6 +113,9 @@ def generar_imagen(
     filename: str = "imagen",
     size: str = None,
     quality: str = None,
+    usar_cache: bool = True,
+    limitador: "LimitadorPorMinuto" = None,
+    cupo=None,
 ) -> str:
     """
     Genera una imagen con DALL-E 3.
@@ -35,6 +127,11 @@ def generar_imagen(
         filename: Nombre del archivo (sin extensión)
         size: Tamaño (1024x1024, 1024x1792, 1792x1024)
         quality: standard o hd
+        usar_cache: Reutiliza la imagen si ya se generó con el mismo prompt,
+                    modelo, tamaño y calidad
+        limitador: LimitadorPorMinuto a respetar antes de llamar a la API
+        cupo: Semáforo (o Cupo) que se ocupa durante el request y la descarga,
+              para limitar los requests simultáneos entre varios pipelines
     
     Returns:
         Path al archivo guardado
@@ -49,26 +146,45 @@ def generar_imagen(
     # Limitar a 4000 chars (límite de DALL-E)
     full_prompt = full_prompt[:4000]
     
-    print(f"🖼️  Generando imagen: {filename}...")
-    
-    response = client.images.generate(
-        model="dall-e-3",
-        prompt=full_prompt,
-        n=1,
-        size=size,
-        quality=quality,
-    )
-    
-    image_url = response.data[0].url
-    revised_prompt = response.data[0].revised_prompt
-    
-    # Descargar imagen
     os.makedirs(output_path, exist_ok=True)
     filepath = os.path.join(output_path, f"{filename}.png")
     
-    img_data = requests.get(image_url).content
-    with open(filepath, "wb") as f:
-        f.write(img_data)
+    with span("dalle.imagen", archivo=filename, size=size, quality=quality) as s:
+        cache = obtener_cache_imagenes() if usar_cache else None
+        clave = DiskCache.clave(IMAGE_MODEL, full_prompt, size, quality)
+        s["cache"] = "miss" if cache is not None else "off"
+        if cache is not None:
+            if cache.copiar(clave, filepath):
+                s["cache"] = "hit"
+                print(f"♻️  Imagen desde cache: {filepath}")
+                return filepath
+        
+        if limitador is not None:
+            espera = time.perf_counter()
+            limitador.esperar()
+            s["espera_limite_s"] = round(time.perf_counter() - espera, 3)
+        
+        print(f"🖼️  Generando imagen: {filename}...")
+        
+        with ocupar(cupo):
+            with span("dalle.request", modelo=IMAGE_MODEL):
+                response = client.images.generate(
+                    model=IMAGE_MODEL,
+                    prompt=full_prompt,
+                    n=1,
+                    size=size,
+                    quality=quality,
+                )
+            
+            image_url = response.data[0].url
+            revised_prompt = response.data[0].revised_prompt
+            
+            # Descargar imagen (streaming directo a disco)
+            with span("dalle.descarga") as d:
+                d["bytes"] = descargar_a_archivo(image_url, filepath)
+        
+        if cache is not None:
+            cache.guardar(clave, filepath)
     
     print(f"✅ Imagen guardada: {filepath}")
     print(f"   Prompt revisado: {revised_prompt[:80]}...")
@@ -76,96 +192,264 @@ def generar_imagen(
     return filepath
 
 
-def generar_imagenes_del_script(script: dict, output_path: str = "assets/images") -> list:
+def publicar_para_render(filepath: str, imagen=None):
     """
-    Genera todas las imágenes del guión.
+    Deja la imagen decodificada y encuadrada en memoria para el render
+    (image_handoff). Si falla, el render la lee del archivo como siempre.
+    """
+    if obtener_almacen().max_bytes <= 0:
+        return
+    with span("imagen.preparar", archivo=os.path.basename(filepath)):
+        try:
+            publicar(filepath, imagen)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  No se pudo preparar {filepath} para el render: {e}")
+
+
+def generar_imagenes_del_script(
+    script: dict,
+    output_path: str = "assets/images",
+    max_concurrencia: int = None,
+    max_por_minuto: int = None,
+    placeholder_si_falla: bool = True,
+    cupo=None,
+) -> list:
+    """
+    Genera todas las imágenes del guión en paralelo.
     
     Args:
         script: Guión estructurado (output de script_generator)
         output_path: Carpeta de salida
+        max_concurrencia: Requests simultáneos a DALL-E (default: IMAGE_CONCURRENCY)
+        max_por_minuto: Presupuesto propio de requests por minuto (default: el
+                        limitador compartido del proceso, IMAGE_REQUESTS_PER_MINUTE)
+        placeholder_si_falla: Si un segmento falla, genera un placeholder en su lugar
+                              para no perder el resto ni desalinear la timeline
+        cupo: Cupo global de requests a DALL-E (compartido entre pipelines);
+              si es un Cupo, también acota max_concurrencia
     
     Returns:
-        Lista de paths a las imágenes generadas
+        Lista de paths a las imágenes generadas, en el orden de los segmentos
     """
     
     estilo = script.get("estilo_visual", "")
     segmentos = script.get("segmentos", [])
-    imagenes = []
+    max_concurrencia = max_concurrencia or IMAGE_CONCURRENCY
+    if getattr(cupo, "cupos", None):
+        max_concurrencia = min(max_concurrencia, cupo.cupos)
+    limitador = LimitadorPorMinuto(max_por_minuto) if max_por_minuto else obtener_limitador()
     
-    print(f"\n🎨 Generando {len(segmentos)} imágenes...")
+    print(f"\n🎨 Generando {len(segmentos)} imágenes ({max_concurrencia} en paralelo)...")
     print(f"   Estilo: {estilo[:60]}...")
     
+    pendientes = []
     for seg in segmentos:
-        seg_id = seg["id"]
         prompt = seg.get("visual_prompt", seg.get("visual", ""))
-        
         if not prompt:
-            print(f"⚠️  Segmento {seg_id} sin prompt visual, saltando...")
+            print(f"⚠️  Segmento {seg['id']} sin prompt visual, saltando...")
             continue
-        
-        filepath = generar_imagen(
-            prompt=prompt,
-            estilo_global=estilo,
-            output_path=output_path,
-            filename=f"seg_{seg_id:02d}",
-        )
-        imagenes.append(filepath)
+        pendientes.append((seg, prompt))
+    
+    def generar(seg, prompt):
+        filename = f"seg_{seg['id']:02d}"
+        try:
+            filepath = generar_imagen(
+                prompt=prompt,
+                estilo_global=estilo,
+                output_path=output_path,
+                filename=filename,
+                limitador=limitador,
+                cupo=cupo,
+            )
+        except Exception as e:
+            print(f"❌ Error generando imagen del segmento {seg['id']}: {e}")
+            if not placeholder_si_falla:
+                return None
+            return generar_placeholder(
+                texto=prompt[:100],
+                output_path=output_path,
+                filename=filename,
+            )
+        # Decodificar y encuadrar acá, en paralelo, y no en el camino del render
+        publicar_para_render(filepath)
+        return filepath
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrencia)) as pool:
+        futuros = [pool.submit(propagar(generar), seg, prompt) for seg, prompt in pendientes]
+        resultados = [f.result() for f in futuros]
+    
+    imagenes = [path for path in resultados if path]
     
     print(f"\n✅ {len(imagenes)} imágenes generadas en {output_path}/")
     return imagenes
 
 
 # === ALTERNATIVA GRATIS: Placeholder con Pillow ===
+PLACEHOLDER_FUENTE = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+PLACEHOLDER_FONDO = (30, 30, 35)
+PLACEHOLDER_COLOR = (200, 200, 210)
+
+# Formato → (extensión, opciones de Image.save). El PNG va con compresión
+# baja: pesa un poco más pero se escribe varias veces más rápido
+FORMATOS_PLACEHOLDER = {
+    "png": ("png", {"compress_level": 1}),
+    "jpg": ("jpg", {"quality": 90}),
+    "bmp": ("bmp", {}),
+}
+
+
+@functools.lru_cache(maxsize=8)
+def _fuente(tamano: int = 36):
+    """Fuente de los placeholders (se carga una sola vez por tamaño)."""
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype(PLACEHOLDER_FUENTE, tamano)
+    except OSError:
+        return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=4096)
+def _ancho_glifo(caracter: str, tamano: int = 36) -> float:
+    return _fuente(tamano).getlength(caracter)
+
+
+def _ancho_texto(texto: str, tamano: int = 36) -> float:
+    return sum(_ancho_glifo(c, tamano) for c in texto)
+
+
+def envolver_texto(texto: str, ancho_max: float, tamano: int = 36) -> list:
+    """
+    Word wrap en tiempo lineal: cada palabra se mide una sola vez sumando
+    anchos de glifos cacheados (en vez de medir la línea entera por palabra).
+    """
+    espacio = _ancho_glifo(" ", tamano)
+    lineas, actual, ancho = [], [], 0.0
+    for palabra in texto.split():
+        w = _ancho_texto(palabra, tamano)
+        nuevo = ancho + espacio + w if actual else w
+        if actual and nuevo >= ancho_max:
+            lineas.append(" ".join(actual))
+            actual, ancho = [palabra], w
+        else:
+            actual.append(palabra)
+            ancho = nuevo
+    lineas.append(" ".join(actual))
+    return lineas
+
+
+def renderizar_placeholder(texto: str, size: tuple = (1080, 1920), tamano: int = 36):
+    """
+    Dibuja el placeholder en memoria.
+    
+    Returns:
+        PIL.Image RGB
+    """
+    from PIL import Image, ImageDraw
+    
+    img = Image.new("RGB", size, color=PLACEHOLDER_FONDO)
+    draw = ImageDraw.Draw(img)
+    font = _fuente(tamano)
+    
+    # Texto centrado
+    lineas = envolver_texto(texto, size[0] - 80, tamano)
+    interlineado = round(tamano * 1.4)
+    y = size[1] // 2 - len(lineas) * interlineado // 2
+    for linea in lineas:
+        x = (size[0] - round(_ancho_texto(linea, tamano))) // 2
+        draw.text((x, y), linea, fill=PLACEHOLDER_COLOR, font=font)
+        y += interlineado
+    
+    return img
+
+
 def generar_placeholder(
     texto: str,
     output_path: str = "assets/images",
     filename: str = "placeholder",
     size: tuple = (1080, 1920),
+    formato: str = "png",
 ) -> str:
     """
     Genera una imagen placeholder con texto (para testear sin gastar en API).
-    """
-    from PIL import Image, ImageDraw, ImageFont
-    
-    img = Image.new("RGB", size, color=(30, 30, 35))
-    draw = ImageDraw.Draw(img)
     
-    # Texto centrado
-    try:
-        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 36)
-    except OSError:
-        font = ImageFont.load_default()
-    
-    # Word wrap básico
-    words = texto.split()
-    lines = []
-    current_line = ""
-    for word in words:
-        test = f"{current_line} {word}".strip()
-        bbox = draw.textbbox((0, 0), test, font=font)
-        if bbox[2] - bbox[0] < size[0] - 80:
-            current_line = test
-        else:
-            lines.append(current_line)
-            current_line = word
-    lines.append(current_line)
+    Args:
+        formato: "png", "jpg" o "bmp" (ver FORMATOS_PLACEHOLDER)
+    """
     
-    y = size[1] // 2 - len(lines) * 25
-    for line in lines:
-        bbox = draw.textbbox((0, 0), line, font=font)
-        w = bbox[2] - bbox[0]
-        draw.text(((size[0] - w) // 2, y), line, fill=(200, 200, 210), font=font)
-        y += 50
+    extension, opciones = FORMATOS_PLACEHOLDER[formato]
+    img = renderizar_placeholder(texto, size)
     
     os.makedirs(output_path, exist_ok=True)
-    filepath = os.path.join(output_path, f"{filename}.png")
-    img.save(filepath)
+    filepath = os.path.join(output_path, f"{filename}.{extension}")
+    img.save(filepath, **opciones)
+    publicar_para_render(filepath, img)
     print(f"✅ Placeholder: {filepath}")
     return filepath
 
 
+def generar_placeholders(
+    textos: list,
+    output_path: str = "assets/images",
+    nombres: list = None,
+    size: tuple = (1080, 1920),
+    formato: str = "png",
+    workers: int = None,
+) -> list:
+    """
+    Genera muchos placeholders en paralelo (modo gratis y tests de carga).
+    
+    Args:
+        textos: Texto de cada placeholder
+        output_path: Carpeta de salida
+        nombres: Nombre de archivo (sin extensión) de cada uno
+                 (default: placeholder_00, placeholder_01...)
+        size: (ancho, alto)
+        formato: "png", "jpg", "bmp", o None para no escribir archivos y
+                 devolver arrays uint8 (alto, ancho, 3). Los que se escriben
+                 quedan además en memoria para el render (image_handoff)
+        workers: Threads (default: uno por CPU)
+    
+    Returns:
+        Lista de paths (o de arrays si formato es None), en el orden de textos
+    """
+    
+    if not textos:
+        return []
+    nombres = nombres or [f"placeholder_{i:02d}" for i in range(len(textos))]
+    if formato is not None:
+        extension, opciones = FORMATOS_PLACEHOLDER[formato]
+        os.makedirs(output_path, exist_ok=True)
+    
+    def renderizar(texto, nombre):
+        img = renderizar_placeholder(texto, size)
+        if formato is None:
+            import numpy as np
+            return np.asarray(img)
+        filepath = os.path.join(output_path, f"{nombre}.{extension}")
+        img.save(filepath, **opciones)
+        publicar_para_render(filepath, img)
+        return filepath
+    
+    workers = workers or min(len(textos), os.cpu_count() or 1)
+    with span("imagen.placeholders", cantidad=len(textos), formato=formato or "array"):
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            resultados = list(pool.map(renderizar, textos, nombres))
+    
+    destino = f"{output_path}/" if formato is not None else "memoria"
+    print(f"✅ {len(resultados)} placeholders generados ({destino})")
+    return resultados
+
+
 # === TEST ===
 if __name__ == "__main__":
+    # Inspeccionar / purgar el cache: python -m modules.image_generator [info-cache|purgar-cache]
+    if "info-cache" in sys.argv:
+        info_cache_imagenes()
+        sys.exit(0)
+    if "purgar-cache" in sys.argv:
+        purgar_cache_imagenes()
+        sys.exit(0)
+    
     # Test con placeholder (gratis)
     generar_placeholder(
         "Segmento 1: Cucharas de azúcar apiladas",
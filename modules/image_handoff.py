@@ -0,0 +1,273 @@
+"""
+Image Handoff
+Entrega de imágenes entre la generación y el render sin pasar por PNGs
+intermedios: cada imagen se decodifica y se encuadra a 9:16 una sola vez
+(uint8, al tamaño de salida) y queda en memoria para el render.
+
+- En el mismo proceso: un almacén LRU por path, acotado en MB
+- Para los workers de render (otros procesos): los frames se publican en
+  memoria compartida y viajan como referencia, sin copiarlos por pickle
+- Para ffmpeg (filtergraph), que necesita archivos: se vuelcan crudos
+  (rawvideo, sin codificar) en una carpeta temporal
+
+Si una imagen no está en memoria (ej: etapa reanudada desde un checkpoint)
+se decodifica desde el archivo como siempre.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+from modules.cache import hash_archivo
+
+
+HANDOFF_MAX_MB = int(os.getenv("HANDOFF_MAX_MB", "256"))
+
+# Tamaño al que se encuadran las imágenes (el de OUTPUT del video final)
+TAMANO_ENCUADRE = (1080, 1920)
+
+
+def encuadrar(imagen, target_size: tuple = TAMANO_ENCUADRE) -> np.ndarray:
+    """
+    Recorta al aspect ratio de target_size (centrado) y escala.
+
+    Args:
+        imagen: Path, array uint8 o PIL.Image
+
+    Returns:
+        np.ndarray (alto, ancho, 3) uint8
+    """
+    if isinstance(imagen, np.ndarray):
+        if imagen.shape[1::-1] == tuple(target_size):
+            return imagen
+        img = Image.fromarray(imagen)
+    elif isinstance(imagen, Image.Image):
+        img = imagen
+    else:
+        img = Image.open(imagen)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if img.size == tuple(target_size):
+        return np.asarray(img)
+
+    # Calcular crop para el aspect ratio destino
+    target_ratio = target_size[0] / target_size[1]
+    img_ratio = img.width / img.height
+
+    if img_ratio > target_ratio:
+        # Imagen más ancha: crop horizontal
+        new_width = int(img.height * target_ratio)
+        left = (img.width - new_width) // 2
+        box = (left, 0, left + new_width, img.height)
+    else:
+        # Imagen más alta: crop vertical
+        new_height = int(img.width / target_ratio)
+        top = (img.height - new_height) // 2
+        box = (0, top, img.width, top + new_height)
+
+    # Recorte + escala en una sola pasada
+    return np.asarray(img.resize(tuple(target_size), Image.LANCZOS, box=box))
+
+
+def hash_imagen(imagen) -> str:
+    """Hash del contenido de una imagen (frame en memoria o archivo)."""
+    if not isinstance(imagen, np.ndarray):
+        return hash_archivo(imagen)
+    h = hashlib.blake2b(str(imagen.shape).encode())
+    h.update(np.ascontiguousarray(imagen).data)
+    return h.hexdigest()
+
+
+class AlmacenImagenes:
+    """
+    Frames encuadrados en memoria por (path, tamaño), con expulsión LRU por bytes.
+    Si el archivo existe y cambió desde que se publicó, la entrada se descarta.
+
+    Args:
+        max_bytes: Tamaño máximo total
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _firma(path: str):
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def guardar(self, path: str, frame: np.ndarray):
+        clave = (os.path.abspath(path), frame.shape[1::-1])
+        frame.setflags(write=False)
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= anterior[1].nbytes
+            if frame.nbytes > self.max_bytes:
+                return
+            self._entradas[clave] = (self._firma(path), frame)
+            self.bytes += frame.nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, viejo) = self._entradas.popitem(last=False)
+                self.bytes -= viejo.nbytes
+
+    def obtener(self, path: str, size: tuple):
+        clave = (os.path.abspath(path), tuple(size))
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                firma = self._firma(path)
+                if firma is None or firma == entrada[0]:
+                    self._entradas.move_to_end(clave)
+                    self.hits += 1
+                    return entrada[1]
+                del self._entradas[clave]
+                self.bytes -= entrada[1].nbytes
+            self.misses += 1
+        return None
+
+    def descartar(self, path: str):
+        """Saca de memoria todos los tamaños de un path."""
+        path = os.path.abspath(path)
+        with self._lock:
+            for clave in [c for c in self._entradas if c[0] == path]:
+                self.bytes -= self._entradas.pop(clave)[1].nbytes
+
+    def vaciar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.bytes = 0
+
+
+_almacen = None
+_lock_almacen = threading.Lock()
+
+
+def obtener_almacen() -> AlmacenImagenes:
+    """Almacén de frames compartido por todo el proceso."""
+    global _almacen
+    with _lock_almacen:
+        if _almacen is None:
+            _almacen = AlmacenImagenes(HANDOFF_MAX_MB * 1024 * 1024)
+    return _almacen
+
+
+def publicar(path: str, imagen=None, target_size: tuple = TAMANO_ENCUADRE) -> np.ndarray:
+    """
+    Deja la imagen de un path encuadrada en memoria para el render.
+    Lo llama quien genera la imagen (en su propio thread, fuera del camino
+    crítico del render).
+
+    Args:
+        path: Path de la imagen (aunque el archivo no se haya escrito)
+        imagen: Imagen ya decodificada (array o PIL.Image); None = leer el archivo
+        target_size: (ancho, alto) del encuadre
+
+    Returns:
+        Frame encuadrado
+    """
+    frame = encuadrar(path if imagen is None else imagen, target_size)
+    obtener_almacen().guardar(path, frame)
+    return frame
+
+
+def obtener_encuadrada(imagen, target_size: tuple = TAMANO_ENCUADRE) -> np.ndarray:
+    """
+    Frame encuadrado de una imagen: desde memoria si se publicó, si no
+    decodificando el archivo (y queda en memoria para la próxima).
+    """
+    if not isinstance(imagen, str):
+        return encuadrar(imagen, target_size)
+    frame = obtener_almacen().obtener(imagen, target_size)
+    if frame is None:
+        frame = publicar(imagen, target_size=target_size)
+    return frame
+
+
+def liberar(paths: list):
+    """Suelta los frames de estas imágenes una vez que el render las consumió."""
+    almacen = obtener_almacen()
+    for path in paths:
+        if isinstance(path, str):
+            almacen.descartar(path)
+
+
+# === Memoria compartida (workers de render en otros procesos) ===
+@contextmanager
+def compartir(plan: list):
+    """
+    Copia del plan donde cada imagen en memoria se reemplaza por una
+    referencia a un bloque de memoria compartida. Los bloques se liberan al
+    salir del bloque.
+
+    Yields:
+        Lista de segmentos listos para mandar a un ProcessPoolExecutor
+    """
+    bloques = []
+    compartido = []
+    try:
+        for seg in plan:
+            imagen = seg["imagen"]
+            if isinstance(imagen, np.ndarray):
+                shm = shared_memory.SharedMemory(create=True, size=imagen.nbytes)
+                bloques.append(shm)
+                np.ndarray(imagen.shape, dtype=imagen.dtype, buffer=shm.buf)[...] = imagen
+                imagen = {"shm": shm.name, "shape": imagen.shape, "dtype": str(imagen.dtype)}
+            compartido.append({**seg, "imagen": imagen})
+        yield compartido
+    finally:
+        for shm in bloques:
+            shm.close()
+            shm.unlink()
+
+
+@contextmanager
+def resolver(plan: list):
+    """
+    En el worker: reemplaza las referencias a memoria compartida por arrays
+    (sin copiar) mientras dura el bloque.
+    """
+    abiertos = []
+    resuelto = []
+    try:
+        for seg in plan:
+            imagen = seg["imagen"]
+            if isinstance(imagen, dict) and "shm" in imagen:
+                shm = shared_memory.SharedMemory(name=imagen["shm"])
+                abiertos.append(shm)
+                imagen = np.ndarray(imagen["shape"], dtype=imagen["dtype"], buffer=shm.buf)
+            resuelto.append({**seg, "imagen": imagen})
+        yield resuelto
+    finally:
+        resuelto.clear()
+        for shm in abiertos:
+            shm.close()
+
+
+def entrada_ffmpeg(imagen, directorio: str, nombre: str) -> list:
+    """
+    Argumentos de entrada de ffmpeg para una imagen. Un frame en memoria se
+    vuelca crudo (rawvideo rgb24, sin codificar) a un archivo del directorio.
+
+    Returns:
+        Lista de args (ej: ["-i", path])
+    """
+    if not isinstance(imagen, np.ndarray):
+        return ["-i", imagen]
+    path = os.path.join(directorio, f"{nombre}.rgb")
+    np.ascontiguousarray(imagen, dtype=np.uint8).tofile(path)
+    alto, ancho = imagen.shape[:2]
+    return ["-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{ancho}x{alto}", "-i", path]
@@ -0,0 +1,222 @@
+"""
+Job Queue
+Cola de trabajos en SQLite compartida entre la web app y el worker.
+La app encola y consulta; el worker (worker.py, otro proceso) toma los
+trabajos pendientes, los corre y va registrando el progreso de cada etapa
+con su resultado, así la app lo muestra apenas termina cada una.
+"""
+
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+
+
+JOBS_DB = os.getenv("JOBS_DB", "assets/jobs/cola.sqlite3")
+
+# Estados de trabajos y etapas
+PENDIENTE = "pendiente"
+CORRIENDO = "corriendo"
+TERMINADO = "terminado"
+ERROR = "error"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    params TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    creado REAL NOT NULL,
+    iniciado REAL,
+    terminado REAL,
+    worker_pid INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS etapas (
+    job_id TEXT NOT NULL,
+    etapa TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    inicio REAL,
+    fin REAL,
+    resultado TEXT,
+    PRIMARY KEY (job_id, etapa)
+);
+CREATE INDEX IF NOT EXISTS jobs_estado ON jobs (estado, creado);
+"""
+
+
+def _proceso_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ColaJobs:
+    """
+    Cola de trabajos persistente. Cada operación abre su propia conexión,
+    así se puede usar desde varios threads y procesos a la vez.
+
+    Args:
+        path: Archivo SQLite de la cola (default: JOBS_DB)
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or JOBS_DB
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with closing(self._conectar()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_ESQUEMA)
+
+    def _conectar(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def encolar(self, tipo: str, params: dict) -> str:
+        """
+        Agrega un trabajo a la cola.
+
+        Args:
+            tipo: Tipo de trabajo ("pipeline", "script", "edl", "refinar")
+            params: Parámetros del trabajo (serializables a JSON)
+
+        Returns:
+            ID del trabajo
+        """
+        job_id = time.strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:8]
+        with closing(self._conectar()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, tipo, params, estado, creado) VALUES (?, ?, ?, ?, ?)",
+                (job_id, tipo, json.dumps(params, ensure_ascii=False), PENDIENTE, time.time()),
+            )
+        return job_id
+
+    def tomar_siguiente(self):
+        """
+        Toma el trabajo pendiente más viejo y lo marca como corriendo (atómico
+        entre procesos).
+
+        Returns:
+            dict {"id", "tipo", "params"} o None si no hay pendientes
+        """
+        with closing(self._conectar()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                fila = conn.execute(
+                    "SELECT id, tipo, params FROM jobs WHERE estado = ? ORDER BY creado LIMIT 1",
+                    (PENDIENTE,),
+                ).fetchone()
+                if fila is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET estado = ?, iniciado = ?, worker_pid = ? WHERE id = ?",
+                    (CORRIENDO, time.time(), os.getpid(), fila["id"]),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return {"id": fila["id"], "tipo": fila["tipo"], "params": json.loads(fila["params"])}
+
+    def actualizar_etapa(self, job_id: str, etapa: str, estado: str, resultado=None):
+        """Registra el estado de una etapa (y su resultado cuando termina)."""
+        ahora = time.time()
+        with closing(self._conectar()) as conn:
+            if estado == CORRIENDO:
+                conn.execute(
+                    "INSERT OR REPLACE INTO etapas (job_id, etapa, estado, inicio) VALUES (?, ?, ?, ?)",
+                    (job_id, etapa, estado, ahora),
+                )
+            else:
+                conn.execute(
+                    "INSERT INTO etapas (job_id, etapa, estado, inicio, fin, resultado) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (job_id, etapa) DO UPDATE SET "
+                    "estado = excluded.estado, fin = excluded.fin, resultado = excluded.resultado",
+                    (job_id, etapa, estado, ahora, ahora,
+                     json.dumps(resultado, ensure_ascii=False) if resultado is not None else None),
+                )
+
+    def terminar(self, job_id: str, error: str = None):
+        """Marca el trabajo como terminado (o con error)."""
+        with closing(self._conectar()) as conn:
+            conn.execute(
+                "UPDATE jobs SET estado = ?, terminado = ?, error = ? WHERE id = ?",
+                (ERROR if error else TERMINADO, time.time(), error, job_id),
+            )
+
+    def obtener(self, job_id: str):
+        """
+        Estado de un trabajo con sus etapas.
+
+        Returns:
+            dict {"id", "tipo", "estado", "error", "posicion", "etapas": {etapa: {...}}}
+            o None si no existe
+        """
+        with closing(self._conectar()) as conn:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            filas = conn.execute(
+                "SELECT etapa, estado, inicio, fin, resultado FROM etapas WHERE job_id = ? ORDER BY inicio",
+                (job_id,),
+            ).fetchall()
+            posicion = None
+            if job["estado"] == PENDIENTE:
+                posicion = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE estado = ? AND creado < ?",
+                    (PENDIENTE, job["creado"]),
+                ).fetchone()[0]
+
+        etapas = {}
+        for f in filas:
+            etapas[f["etapa"]] = {
+                "estado": f["estado"],
+                "inicio": f["inicio"],
+                "fin": f["fin"],
+                "resultado": json.loads(f["resultado"]) if f["resultado"] else None,
+            }
+
+        return {
+            "id": job["id"],
+            "tipo": job["tipo"],
+            "estado": job["estado"],
+            "error": job["error"],
+            "creado": job["creado"],
+            "iniciado": job["iniciado"],
+            "terminado": job["terminado"],
+            "posicion": posicion,
+            "etapas": etapas,
+        }
+
+    def reencolar_huerfanos(self) -> int:
+        """
+        Devuelve a pendiente los trabajos que quedaron corriendo en un worker
+        que ya no existe (ej: se cortó el proceso). Con los checkpoints del
+        pipeline, al volver a correr retoman desde la última etapa terminada.
+
+        Returns:
+            Cantidad de trabajos reencolados
+        """
+        with closing(self._conectar()) as conn:
+            filas = conn.execute(
+                "SELECT id, worker_pid FROM jobs WHERE estado = ?", (CORRIENDO,),
+            ).fetchall()
+            huerfanos = [
+                f["id"] for f in filas
+                if f["worker_pid"] != os.getpid()
+                and (not f["worker_pid"] or not _proceso_vivo(f["worker_pid"]))
+            ]
+            for job_id in huerfanos:
+                conn.execute(
+                    "UPDATE jobs SET estado = ?, worker_pid = NULL WHERE id = ? AND estado = ?",
+                    (PENDIENTE, job_id, CORRIENDO),
+                )
+        return len(huerfanos)
@@ -0,0 +1,190 @@
+"""
+Cache de respuestas del LLM.
+Guarda en disco la respuesta JSON de cada llamada a chat completions,
+con clave por modelo + temperatura + system prompt + user prompt.
+Tiene TTL, expulsión LRU por tamaño y se puede desactivar (LLM_CACHE=0)
+cuando se quiere output creativo nuevo.
+"""
+
+import json
+import os
+import time
+
+from modules.cache import DiskCache
+from modules.tracing import span
+
+
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "assets/cache/llm")
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "64"))
+LLM_CACHE_TTL_HORAS = float(os.getenv("LLM_CACHE_TTL_HORAS", "168"))
+
+_cache_llm = None
+
+
+def cache_llm_activo() -> bool:
+    """El cache está activo salvo que LLM_CACHE sea 0/false/no."""
+    return os.getenv("LLM_CACHE", "1").strip().lower() not in ("0", "false", "no")
+
+
+def obtener_cache_llm() -> DiskCache:
+    """Cache de respuestas del LLM (compartido por todo el proceso)."""
+    global _cache_llm
+    if _cache_llm is None:
+        _cache_llm = DiskCache(LLM_CACHE_DIR, LLM_CACHE_MAX_MB * 1024 * 1024, ".json")
+    return _cache_llm
+
+
+def _vigente(path: str) -> bool:
+    """True si la entrada no superó el TTL."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            creado = json.load(f).get("creado", 0)
+    except (OSError, ValueError):
+        return False
+    return time.time() - creado <= LLM_CACHE_TTL_HORAS * 3600
+
+
+def _leer(cache: DiskCache, clave: str):
+    """Contenido crudo de la respuesta cacheada (si existe y está vigente), o None."""
+    if cache is None:
+        return None
+    path = cache.obtener(clave, valida=_vigente)
+    if not path:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        contenido = json.load(f)["contenido"]
+    print("♻️  Respuesta del LLM desde cache")
+    return contenido
+
+
+def _guardar(cache: DiskCache, clave: str, model: str, contenido: str):
+    if cache is None:
+        return
+    entrada = {"creado": time.time(), "modelo": model, "contenido": contenido}
+    cache.guardar_bytes(clave, json.dumps(entrada, ensure_ascii=False).encode("utf-8"))
+
+
+def _anotar_uso(atributos: dict, response):
+    """Agrega al span los tokens usados, si la respuesta los trae."""
+    uso = getattr(response, "usage", None)
+    if uso is not None:
+        atributos["tokens_prompt"] = getattr(uso, "prompt_tokens", None)
+        atributos["tokens_respuesta"] = getattr(uso, "completion_tokens", None)
+
+
+def completar_json(
+    client,
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float,
+    model: str = None,
+    usar_cache: bool = None,
+) -> dict:
+    """
+    Llama a chat completions en modo JSON, pasando primero por el cache.
+
+    Args:
+        client: Cliente de OpenAI
+        system_prompt: Prompt de sistema
+        user_prompt: Prompt del usuario
+        temperature: Temperatura
+        model: Modelo (default: OPENAI_MODEL o gpt-4o)
+        usar_cache: True/False fuerza el uso del cache; None usa LLM_CACHE
+
+    Returns:
+        dict con la respuesta parseada
+    """
+
+    model = model or os.getenv("OPENAI_MODEL", "gpt-4o")
+    if usar_cache is None:
+        usar_cache = cache_llm_activo()
+
+    cache = obtener_cache_llm() if usar_cache else None
+    clave = DiskCache.clave(model, temperature, system_prompt, user_prompt)
+
+    with span("llm.chat", modelo=model, stream=False) as s:
+        contenido = _leer(cache, clave)
+        s["cache"] = "hit" if contenido is not None else ("miss" if cache is not None else "off")
+        if contenido is None:
+            response = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt},
+                ],
+                temperature=temperature,
+                response_format={"type": "json_object"},
+            )
+            contenido = response.choices[0].message.content
+            _anotar_uso(s, response)
+        s["bytes"] = len(contenido.encode("utf-8"))
+        resultado = json.loads(contenido)
+        # Solo se cachean respuestas que son JSON válido
+        if s["cache"] != "hit":
+            _guardar(cache, clave, model, contenido)
+
+    return resultado
+
+
+def completar_json_stream(
+    client,
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float,
+    on_chunk,
+    model: str = None,
+    usar_cache: bool = None,
+) -> dict:
+    """
+    Igual que completar_json pero con la API de streaming: cada fragmento de
+    texto que llega se pasa a on_chunk(texto) mientras el modelo escribe.
+    Si la respuesta está en el cache, se entrega entera en un solo fragmento.
+
+    Returns:
+        dict con la respuesta completa parseada
+    """
+
+    model = model or os.getenv("OPENAI_MODEL", "gpt-4o")
+    if usar_cache is None:
+        usar_cache = cache_llm_activo()
+
+    cache = obtener_cache_llm() if usar_cache else None
+    clave = DiskCache.clave(model, temperature, system_prompt, user_prompt)
+
+    with span("llm.chat", modelo=model, stream=True) as s:
+        contenido = _leer(cache, clave)
+        s["cache"] = "hit" if contenido is not None else ("miss" if cache is not None else "off")
+        if contenido is not None:
+            on_chunk(contenido)
+        else:
+            stream = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt},
+                ],
+                temperature=temperature,
+                response_format={"type": "json_object"},
+                stream=True,
+            )
+
+            partes = []
+            inicio = time.perf_counter()
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not partes:
+                        s["primer_token_s"] = round(time.perf_counter() - inicio, 3)
+                    partes.append(delta)
+                    on_chunk(delta)
+
+            contenido = "".join(partes)
+        s["bytes"] = len(contenido.encode("utf-8"))
+        resultado = json.loads(contenido)
+        # Un stream cortado no es JSON válido y no debe quedar en el cache
+        if s["cache"] != "hit":
+            _guardar(cache, clave, model, contenido)
+
+    return resultado
@@ -0,0 +1,210 @@
+"""
+Media Probe
+Duración, sample rate y canales de un archivo de audio leyendo SOLO los
+headers del contenedor, sin decodificar las muestras:
+
+- WAV: chunks "fmt " y "data" del RIFF (exacto)
+- MP3: primer frame MPEG + header Xing/Info/VBRI (cantidad de frames y
+  delay/padding de LAME); sin esos headers se estima como CBR
+- Otros formatos: el "Duration:" que ffmpeg imprime al abrir el archivo
+
+Los resultados se cachean en memoria por hash del contenido, así el mismo
+audio copiado a otra carpeta (ej: desde el cache de TTS) no se vuelve a leer.
+Ese cache vive solo en el proceso: no se comparte entre corridas ni entre
+workers (leer los headers cuesta menos que hashear el archivo, así que no
+vale la pena persistirlo en un DiskCache).
+"""
+
+import os
+import re
+import struct
+import subprocess
+import threading
+from collections import OrderedDict
+
+from modules.cache import hash_archivo
+from modules.ffmpeg_utils import ffmpeg_exe
+from modules.tracing import span
+
+
+# Cantidad de archivos recordados (cada entrada son unos pocos bytes)
+PROBE_CACHE_MAX = 1024
+
+# === Tablas del header de un frame MPEG de audio ===
+# Versiones: 0 = MPEG 2.5, 2 = MPEG 2, 3 = MPEG 1 (1 está reservado)
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_BITRATES = {
+    (3, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (3, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (3, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_BITRATES[(2, 3)] = _BITRATES[(2, 2)]
+for _capa in (1, 2, 3):
+    _BITRATES[(0, _capa)] = _BITRATES[(2, _capa)]
+
+_por_hash = OrderedDict()
+_por_firma = OrderedDict()
+_lock = threading.Lock()
+
+
+def _info(duracion: float, sample_rate: int, canales: int, formato: str) -> dict:
+    return {
+        "duracion": float(duracion),
+        "sample_rate": int(sample_rate),
+        "canales": int(canales),
+        "formato": formato,
+    }
+
+
+def _probar_wav(f, tamano: int) -> dict:
+    """Lee los chunks del RIFF hasta encontrar "data"."""
+    f.seek(12)
+    fmt = None
+    while True:
+        cabecera = f.read(8)
+        if len(cabecera) < 8:
+            return None
+        chunk, largo = struct.unpack("<4sI", cabecera)
+        if chunk == b"fmt ":
+            fmt = struct.unpack("<HHIIH", f.read(14))
+            f.seek(largo - 14 + (largo & 1), os.SEEK_CUR)
+        elif chunk == b"data":
+            if fmt is None:
+                return None
+            _, canales, sample_rate, _, block_align = fmt
+            # Un WAV escrito en streaming puede no tener el tamaño real
+            datos = min(largo, tamano - f.tell())
+            return _info(datos / (sample_rate * block_align), sample_rate, canales, "wav")
+        else:
+            f.seek(largo + (largo & 1), os.SEEK_CUR)
+
+
+def _probar_mp3(f, tamano: int) -> dict:
+    """Primer frame MPEG (después del ID3v2) y su header Xing/Info/VBRI si lo tiene."""
+    cabecera = f.read(10)
+    inicio = 0
+    if cabecera[:3] == b"ID3":
+        largo = (cabecera[6] << 21) | (cabecera[7] << 14) | (cabecera[8] << 7) | cabecera[9]
+        inicio = 10 + largo + (10 if cabecera[5] & 0x10 else 0)
+
+    # Buscar la sincronización del primer frame en los primeros 64 KB
+    f.seek(inicio)
+    bloque = f.read(65536)
+    for i in range(len(bloque) - 4):
+        if bloque[i] != 0xFF or (bloque[i + 1] & 0xE0) != 0xE0:
+            continue
+        h = struct.unpack(">I", bloque[i:i + 4])[0]
+        version = (h >> 19) & 3
+        capa = 4 - ((h >> 17) & 3)
+        indice_bitrate = (h >> 12) & 15
+        indice_rate = (h >> 10) & 3
+        if version == 1 or capa == 4 or indice_bitrate in (0, 15) or indice_rate == 3:
+            continue
+        break
+    else:
+        return None
+
+    sample_rate = _SAMPLE_RATES[version][indice_rate]
+    bitrate = _BITRATES[(version, capa)][indice_bitrate] * 1000
+    canales = 1 if ((h >> 6) & 3) == 3 else 2
+    if capa == 1:
+        por_frame = 384
+    elif capa == 2 or version == 3:
+        por_frame = 1152
+    else:
+        por_frame = 576
+    frame = bloque[i:i + 200]
+
+    # Xing/Info (LAME): va después del side info del primer frame
+    lado = (32 if canales == 2 else 17) if version == 3 else (17 if canales == 2 else 9)
+    xing = frame[4 + lado:]
+    if xing[:4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", xing[4:8])[0]
+        if flags & 1:
+            frames = struct.unpack(">I", xing[8:12])[0]
+            muestras = frames * por_frame
+            # Delay y padding del encoder (tag LAME), que ffmpeg recorta al decodificar
+            pos = 8 + 4 * bool(flags & 1) + 4 * bool(flags & 2) + 100 * bool(flags & 4) + 4 * bool(flags & 8)
+            lame = xing[pos:pos + 24]
+            if len(lame) == 24 and lame[:4] in (b"LAME", b"Lavf", b"Lavc"):
+                v = int.from_bytes(lame[21:24], "big")
+                delay, padding = v >> 12, v & 0xFFF
+                muestras = max(0, muestras - delay - padding)
+            return _info(muestras / sample_rate, sample_rate, canales, "mp3")
+
+    # VBRI (Fraunhofer): 32 bytes después del header
+    if frame[36:40] == b"VBRI":
+        frames = struct.unpack(">I", frame[50:54])[0]
+        return _info(frames * por_frame / sample_rate, sample_rate, canales, "mp3")
+
+    # Sin header de VBR: estimar como CBR por tamaño
+    datos = tamano - (inicio + i)
+    f.seek(max(0, tamano - 128))
+    if f.read(3) == b"TAG":
+        datos -= 128
+    return _info(datos * 8 / bitrate, sample_rate, canales, "mp3")
+
+
+def _probar_ffmpeg(path: str) -> dict:
+    """Fallback: ffmpeg abre el archivo (solo lee los headers) e imprime su info."""
+    proc = subprocess.run([ffmpeg_exe(), "-hide_banner", "-i", path],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    salida = proc.stderr.decode(errors="replace")
+    duracion = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", salida)
+    audio = re.search(r"Audio: ([^,\s]+).*?(\d+) Hz, ([^,]+)", salida)
+    if not duracion or not audio:
+        raise RuntimeError(f"No se pudo leer la duración de {path}: {salida[-300:]}")
+    h, m, s = duracion.groups()
+    distribucion = audio.group(3).strip()
+    canales = {"mono": 1, "stereo": 2}.get(distribucion)
+    if canales is None:
+        numero = re.match(r"(\d+)", distribucion)
+        canales = int(numero.group(1)) if numero else 2
+    return _info(int(h) * 3600 + int(m) * 60 + float(s), int(audio.group(2)), canales, audio.group(1))
+
+
+def _probar(path: str) -> dict:
+    tamano = os.path.getsize(path)
+    with open(path, "rb") as f:
+        magia = f.read(12)
+        f.seek(0)
+        info = None
+        if magia[:4] == b"RIFF" and magia[8:12] == b"WAVE":
+            info = _probar_wav(f, tamano)
+        elif magia[:3] == b"ID3" or (magia[:1] == b"\xff" and (magia[1] & 0xE0) == 0xE0):
+            info = _probar_mp3(f, tamano)
+    return info or _probar_ffmpeg(path)
+
+
+def _recordar(tabla: OrderedDict, clave, valor):
+    tabla[clave] = valor
+    tabla.move_to_end(clave)
+    while len(tabla) > PROBE_CACHE_MAX:
+        tabla.popitem(last=False)
+
+
+def probar_audio(path: str) -> dict:
+    """
+    Info de un archivo de audio sin decodificarlo.
+
+    Returns:
+        dict {"duracion" (segundos), "sample_rate", "canales", "formato"}
+    """
+    st = os.stat(path)
+    firma = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    with span("audio.probe", archivo=os.path.basename(path)) as s:
+        with _lock:
+            digest = _por_firma.get(firma)
+        if digest is None:
+            digest = hash_archivo(path)
+        with _lock:
+            _recordar(_por_firma, firma, digest)
+            info = _por_hash.get(digest)
+        s["cache"] = "hit" if info is not None else "miss"
+        if info is None:
+            info = _probar(path)
+            with _lock:
+                _recordar(_por_hash, digest, info)
+    return dict(info)
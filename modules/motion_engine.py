@@ -0,0 +1,164 @@
+"""
+Motion Engine
+Calcula el encuadre de cada frame para los motions Ken Burns (zoom, pan,
+movimiento vertical) y genera el frame de salida con UN solo resample
+directo desde los píxeles originales de la imagen.
+"""
+
+import numpy as np
+from PIL import Image
+
+
+# === Alias de motions (script en español / EDL en inglés) ===
+MOTION_ALIASES = {
+    "zoom_in": "zoom_in",
+    "zoom_in_lento": "zoom_in",
+    "zoom_out": "zoom_out",
+    "zoom_out_lento": "zoom_out",
+    "pan_left": "pan_left",
+    "pan_izquierda": "pan_left",
+    "pan_right": "pan_right",
+    "pan_derecha": "pan_right",
+    "ken_burns_up": "ken_burns_up",
+    "ken_burns_arriba": "ken_burns_up",
+    "ken_burns_down": "ken_burns_down",
+    "ken_burns_abajo": "ken_burns_down",
+}
+
+# Margen extra sobre el zoom máximo para tener recorrido en los pans
+MARGEN_ESCALA = 0.05
+
+
+def normalizar_motion(motion_type: str) -> str:
+    """
+    Devuelve el nombre canónico del motion.
+    Cualquier motion desconocido (shake, scale_pulse, etc.) se trata como "static".
+    """
+    return MOTION_ALIASES.get(motion_type or "", "static")
+
+
+def calcular_encuadre(
+    motion_type: str,
+    progress: float,
+    intensidad: float,
+    src_size: tuple,
+    out_size: tuple,
+) -> tuple:
+    """
+    Calcula el rectángulo de la imagen fuente que se ve en un frame.
+
+    Reproduce la semántica clásica: la imagen se agranda a
+    out_size * (intensidad + 0.05) y se recorta una ventana que se mueve
+    o cambia de tamaño según el motion. Acá ese recorte se expresa
+    directamente en coordenadas de la imagen original.
+
+    Args:
+        motion_type: Tipo de motion (acepta alias en español)
+        progress: Avance del clip entre 0.0 y 1.0
+        intensidad: Factor de zoom máximo (1.0 = sin zoom)
+        src_size: (ancho, alto) de la imagen fuente
+        out_size: (ancho, alto) del frame de salida
+
+    Returns:
+        Tupla (x0, y0, x1, y1) en píxeles de la imagen fuente (float)
+    """
+
+    motion = normalizar_motion(motion_type)
+    src_w, src_h = src_size
+    w, h = out_size
+
+    if motion == "static":
+        return (0.0, 0.0, float(src_w), float(src_h))
+
+    p = min(max(progress, 0.0), 1.0)
+    scale = intensidad + MARGEN_ESCALA
+    big_w, big_h = w * scale, h * scale
+
+    if motion in ("zoom_in", "zoom_out"):
+        if motion == "zoom_in":
+            current_scale = 1.0 + (intensidad - 1.0) * p
+        else:
+            current_scale = intensidad - (intensidad - 1.0) * p
+        cw, ch = w / current_scale, h / current_scale
+        x, y = (big_w - cw) / 2, (big_h - ch) / 2
+    else:
+        cw, ch = w, h
+        if motion == "pan_left":
+            x, y = (big_w - w) * (1 - p), (big_h - h) / 2
+        elif motion == "pan_right":
+            x, y = (big_w - w) * p, (big_h - h) / 2
+        elif motion == "ken_burns_up":
+            x, y = (big_w - w) / 2, (big_h - h) * (1 - p)
+        else:  # ken_burns_down
+            x, y = (big_w - w) / 2, (big_h - h) * p
+
+    # Pasar de coordenadas de la imagen agrandada a la imagen fuente
+    fx, fy = src_w / big_w, src_h / big_h
+    x0 = min(max(x * fx, 0.0), float(src_w))
+    y0 = min(max(y * fy, 0.0), float(src_h))
+    x1 = min(max((x + cw) * fx, x0 + 1.0), float(src_w))
+    y1 = min(max((y + ch) * fy, y0 + 1.0), float(src_h))
+    return (x0, y0, x1, y1)
+
+
+def cargar_fuente(imagen) -> Image.Image:
+    """
+    Decodifica la imagen fuente UNA vez (path, array o PIL.Image) a RGB.
+    """
+    if isinstance(imagen, Image.Image):
+        img = imagen
+    elif isinstance(imagen, np.ndarray):
+        img = Image.fromarray(np.asarray(imagen, dtype=np.uint8))
+    else:
+        img = Image.open(imagen)
+
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img.load()
+    return img
+
+
+def crear_generador_frames(
+    imagen,
+    motion_type: str,
+    duration: float,
+    intensidad: float = 1.15,
+    out_size: tuple = (1080, 1920),
+    resample=Image.BILINEAR,
+):
+    """
+    Crea una función make_frame(t) para un motion.
+
+    La imagen se decodifica una sola vez; cada frame se obtiene con un único
+    resize con `box` (recorte + escala en una pasada) sobre los píxeles originales.
+
+    Args:
+        imagen: Path, array uint8 o PIL.Image de la imagen fuente
+        motion_type: Tipo de motion
+        duration: Duración del clip en segundos
+        intensidad: Factor de zoom máximo
+        out_size: (ancho, alto) del frame de salida
+        resample: Filtro de PIL para el resample
+
+    Returns:
+        Función t -> np.ndarray (alto, ancho, 3) uint8
+    """
+
+    src = cargar_fuente(imagen)
+    motion = normalizar_motion(motion_type)
+    out_size = (int(out_size[0]), int(out_size[1]))
+
+    if motion == "static":
+        # Sin movimiento: un solo frame para todo el clip
+        if src.size == out_size:
+            frame = np.asarray(src)
+        else:
+            frame = np.asarray(src.resize(out_size, resample))
+        return lambda t: frame
+
+    def make_frame(t):
+        progress = t / duration if duration > 0 else 0.0
+        box = calcular_encuadre(motion, progress, intensidad, src.size, out_size)
+        return np.asarray(src.resize(out_size, resample, box=box))
+
+    return make_frame
@@ -0,0 +1,201 @@
+"""
+Pipe Renderer
+Backend de render que genera los frames como buffers NumPy y los manda
+directo a un proceso ffmpeg por stdin (rawvideo), sin pasar por el
+compositing de MoviePy.
+"""
+
+import os
+import subprocess
+import time
+import numpy as np
+
+from modules.ffmpeg_utils import args_h264, ffmpeg_exe
+from modules.motion_engine import crear_generador_frames
+from modules.tracing import registrar_span, span
+
+
+FADE_SEGUNDOS = 0.3
+
+
+def factor_fade(t: float, duracion: float, fade: float = FADE_SEGUNDOS) -> float:
+    """
+    Factor de brillo (0-1) para fade in/out desde/hacia negro en el tiempo t.
+    """
+    if fade <= 0:
+        return 1.0
+    return max(0.0, min(1.0, t / fade, (duracion - t) / fade))
+
+
+def frames_por_segmento(plan: list, fps: int, duracion_max: float = None) -> list:
+    """
+    Cantidad de frames de cada segmento del plan.
+    Usa límites acumulados para no arrastrar error de redondeo y corta en duracion_max.
+    """
+    total_frames = None
+    if duracion_max is not None:
+        total_frames = int(round(duracion_max * fps))
+
+    cantidades = []
+    inicio = 0.0
+    for seg in plan:
+        f_ini = int(round(inicio * fps))
+        f_fin = int(round((inicio + seg["duracion"]) * fps))
+        inicio += seg["duracion"]
+        if total_frames is not None:
+            f_ini = min(f_ini, total_frames)
+            f_fin = min(f_fin, total_frames)
+        cantidades.append(max(f_fin - f_ini, 0))
+    return cantidades
+
+
+def comando_encoder(
+    output_path: str,
+    width: int,
+    height: int,
+    fps: int,
+    audio_path: str = None,
+    bitrate: str = "5000k",
+    preset: str = "medium",
+    threads: int = 4,
+) -> list:
+    """
+    Arma el comando ffmpeg que lee rawvideo RGB por stdin y codifica a H.264.
+    Si hay audio_path, lo muxea como AAC.
+    """
+    cmd = [
+        ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "rawvideo",
+        "-pix_fmt", "rgb24",
+        "-s", f"{width}x{height}",
+        "-r", str(fps),
+        "-i", "-",
+    ]
+    if audio_path:
+        cmd += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0"]
+
+    cmd += args_h264(bitrate, preset, threads)
+    if audio_path:
+        cmd += ["-c:a", "aac", "-shortest"]
+    else:
+        cmd += ["-an"]
+
+    cmd.append(output_path)
+    return cmd
+
+
+def escribir_frames(stdin, plan: list, width: int, height: int, fps: int,
+                    duracion_max: float = None, fade: float = FADE_SEGUNDOS,
+                    frames: list = None) -> int:
+    """
+    Genera los frames de todo el plan y los escribe en stdin.
+    Reutiliza un único buffer preasignado para cada frame. Con frames se
+    escribe exactamente esa cantidad por segmento (en vez de calcularla).
+    Registra por separado el tiempo de preparar imágenes, generar frames y
+    escribirlos al encoder (que se bloquea cuando el encoder va atrás).
+
+    Returns:
+        Cantidad de frames escritos
+    """
+
+    buf = np.empty((height, width, 3), dtype=np.uint8)
+
+    escritos = 0
+    t_preparar = t_frames = t_escritura = 0.0
+    reloj = time.perf_counter
+    if frames is None:
+        frames = frames_por_segmento(plan, fps, duracion_max)
+    for seg, n_frames in zip(plan, frames):
+        if n_frames == 0:
+            continue
+
+        dur = seg["duracion"]
+        # El fade out termina en el último frame que realmente se escribe
+        dur_frames = n_frames / fps
+        t0 = reloj()
+        make_frame = crear_generador_frames(
+            seg["imagen"],
+            seg["motion"],
+            duration=dur,
+            intensidad=seg["intensidad"],
+            out_size=(width, height),
+        )
+        t_preparar += reloj() - t0
+
+        for n in range(n_frames):
+            t0 = reloj()
+            t = n / fps
+            frame = make_frame(t)
+            k = factor_fade(t, dur_frames, fade)
+            if k < 1.0:
+                np.multiply(frame, k, out=buf, casting="unsafe")
+            else:
+                buf[...] = frame
+            t1 = reloj()
+            stdin.write(buf.data)
+            t_frames += t1 - t0
+            t_escritura += reloj() - t1
+            escritos += 1
+
+    registrar_span("imagen.preparar", t_preparar, imagenes=len(plan))
+    registrar_span("render.frames", t_frames, frames=escritos)
+    registrar_span("encode.escritura", t_escritura, bytes=escritos * buf.nbytes)
+    return escritos
+
+
+def renderizar_pipe(
+    plan: list,
+    output_path: str,
+    audio_path: str = None,
+    duracion_max: float = None,
+    width: int = 1080,
+    height: int = 1920,
+    fps: int = 30,
+    bitrate: str = "5000k",
+    preset: str = "medium",
+    threads: int = 4,
+    frames: list = None,
+) -> str:
+    """
+    Renderiza un plan de timeline con un proceso ffmpeg de larga vida.
+
+    Args:
+        plan: Lista de segmentos ({"imagen", "duracion", "motion", "intensidad"})
+        output_path: Path del video
+        audio_path: Narración a muxear (opcional)
+        duracion_max: Corta el video en esta duración (ej: duración del audio)
+        width, height, fps: Formato de salida
+        bitrate, preset, threads: Parámetros del encoder
+        frames: Cantidad exacta de frames por segmento (default: se calcula
+                con frames_por_segmento)
+
+    Returns:
+        Path al video generado
+    """
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    cmd = comando_encoder(output_path, width, height, fps, audio_path,
+                          bitrate=bitrate, preset=preset, threads=threads)
+
+    with span("render.pipe", segmentos=len(plan), size=f"{width}x{height}", fps=fps) as s:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            escribir_frames(proc.stdin, plan, width, height, fps, duracion_max, frames=frames)
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+
+        # El encoder termina de vaciar su buffer después de recibir el último frame
+        with span("encode.finalizar"):
+            stderr = proc.stderr.read()
+            proc.wait()
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg falló ({proc.returncode}): "
+                               f"{stderr.decode(errors='replace')[-500:]}")
+        s["bytes"] = os.path.getsize(output_path)
+
+    return output_path
@@ -0,0 +1,131 @@
+"""
+Run Manifest
+Checkpoints de una corrida del pipeline: por cada etapa terminada guarda
+sus artefactos con el hash de su contenido, la clave de sus entradas y su
+resultado. Al reanudar con el mismo run id, las etapas cuyos artefactos
+siguen intactos (y cuyas entradas no cambiaron) se restauran sin volver a
+llamar a los providers.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from modules.cache import DiskCache, hash_archivo
+from modules.tracing import anotar
+
+
+class ManifiestoRun:
+    """
+    Manifiesto JSON de una corrida (se reescribe de forma atómica en cada checkpoint).
+
+    Args:
+        path: Path del manifest.json de la corrida
+        run_id: Identificador de la corrida
+    """
+
+    def __init__(self, path: str, run_id: str = None):
+        self.path = path
+        self.run_id = run_id
+        self._lock = threading.Lock()
+        self.datos = {"run_id": run_id, "etapas": {}}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.datos = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                print(f"⚠️  Manifest ilegible, arrancando de cero: {path}")
+
+    def _escribir(self):
+        directorio = os.path.dirname(self.path) or "."
+        os.makedirs(directorio, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.datos, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def huella(self, nombre: str) -> str:
+        """Hash que identifica la salida registrada de una etapa (o None)."""
+        registro = self.datos["etapas"].get(nombre)
+        return registro["huella"] if registro else None
+
+    def vigente(self, nombre: str, entrada: str):
+        """
+        Devuelve el resultado guardado de la etapa si sigue siendo válido:
+        misma clave de entrada y todos sus artefactos con el mismo hash.
+
+        Returns:
+            (True, resultado) si se puede reusar, (False, None) si no
+        """
+        registro = self.datos["etapas"].get(nombre)
+        if not registro or registro.get("entrada") != entrada:
+            return False, None
+
+        for path, hash_guardado in registro["artefactos"].items():
+            try:
+                if hash_archivo(path) != hash_guardado:
+                    return False, None
+            except OSError:
+                return False, None
+
+        return True, registro["resultado"]
+
+    def registrar(self, nombre: str, entrada: str, artefactos: list, resultado):
+        """
+        Guarda el checkpoint de una etapa terminada.
+
+        Args:
+            nombre: Nombre de la etapa
+            entrada: Clave de sus entradas (parámetros + huellas de dependencias)
+            artefactos: Paths de los archivos que produjo
+            resultado: Valor de retorno de la etapa (serializable a JSON)
+        """
+        hashes = {path: hash_archivo(path) for path in artefactos if path}
+        with self._lock:
+            self.datos["etapas"][nombre] = {
+                "entrada": entrada,
+                "artefactos": hashes,
+                "resultado": resultado,
+                "huella": DiskCache.clave(hashes, resultado),
+                "terminada": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            self._escribir()
+
+    def etapa(self, nombre: str, funcion, parametros=None, artefactos=None):
+        """
+        Envuelve una etapa para que se salte si su checkpoint sigue vigente.
+
+        La clave de entrada combina los parámetros de la etapa con la huella
+        de cada dependencia, así si una etapa anterior se regenera, las que
+        dependen de ella también.
+
+        Args:
+            nombre: Nombre de la etapa
+            funcion: Callable que recibe como kwargs los resultados de sus dependencias
+            parametros: Datos serializables que afectan la salida (tema, perfil...)
+            artefactos: Función resultado -> lista de paths producidos
+
+        Returns:
+            Callable con la misma firma que funcion
+        """
+
+        def correr(**deps):
+            entrada = DiskCache.clave(parametros, {dep: self.huella(dep) for dep in sorted(deps)})
+            ok, resultado = self.vigente(nombre, entrada)
+            if ok:
+                print(f"⏭️  Etapa '{nombre}' reanudada desde el checkpoint")
+                anotar(cache="hit")
+                return resultado
+
+            resultado = funcion(**deps)
+            self.registrar(nombre, entrada, artefactos(resultado) if artefactos else [], resultado)
+            return resultado
+
+        return correr
@@ -4,15 +4,23 @@ Genera guiones estructurados con timestamps, cues de motion, b-roll y SFX.
 Usa GPT-4o o Claude para generar contenido.
 """
 
+import copy
 import json
 import os
+import re
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from modules.llm_cache import completar_json, completar_json_stream
+from modules.editing_director import separar_script_y_edl
+
 load_dotenv()
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# "parche": el modelo devuelve solo los cambios | "completo": devuelve el guión entero
+REFINAR_MODO = os.getenv("REFINAR_MODO", "parche")
+
 SYSTEM_PROMPT = """Sos un director creativo experto en contenido faceless para redes sociales.
 Tu trabajo es crear guiones estructurados en JSON para videos cortos.
 
@@ -68,6 +76,139 @@ Respondé con este formato JSON exacto:
   "notas_edicion": "consejos generales para la edición final"
 }}"""
 
+# Se agrega al prompt del guión para pedir también la guía de edición en la misma respuesta
+EDICION_EN_GUION = """
+
+En la MISMA respuesta incluí la guía de edición del video (no la repitas aparte):
+- En cada segmento agregá la clave "edicion":
+  {{
+    "motion": {{"tipo": "zoom_in|zoom_out|pan_left|pan_right|ken_burns_up|ken_burns_down|shake|static|scale_pulse",
+                "velocidad": "lento|medio|rapido", "desde": 1.0, "hasta": 1.15, "nota": "por qué este motion"}},
+    "broll_inserts": [{{"timestamp": "0:03.0 - 0:05.0", "descripcion": "qué mostrar",
+                        "buscar_en_stock": "search query in english for Pexels", "razon": "por qué acá"}}],
+    "sfx": [{{"timestamp": "0:00.0", "efecto": "nombre del sfx", "intensidad": "sutil|medio|fuerte"}}],
+    "texto_pantalla": {{"mostrar": true, "texto": "texto a mostrar", "posicion": "centro|arriba|abajo",
+                        "estilo": "bold grande|subtítulo|número destacado", "desde": "0:01.0", "hasta": "0:04.0"}},
+    "transicion_siguiente": {{"tipo": "crossfade|cut|whip|zoom", "duracion": 0.5}}
+  }}
+- Al final, en el primer nivel, agregá la clave "edicion":
+  {{"resumen_edicion": "estilo general de edición", "broll_shopping_list": ["queries en inglés"],
+    "sfx_shopping_list": ["sfx necesarios"], "tips_finales": ["consejos de edición"]}}"""
+
+
+class ParserSegmentosIncremental:
+    """
+    Parser incremental del JSON del guión.
+    Se le pasan los fragmentos de texto a medida que llegan del modelo y
+    emite cada objeto de "segmentos" apenas se cierra, sin esperar al resto.
+    
+    Args:
+        on_segmento: Callback (segmento, cabecera) por cada segmento completo.
+                     cabecera tiene los campos de primer nivel escritos antes
+                     de "segmentos" (titulo, estilo_visual, etc.)
+        clave_lista: Clave de la lista a emitir
+    """
+    
+    def __init__(self, on_segmento=None, clave_lista: str = "segmentos"):
+        self.on_segmento = on_segmento
+        self.clave_lista = clave_lista
+        self.buffer = ""
+        self.segmentos = []
+        self.cabecera = {}
+        self._pos = 0
+        self._profundidad = 0
+        self._en_string = False
+        self._escape = False
+        self._inicio_string = 0
+        self._ultimo_string = None
+        self._inicio_lista = None
+        self._lista_cerrada = False
+        self._inicio_objeto = None
+    
+    def _leer_cabecera(self, fin: int) -> dict:
+        """Parsea los campos de primer nivel anteriores a la lista."""
+        prefijo = re.sub(r'"' + re.escape(self.clave_lista) + r'"\s*:\s*$', "",
+                         self.buffer[:fin].rstrip())
+        prefijo = prefijo.rstrip().rstrip(",")
+        try:
+            return json.loads(prefijo + "}")
+        except ValueError:
+            return {}
+    
+    def alimentar(self, texto: str) -> list:
+        """
+        Procesa un fragmento de texto.
+        
+        Returns:
+            Lista de segmentos que se completaron con este fragmento
+        """
+        
+        self.buffer += texto
+        b = self.buffer
+        nuevos = []
+        
+        for i in range(self._pos, len(b)):
+            c = b[i]
+            
+            if self._en_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._en_string = False
+                    self._ultimo_string = b[self._inicio_string + 1:i]
+                continue
+            
+            if c == '"':
+                self._en_string = True
+                self._inicio_string = i
+            elif c in "{[":
+                if (c == "[" and self._profundidad == 1 and self._inicio_lista is None
+                        and self._ultimo_string == self.clave_lista):
+                    self._inicio_lista = i
+                    self.cabecera = self._leer_cabecera(i)
+                elif (c == "{" and self._profundidad == 2 and self._inicio_lista is not None
+                        and not self._lista_cerrada):
+                    self._inicio_objeto = i
+                self._profundidad += 1
+            elif c in "}]":
+                self._profundidad -= 1
+                if c == "}" and self._profundidad == 2 and self._inicio_objeto is not None:
+                    segmento = json.loads(b[self._inicio_objeto:i + 1])
+                    self._inicio_objeto = None
+                    self.segmentos.append(segmento)
+                    nuevos.append(segmento)
+                    if self.on_segmento:
+                        self.on_segmento(segmento, self.cabecera)
+                elif c == "]" and self._profundidad == 1 and self._inicio_lista is not None:
+                    self._lista_cerrada = True
+        
+        self._pos = len(b)
+        return nuevos
+
+
+def _completar_guion(user_prompt: str, usar_cache: bool = None, on_segmento=None) -> dict:
+    """Pide el guión al modelo, en streaming si hay on_segmento."""
+    if on_segmento is None:
+        return completar_json(
+            client,
+            SYSTEM_PROMPT,
+            user_prompt,
+            temperature=0.8,
+            usar_cache=usar_cache,
+        )
+    
+    parser = ParserSegmentosIncremental(on_segmento)
+    return completar_json_stream(
+        client,
+        SYSTEM_PROMPT,
+        user_prompt,
+        temperature=0.8,
+        on_chunk=parser.alimentar,
+        usar_cache=usar_cache,
+    )
+
 
 def generar_script(
     tema: str,
@@ -75,6 +216,8 @@ def generar_script(
     estilo: str = "cinematográfico oscuro",
     tono: str = "informativo y enganchante",
     plataforma: str = "Instagram Reels / TikTok",
+    usar_cache: bool = None,
+    on_segmento=None,
 ) -> dict:
     """
     Genera un guión estructurado completo.
@@ -85,6 +228,12 @@ def generar_script(
         estilo: Estilo visual del contenido
         tono: Tono de la narración
         plataforma: Plataforma destino
+        usar_cache: False para forzar una respuesta nueva del LLM
+                    (None = según LLM_CACHE)
+        on_segmento: Callback (segmento, cabecera). Si se pasa, el guión se
+                     genera en streaming y cada segmento se emite apenas el
+                     modelo lo termina de escribir, para arrancar imágenes y
+                     TTS mientras sigue escribiendo el resto.
     
     Returns:
         dict con el guión estructurado
@@ -101,17 +250,7 @@ def generar_script(
     print(f"🎬 Generando guión sobre: '{tema}'...")
     print(f"   Duración: {duracion}s | Estilo: {estilo}")
     
-    response = client.chat.completions.create(
-        model=os.getenv("OPENAI_MODEL", "gpt-4o"),
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=0.8,
-        response_format={"type": "json_object"},
-    )
-    
-    script = json.loads(response.choices[0].message.content)
+    script = _completar_guion(user_prompt, usar_cache=usar_cache, on_segmento=on_segmento)
     
     print(f"✅ Guión generado: '{script.get('titulo', tema)}'")
     print(f"   Segmentos: {len(script.get('segmentos', []))}")
@@ -119,11 +258,256 @@ def generar_script(
     return script
 
 
-def refinar_script(script: dict, feedback: str) -> dict:
+def generar_script_y_edl(
+    tema: str,
+    duracion: int = 60,
+    estilo: str = "cinematográfico oscuro",
+    tono: str = "informativo y enganchante",
+    plataforma: str = "Instagram Reels / TikTok",
+    usar_cache: bool = None,
+    on_segmento=None,
+) -> tuple:
     """
-    Refina un guión existente basado en feedback del usuario.
+    Genera guión y EDL en una sola llamada al LLM: cada segmento trae sus
+    instrucciones de edición y la respuesta se separa localmente en los
+    formatos de siempre (script.json y edl.json). Evita la segunda llamada
+    y volver a mandar el guión entero como input.
+    
+    Args:
+        Los mismos que generar_script
+    
+    Returns:
+        (script, edl) con los formatos de generar_script y generar_edl
     """
     
+    user_prompt = USER_PROMPT_TEMPLATE.format(
+        duracion=duracion,
+        tema=tema,
+        estilo=estilo,
+        tono=tono,
+        plataforma=plataforma,
+    ) + EDICION_EN_GUION.format()
+    
+    print(f"🎬 Generando guión + guía de edición sobre: '{tema}'...")
+    print(f"   Duración: {duracion}s | Estilo: {estilo}")
+    
+    combinado = _completar_guion(user_prompt, usar_cache=usar_cache, on_segmento=on_segmento)
+    script, edl = separar_script_y_edl(combinado)
+    
+    print(f"✅ Guión generado: '{script.get('titulo', tema)}'")
+    print(f"   Segmentos: {len(script.get('segmentos', []))} (con guía de edición)")
+    
+    return script, edl
+
+
+# === Refinamiento ===
+# Campos que el parche puede tocar (por segmento y de primer nivel)
+CAMPOS_SEGMENTO = (
+    "tiempo_inicio", "tiempo_fin", "narracion", "visual_prompt", "motion",
+    "motion_intensidad", "broll_sugerido", "broll_timestamp", "sfx_sugerido",
+    "sfx_timestamp", "transicion_siguiente",
+)
+CAMPOS_GLOBALES = ("titulo", "duracion_total", "estilo_visual", "notas_edicion")
+CAMPOS_NUMERICOS = ("tiempo_inicio", "tiempo_fin", "duracion_total")
+
+# Trabajo que hay que rehacer cuando cambia cada campo de un segmento
+# (cualquier cambio invalida además la EDL)
+IMPACTO_CAMPOS = {
+    "narracion": ("audio", "render"),
+    "visual_prompt": ("imagenes", "render"),
+    "motion": ("render",),
+    "motion_intensidad": ("render",),
+    "tiempo_inicio": ("render",),
+    "tiempo_fin": ("render",),
+}
+
+REFINAR_PARCHE_TEMPLATE = """Tenés este guión (JSON compacto):
+{script}
+
+El usuario pide estos cambios: "{feedback}"
+
+NO devuelvas el guión completo. Devolvé SOLO un PARCHE JSON con lo que cambia:
+{{
+  "globales": {{"titulo": "string", "estilo_visual": "string", "notas_edicion": "string"}},
+  "cambios": [{{"id": number, "campos": {{"narracion": "string", "visual_prompt": "string"}}}}],
+  "eliminar": [ids de segmentos a quitar],
+  "agregar": [{{"despues_de": id (0 = al principio), "segmento": {{mismos campos que un segmento, sin id}}}}]
+}}
+Incluí solo las claves y campos que cambian. Campos editables de un segmento:
+{campos}. Si cambian las duraciones, ajustá tiempo_inicio y tiempo_fin."""
+
+
+def script_compacto(script: dict) -> str:
+    """Guión sin resúmenes derivados ni espacios, para mandarle al modelo."""
+    compacto = {k: script[k] for k in CAMPOS_GLOBALES if k in script}
+    compacto["segmentos"] = [
+        {k: seg[k] for k in ("id",) + CAMPOS_SEGMENTO if k in seg}
+        for seg in script.get("segmentos", [])
+    ]
+    return json.dumps(compacto, ensure_ascii=False, separators=(",", ":"))
+
+
+def _validar_campos(campos, permitidos: tuple, donde: str):
+    if not isinstance(campos, dict):
+        raise ValueError(f"{donde}: se esperaba un objeto")
+    for campo, valor in campos.items():
+        if campo not in permitidos:
+            raise ValueError(f"{donde}: campo no editable '{campo}'")
+        if campo in CAMPOS_NUMERICOS:
+            if isinstance(valor, bool) or not isinstance(valor, (int, float)) or valor < 0:
+                raise ValueError(f"{donde}: '{campo}' tiene que ser un número >= 0")
+        elif not isinstance(valor, str):
+            raise ValueError(f"{donde}: '{campo}' tiene que ser texto")
+
+
+def _lista(parche: dict, clave: str) -> list:
+    valor = parche.get(clave)
+    if valor is None:
+        return []
+    if not isinstance(valor, list):
+        raise ValueError(f"'{clave}' tiene que ser una lista")
+    return valor
+
+
+def _validar_id(seg_id, donde: str):
+    if isinstance(seg_id, bool) or not isinstance(seg_id, (int, str)):
+        raise ValueError(f"{donde}: id inválido {str(seg_id)[:40]}")
+
+
+def aplicar_parche(script: dict, parche: dict) -> dict:
+    """
+    Aplica un parche de refinamiento sobre una copia del guión.
+    Los ids de los segmentos existentes se mantienen (los nuevos toman ids nuevos).
+    
+    Args:
+        script: Guión original
+        parche: {"globales", "cambios", "eliminar", "agregar"} (todas opcionales)
+    
+    Returns:
+        dict con el guión parcheado
+    
+    Raises:
+        ValueError: Si el parche no tiene la forma esperada, apunta a segmentos
+                    que no existen o deja tiempos inválidos (invertidos,
+                    superpuestos o fuera de orden)
+    """
+    
+    if not isinstance(parche, dict):
+        raise ValueError("El parche no es un objeto JSON")
+    
+    nuevo = copy.deepcopy(script)
+    segmentos = nuevo.get("segmentos", [])
+    por_id = {seg.get("id"): seg for seg in segmentos}
+    
+    globales = parche.get("globales") or {}
+    _validar_campos(globales, CAMPOS_GLOBALES, "globales")
+    nuevo.update(globales)
+    
+    # Segmentos con tiempos nuevos: son los que se revisan contra sus vecinos
+    retocados = set()
+    
+    for cambio in _lista(parche, "cambios"):
+        if not isinstance(cambio, dict):
+            raise ValueError(f"Cambio inválido: {str(cambio)[:80]}")
+        _validar_id(cambio.get("id"), "cambio")
+        if cambio["id"] not in por_id:
+            raise ValueError(f"Cambio sobre un segmento que no existe: {str(cambio)[:80]}")
+        campos = cambio.get("campos") or {}
+        _validar_campos(campos, CAMPOS_SEGMENTO, f"segmento {cambio['id']}")
+        por_id[cambio["id"]].update(campos)
+        if "tiempo_inicio" in campos or "tiempo_fin" in campos:
+            retocados.add(cambio["id"])
+    
+    eliminar = _lista(parche, "eliminar")
+    for seg_id in eliminar:
+        _validar_id(seg_id, "eliminar")
+        if seg_id not in por_id:
+            raise ValueError(f"No existe el segmento a eliminar: {seg_id}")
+    segmentos = [seg for seg in segmentos if seg.get("id") not in eliminar]
+    
+    proximo_id = max([i for i in por_id if isinstance(i, int)] + [0]) + 1
+    for alta in _lista(parche, "agregar"):
+        seg = alta.get("segmento") if isinstance(alta, dict) else None
+        if not isinstance(seg, dict) or not seg.get("narracion") or not seg.get("visual_prompt"):
+            raise ValueError("Segmento nuevo sin narracion o visual_prompt")
+        seg = {k: v for k, v in seg.items() if k != "id"}
+        _validar_campos(seg, CAMPOS_SEGMENTO, "segmento nuevo")
+        
+        despues = alta.get("despues_de")
+        if despues not in (None, ""):
+            _validar_id(despues, "despues_de")
+        if despues in (None, ""):
+            posicion = len(segmentos)
+        elif despues == 0:
+            posicion = 0
+        else:
+            posicion = next((i + 1 for i, s in enumerate(segmentos) if s.get("id") == despues), None)
+            if posicion is None:
+                raise ValueError(f"No existe el segmento despues_de: {despues}")
+        segmentos.insert(posicion, {"id": proximo_id, **seg})
+        retocados.add(proximo_id)
+        proximo_id += 1
+    
+    for seg in segmentos:
+        if seg.get("tiempo_fin", 0) < seg.get("tiempo_inicio", 0):
+            raise ValueError(f"Segmento {seg.get('id')}: tiempo_fin anterior a tiempo_inicio")
+    
+    # Un segmento retocado o nuevo no puede pisar a sus vecinos ni quedar fuera de orden
+    for anterior, siguiente in zip(segmentos, segmentos[1:]):
+        if anterior.get("id") not in retocados and siguiente.get("id") not in retocados:
+            continue
+        if "tiempo_fin" not in anterior or "tiempo_inicio" not in siguiente:
+            continue
+        if siguiente["tiempo_inicio"] < anterior["tiempo_fin"]:
+            raise ValueError(f"Segmentos {anterior.get('id')} y {siguiente.get('id')}: "
+                             "tiempos superpuestos o fuera de orden")
+    
+    nuevo["segmentos"] = segmentos
+    # Los resúmenes se derivan de los segmentos
+    nuevo["broll_resumen"] = [s["broll_sugerido"] for s in segmentos if s.get("broll_sugerido")]
+    nuevo["sfx_resumen"] = list(dict.fromkeys(s["sfx_sugerido"] for s in segmentos if s.get("sfx_sugerido")))
+    return nuevo
+
+
+def segmentos_sucios(anterior: dict, nuevo: dict) -> dict:
+    """
+    Compara dos versiones del guión y dice qué trabajo hay que rehacer.
+    
+    Returns:
+        dict {"segmentos": ids con cambios, "imagenes"/"audio"/"render": ids a
+        regenerar en cada etapa, "agregados", "eliminados", "globales": campos
+        de primer nivel que cambiaron, "edl": True si la EDL quedó vieja}
+    """
+    
+    viejos = {seg.get("id"): seg for seg in anterior.get("segmentos", [])}
+    nuevos = {seg.get("id"): seg for seg in nuevo.get("segmentos", [])}
+    sucios = {"segmentos": [], "imagenes": [], "audio": [], "render": []}
+    
+    for seg_id, seg in nuevos.items():
+        viejo = viejos.get(seg_id)
+        campos = CAMPOS_SEGMENTO if viejo is None else [
+            c for c in CAMPOS_SEGMENTO if seg.get(c) != viejo.get(c)
+        ]
+        if not campos:
+            continue
+        sucios["segmentos"].append(seg_id)
+        for etapa in {e for c in campos for e in IMPACTO_CAMPOS.get(c, ())}:
+            sucios[etapa].append(seg_id)
+    
+    globales = [c for c in CAMPOS_GLOBALES if anterior.get(c) != nuevo.get(c)]
+    if "estilo_visual" in globales:
+        # El estilo va en el prompt de todas las imágenes
+        sucios["imagenes"] = list(nuevos)
+        sucios["render"] = list(nuevos)
+    
+    sucios["agregados"] = [i for i in nuevos if i not in viejos]
+    sucios["eliminados"] = [i for i in viejos if i not in nuevos]
+    sucios["globales"] = globales
+    sucios["edl"] = bool(sucios["segmentos"] or sucios["eliminados"] or globales)
+    return sucios
+
+
+def _refinar_completo(script: dict, feedback: str, usar_cache: bool = None) -> dict:
     prompt = f"""Tenés este guión:
 {json.dumps(script, ensure_ascii=False, indent=2)}
 
@@ -131,19 +515,82 @@ El usuario pide estos cambios: "{feedback}"
 
 Devolvé el guión COMPLETO modificado en el mismo formato JSON."""
     
+    return completar_json(
+        client,
+        SYSTEM_PROMPT,
+        prompt,
+        temperature=0.7,
+        usar_cache=usar_cache,
+    )
+
+
+def refinar_con_parche(script: dict, feedback: str, usar_cache: bool = None) -> tuple:
+    """
+    Refina el guión pidiéndole al modelo solo un parche (qué segmentos y
+    campos cambian) y aplicándolo localmente. Si el parche no es válido,
+    cae al refinamiento completo.
+    
+    Args:
+        script: Guión a refinar
+        feedback: Cambios que pide el usuario
+        usar_cache: False para forzar una respuesta nueva del LLM
+    
+    Returns:
+        (guión refinado, sucios de segmentos_sucios)
+    """
+    
+    prompt = REFINAR_PARCHE_TEMPLATE.format(
+        script=script_compacto(script),
+        feedback=feedback,
+        campos=", ".join(CAMPOS_SEGMENTO),
+    )
+    
     print(f"🔄 Refinando guión con feedback: '{feedback[:50]}...'")
     
-    response = client.chat.completions.create(
-        model=os.getenv("OPENAI_MODEL", "gpt-4o"),
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": prompt},
-        ],
+    parche = completar_json(
+        client,
+        SYSTEM_PROMPT,
+        prompt,
         temperature=0.7,
-        response_format={"type": "json_object"},
+        usar_cache=usar_cache,
     )
     
-    refined = json.loads(response.choices[0].message.content)
+    try:
+        refined = aplicar_parche(script, parche)
+    except ValueError as e:
+        print(f"⚠️  Parche inválido ({e}), pidiendo el guión completo...")
+        refined = _refinar_completo(script, feedback, usar_cache=usar_cache)
+    
+    sucios = segmentos_sucios(script, refined)
+    print(f"✅ Guión refinado: {len(sucios['segmentos'])} segmentos cambiaron "
+          f"(imágenes: {len(sucios['imagenes'])}, audio: {len(sucios['audio'])})")
+    return refined, sucios
+
+
+def refinar_script(script: dict, feedback: str, usar_cache: bool = None, modo: str = None) -> dict:
+    """
+    Refina un guión existente basado en feedback del usuario.
+    
+    Args:
+        script: Guión a refinar
+        feedback: Cambios que pide el usuario
+        usar_cache: False para forzar una respuesta nueva del LLM
+        modo: "parche" (solo los segmentos que cambian) o "completo"
+              (default: REFINAR_MODO)
+    
+    Returns:
+        dict con el guión refinado
+    """
+    
+    modo = modo or REFINAR_MODO
+    if modo not in ("parche", "completo"):
+        raise ValueError(f"Modo de refinamiento desconocido: {modo} (disponibles: parche, completo)")
+    
+    if modo == "parche":
+        return refinar_con_parche(script, feedback, usar_cache=usar_cache)[0]
+    
+    print(f"🔄 Refinando guión con feedback: '{feedback[:50]}...'")
+    refined = _refinar_completo(script, feedback, usar_cache=usar_cache)
     print("✅ Guión refinado")
     return refined
 
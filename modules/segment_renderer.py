@@ -0,0 +1,210 @@
+"""
+Segment Renderer
+Renderiza cada segmento del plan a su propio archivo en paralelo
+(ProcessPoolExecutor), los une con el concat demuxer de ffmpeg sin
+recodificar y muxea la narración al final.
+Los segmentos renderizados se guardan en un cache por contenido, así un
+re-render solo recodifica los segmentos que cambiaron.
+"""
+
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from modules.cache import DiskCache
+from modules.ffmpeg_utils import ejecutar_ffmpeg
+from modules.pipe_renderer import FADE_SEGUNDOS, frames_por_segmento, renderizar_pipe
+from modules.filtergraph_renderer import renderizar_filtergraph
+from modules.image_handoff import compartir, hash_imagen, resolver
+from modules.tracing import capturar_spans, incorporar, span
+
+
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", "assets/cache/segmentos")
+RENDER_CACHE_MAX_MB = int(os.getenv("RENDER_CACHE_MAX_MB", "4096"))
+
+# Cambia cuando cambia cómo se renderiza un segmento (invalida el cache viejo)
+VERSION_SEGMENTO = 2
+
+_cache_render = None
+
+
+def obtener_cache_render() -> DiskCache:
+    """Cache de segmentos renderizados (compartido por todo el proceso)."""
+    global _cache_render
+    if _cache_render is None:
+        _cache_render = DiskCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_MB * 1024 * 1024, ".mp4")
+    return _cache_render
+
+
+def clave_segmento(seg: dict, n_frames: int, backend: str, encoder: dict) -> str:
+    """
+    Clave del cache de un segmento: hash de la imagen + motion + duración + formato.
+    """
+    return DiskCache.clave(
+        VERSION_SEGMENTO,
+        hash_imagen(seg["imagen"]),
+        seg["motion"],
+        seg["intensidad"],
+        seg["duracion"],
+        n_frames,
+        FADE_SEGUNDOS,
+        backend,
+        {k: v for k, v in encoder.items() if k != "threads"},
+    )
+
+
+RENDERERS_SEGMENTO = {
+    "pipe": renderizar_pipe,
+    "ffmpeg": renderizar_filtergraph,
+}
+
+
+def _renderizar_segmento(tarea: dict) -> tuple:
+    """
+    Renderiza un único segmento sin audio (corre en un proceso worker).
+    La imagen llega como referencia a memoria compartida (ver image_handoff).
+
+    Returns:
+        (path, spans) con los spans medidos en el worker, para la traza del padre
+    """
+    render = RENDERERS_SEGMENTO[tarea["backend"]]
+    with capturar_spans() as traza, resolver([tarea["segmento"]]) as plan:
+        with span("render.segmento", indice=tarea["indice"], backend=tarea["backend"]):
+            path = render(
+                plan,
+                tarea["output_path"],
+                audio_path=None,
+                frames=[tarea["n_frames"]],
+                **tarea["encoder"],
+            )
+    return path, traza.spans
+
+
+def concatenar_segmentos(paths: list, output_path: str, audio_path: str = None) -> str:
+    """
+    Une videos con los mismos parámetros de encoder usando el concat demuxer
+    (stream copy, sin recodificar) y muxea el audio si se pasa.
+    """
+
+    lista_path = output_path + ".concat.txt"
+    with open(lista_path, "w", encoding="utf-8") as f:
+        for p in paths:
+            ruta = os.path.abspath(p).replace("'", "'\\''")
+            f.write(f"file '{ruta}'\n")
+
+    args = ["-f", "concat", "-safe", "0", "-i", lista_path]
+    if audio_path:
+        args += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0",
+                 "-c:v", "copy", "-c:a", "aac", "-shortest"]
+    else:
+        args += ["-c", "copy"]
+
+    try:
+        ejecutar_ffmpeg(args + [output_path])
+    finally:
+        os.remove(lista_path)
+
+    return output_path
+
+
+def renderizar_segmentos_paralelo(
+    plan: list,
+    output_path: str,
+    audio_path: str = None,
+    duracion_max: float = None,
+    width: int = 1080,
+    height: int = 1920,
+    fps: int = 30,
+    bitrate: str = "5000k",
+    preset: str = "medium",
+    workers: int = None,
+    backend: str = "pipe",
+    cache: DiskCache = None,
+) -> str:
+    """
+    Renderiza el plan segmento por segmento en paralelo y concatena sin recodificar.
+
+    Args:
+        plan: Lista de segmentos ({"imagen", "duracion", "motion", "intensidad"});
+              "imagen" puede ser un path o un frame en memoria
+        output_path: Path del video final
+        audio_path: Narración a muxear al final
+        duracion_max: Corta el video en esta duración (ej: duración del audio)
+        width, height, fps: Formato de salida
+        bitrate, preset: Parámetros del encoder (idénticos en todos los segmentos)
+        workers: Procesos en paralelo (default: uno por CPU)
+        backend: Renderer de cada segmento ("pipe" o "ffmpeg")
+        cache: DiskCache de segmentos; solo se renderizan los que no están
+
+    Returns:
+        Path al video generado
+    """
+
+    workers = workers or os.cpu_count() or 1
+    cantidades = frames_por_segmento(plan, fps, duracion_max)
+    activos = [(seg, n) for seg, n in zip(plan, cantidades) if n > 0]
+    if not activos:
+        raise RuntimeError("El plan no tiene frames para renderizar")
+
+    # Repartir los cores entre los segmentos simultáneos
+    encoder = {
+        "width": width,
+        "height": height,
+        "fps": fps,
+        "bitrate": bitrate,
+        "preset": preset,
+        "threads": max(1, (os.cpu_count() or 1) // min(workers, len(activos))),
+    }
+
+    out_dir = os.path.dirname(output_path) or "."
+    os.makedirs(out_dir, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(prefix="segmentos_", dir=out_dir) as tmp_dir, \
+            span("render.segmentos", segmentos=len(activos), backend=backend) as s:
+        paths = [None] * len(activos)
+        claves = [None] * len(activos)
+        tareas = []
+        for k, (seg, n) in enumerate(activos):
+            if cache is not None:
+                claves[k] = clave_segmento(seg, n, backend, encoder)
+                # Enlazado a la carpeta temporal: una expulsión concurrente no lo borra antes del concat
+                paths[k] = cache.copiar(claves[k], os.path.join(tmp_dir, f"cache_{k:03d}.mp4"), enlazar=True)
+                if paths[k]:
+                    continue
+            tareas.append({
+                "indice": k,
+                "backend": backend,
+                "segmento": seg,
+                "output_path": os.path.join(tmp_dir, f"seg_{k:03d}.mp4"),
+                # Los frames exactos del plan completo (no recalculados desde una duración)
+                "n_frames": n,
+                "encoder": encoder,
+            })
+
+        if cache is not None:
+            s["cache_hits"] = len(activos) - len(tareas)
+            s["cache_misses"] = len(tareas)
+            print(f"   Cache de segmentos: {len(activos) - len(tareas)} reutilizados, "
+                  f"{len(tareas)} a renderizar")
+
+        if tareas:
+            n_procesos = min(workers, len(tareas))
+            print(f"   Renderizando {len(tareas)} segmentos en {n_procesos} procesos...")
+            # Los frames viajan a los workers por memoria compartida, no por pickle
+            with compartir([t["segmento"] for t in tareas]) as compartidos, \
+                    ProcessPoolExecutor(max_workers=n_procesos) as pool:
+                for tarea, seg in zip(tareas, compartidos):
+                    tarea["segmento"] = seg
+                for tarea, (path, spans) in zip(tareas, pool.map(_renderizar_segmento, tareas)):
+                    incorporar(spans)
+                    k = tarea["indice"]
+                    if cache is not None:
+                        path = cache.guardar(claves[k], path, mover=True)
+                    paths[k] = path
+
+        print("   Concatenando segmentos (stream copy)...")
+        with span("encode.concat", segmentos=len(paths)) as c:
+            concatenar_segmentos(paths, output_path, audio_path)
+            c["bytes"] = os.path.getsize(output_path)
+
+    return output_path
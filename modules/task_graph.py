@@ -0,0 +1,213 @@
+"""
+Task Graph
+Ejecutor mínimo de un grafo de tareas (DAG): cada tarea declara de qué
+tareas depende y qué recurso usa (llm, imágenes, tts, cpu...). Las tareas
+listas corren en paralelo respetando el límite de cada recurso, y se
+registra cuándo empezó y terminó cada una.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+from modules.tracing import anotar, propagar, span
+
+
+class Cupo:
+    """
+    Semáforo que además mide cuánto tiempo estuvo ocupado (para calcular la
+    utilización de un recurso). Se usa como threading.Semaphore: acquire /
+    release o con "with".
+
+    Args:
+        cupos: Cantidad de usos simultáneos permitidos
+    """
+
+    def __init__(self, cupos: int):
+        self.cupos = cupos
+        self.ocupado_s = 0.0
+        self.usos = 0
+        self._semaforo = threading.BoundedSemaphore(cupos)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def acquire(self, blocking: bool = True, timeout: float = None) -> bool:
+        if not self._semaforo.acquire(blocking, timeout):
+            return False
+        self._local.__dict__.setdefault("inicios", []).append(time.perf_counter())
+        return True
+
+    def release(self):
+        inicio = self._local.inicios.pop()
+        with self._lock:
+            self.ocupado_s += time.perf_counter() - inicio
+            self.usos += 1
+        self._semaforo.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+@contextmanager
+def ocupar(cupo):
+    """
+    Ocupa un cupo (Cupo o threading.Semaphore) mientras dura el bloque y
+    anota en el span actual cuánto se esperó. Con None no limita nada.
+    """
+    if cupo is None:
+        yield
+        return
+    espera = time.perf_counter()
+    with cupo:
+        anotar(espera_cupo_s=round(time.perf_counter() - espera, 3))
+        yield
+
+
+class GrafoTareas:
+    """
+    Grafo de tareas con límites de concurrencia por recurso.
+
+    Args:
+        limites: dict recurso -> int (cupos), Cupo o threading.Semaphore. Pasar
+                 el mismo semáforo a varios grafos comparte el cupo entre ellos
+                 (ej: muchos pipelines en un batch). Una tarea cuyo recurso no
+                 está en limites corre sin límite (el recurso queda como etiqueta).
+        on_evento: Callback opcional (evento, nombre, dato) con evento en
+                   "inicio", "fin" o "error"
+    """
+
+    def __init__(self, limites: dict = None, on_evento=None):
+        self.tareas = {}
+        self.tiempos = {}
+        self.inicio_epoch = None
+        self.on_evento = on_evento
+        self._semaforos = {}
+        for recurso, limite in (limites or {}).items():
+            if isinstance(limite, int):
+                limite = threading.BoundedSemaphore(limite)
+            self._semaforos[recurso] = limite
+
+    def agregar(self, nombre: str, funcion, dependencias: tuple = (), recurso: str = None):
+        """
+        Agrega una tarea.
+
+        Args:
+            nombre: Nombre único de la tarea (también es la clave de su resultado)
+            funcion: Callable que recibe como kwargs los resultados de sus dependencias
+            dependencias: Nombres de las tareas que tienen que terminar antes
+            recurso: Recurso que ocupa mientras corre (None = sin límite)
+        """
+        if nombre in self.tareas:
+            raise ValueError(f"Tarea duplicada: {nombre}")
+        self.tareas[nombre] = {
+            "funcion": funcion,
+            "dependencias": tuple(dependencias),
+            "recurso": recurso,
+        }
+
+    def _validar(self):
+        for nombre, tarea in self.tareas.items():
+            for dep in tarea["dependencias"]:
+                if dep not in self.tareas:
+                    raise ValueError(f"La tarea '{nombre}' depende de '{dep}', que no existe")
+
+        # Detectar ciclos con un orden topológico
+        pendientes = {n: set(t["dependencias"]) for n, t in self.tareas.items()}
+        while pendientes:
+            listas = [n for n, deps in pendientes.items() if not deps]
+            if not listas:
+                raise ValueError(f"Hay un ciclo entre: {', '.join(sorted(pendientes))}")
+            for n in listas:
+                del pendientes[n]
+            for deps in pendientes.values():
+                deps.difference_update(listas)
+
+    def _notificar(self, evento: str, nombre: str, dato=None):
+        if self.on_evento:
+            self.on_evento(evento, nombre, dato)
+
+    def _correr(self, nombre: str, kwargs: dict, t0: float):
+        tarea = self.tareas[nombre]
+        semaforo = self._semaforos.get(tarea["recurso"])
+        espera = time.perf_counter()
+        if semaforo is not None:
+            semaforo.acquire()
+        try:
+            inicio = time.perf_counter()
+            self.tiempos[nombre] = {"recurso": tarea["recurso"], "inicio": inicio - t0}
+            self._notificar("inicio", nombre)
+            with span(f"etapa.{nombre}", recurso=tarea["recurso"],
+                      espera_recurso=round(inicio - espera, 3)):
+                resultado = tarea["funcion"](**kwargs)
+            fin = time.perf_counter()
+            self.tiempos[nombre].update({"fin": fin - t0, "duracion": fin - inicio})
+            self._notificar("fin", nombre, resultado)
+            return resultado
+        except BaseException as e:
+            self._notificar("error", nombre, e)
+            raise
+        finally:
+            if semaforo is not None:
+                semaforo.release()
+
+    def ejecutar(self, max_workers: int = None) -> dict:
+        """
+        Corre todas las tareas respetando dependencias y límites.
+        Si una tarea falla, no se arrancan más tareas y se relanza el error.
+
+        Returns:
+            dict nombre -> resultado de cada tarea
+        """
+
+        self._validar()
+        resultados = {}
+        pendientes = dict(self.tareas)
+        en_curso = {}
+        t0 = time.perf_counter()
+        self.inicio_epoch = time.time()
+        error = None
+
+        with ThreadPoolExecutor(max_workers=max_workers or max(len(self.tareas), 1)) as pool:
+            while pendientes or en_curso:
+                if error is None:
+                    listas = [
+                        n for n, t in pendientes.items()
+                        if all(dep in resultados for dep in t["dependencias"])
+                    ]
+                    for nombre in listas:
+                        deps = self.tareas[nombre]["dependencias"]
+                        kwargs = {dep: resultados[dep] for dep in deps}
+                        en_curso[pool.submit(propagar(self._correr), nombre, kwargs, t0)] = nombre
+                        del pendientes[nombre]
+                elif not en_curso:
+                    break
+
+                terminados, _ = wait(list(en_curso), return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    nombre = en_curso.pop(futuro)
+                    try:
+                        resultados[nombre] = futuro.result()
+                    except BaseException as e:
+                        if error is None:
+                            error = e
+
+        if error is not None:
+            raise error
+        return resultados
+
+    def resumen(self) -> str:
+        """Tabla legible con el inicio, fin y duración de cada tarea."""
+        lineas = []
+        for nombre, t in sorted(self.tiempos.items(), key=lambda x: x[1]["inicio"]):
+            fin = t.get("fin")
+            if fin is None:
+                lineas.append(f"   {nombre:<10} {t['inicio']:7.1f}s → (sin terminar)")
+            else:
+                lineas.append(f"   {nombre:<10} {t['inicio']:7.1f}s → {fin:7.1f}s "
+                              f"({t['duracion']:.1f}s, {t['recurso'] or '-'})")
+        return "\n".join(lineas)
@@ -0,0 +1,336 @@
+"""
+Tracing
+Spans estructurados para las etapas del pipeline y cada llamada a un
+provider (LLM, DALL-E, TTS), la preparación de imágenes, el render y el
+encode. Cada span registra duración, bytes, reintentos y hits de cache.
+
+Los spans de una corrida se escriben como JSON lines (TRACE_DIR/<run>.jsonl)
+y al terminar se suman a un textfile de Prometheus (TRACE_DIR/facelessai.prom)
+con histogramas de duración y contadores por span, listo para el textfile
+collector de node_exporter. Sin una traza activa, span() no registra nada.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+TRACING = os.getenv("TRACING", "1").strip().lower() not in ("0", "false", "no")
+TRACE_DIR = os.getenv("TRACE_DIR", "assets/traces")
+
+# Buckets (segundos) del histograma de duración de spans
+BUCKETS_SEGUNDOS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_traza_actual = ContextVar("traza_actual", default=None)
+_span_actual = ContextVar("span_actual", default=None)
+_lock_metricas = threading.Lock()
+
+
+class Traza:
+    """
+    Colector de spans de una corrida.
+
+    Args:
+        run_id: Identificador de la corrida
+        path: JSONL donde se agrega cada span al cerrarse (None = solo en memoria)
+    """
+
+    def __init__(self, run_id: str = None, path: str = None):
+        self.run_id = run_id
+        self.path = path
+        self.spans = []
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def agregar(self, registro: dict):
+        registro = {"run_id": self.run_id, **registro}
+        with self._lock:
+            self.spans.append(registro)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+
+
+@contextmanager
+def traza(run_id: str = None, directorio: str = None):
+    """
+    Activa una traza para el bloque (y los threads lanzados con propagar).
+    Al salir, suma sus spans a las métricas de Prometheus del directorio.
+
+    Args:
+        run_id: Identificador de la corrida (default: timestamp)
+        directorio: Carpeta de trazas y métricas (default: TRACE_DIR)
+
+    Yields:
+        Traza activa, o None si TRACING está apagado
+    """
+    if not TRACING:
+        yield None
+        return
+
+    directorio = directorio or TRACE_DIR
+    run_id = run_id or time.strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
+    actual = Traza(run_id, os.path.join(directorio, f"{run_id}.jsonl"))
+    token = _traza_actual.set(actual)
+    try:
+        yield actual
+    finally:
+        _traza_actual.reset(token)
+        try:
+            actualizar_metricas(actual.spans, directorio)
+        except (OSError, ValueError) as e:
+            # Las métricas son un extra: nunca tapan el resultado (o el error) de la corrida
+            print(f"⚠️  No se pudieron actualizar las métricas: {e}")
+
+
+@contextmanager
+def capturar_spans():
+    """
+    Traza en memoria para un proceso worker: los spans se devuelven al
+    proceso padre, que los incorpora a su traza con incorporar().
+    """
+    actual = Traza()
+    token = _traza_actual.set(actual)
+    try:
+        yield actual
+    finally:
+        _traza_actual.reset(token)
+
+
+@contextmanager
+def span(nombre: str, **atributos):
+    """
+    Mide un bloque como span hijo del span actual.
+
+    El bloque recibe el dict de atributos y puede completarlo mientras corre
+    (ej: s["bytes"] = ..., s["cache"] = "hit"). Convenciones: "bytes",
+    "reintentos", "cache" ("hit"/"miss"), "cache_hits"/"cache_misses".
+    """
+    actual = _traza_actual.get()
+    if actual is None:
+        yield atributos
+        return
+
+    span_id = uuid.uuid4().hex[:12]
+    padre = _span_actual.get()
+    token = _span_actual.set((span_id, atributos))
+    inicio = time.time()
+    t0 = time.perf_counter()
+    error = None
+    try:
+        yield atributos
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _span_actual.reset(token)
+        actual.agregar({
+            "span_id": span_id,
+            "padre": padre[0] if padre else None,
+            "nombre": nombre,
+            "inicio": inicio,
+            "duracion": time.perf_counter() - t0,
+            "ok": error is None,
+            "error": error,
+            **atributos,
+        })
+
+
+def registrar_span(nombre: str, duracion: float, **atributos):
+    """Registra un span ya medido (ej: tiempo acumulado dentro de un loop)."""
+    actual = _traza_actual.get()
+    if actual is None:
+        return
+    padre = _span_actual.get()
+    actual.agregar({
+        "span_id": uuid.uuid4().hex[:12],
+        "padre": padre[0] if padre else None,
+        "nombre": nombre,
+        "inicio": time.time() - duracion,
+        "duracion": duracion,
+        "ok": True,
+        "error": None,
+        **atributos,
+    })
+
+
+def anotar(**atributos):
+    """Agrega atributos al span actual (los numéricos se acumulan)."""
+    actual = _span_actual.get()
+    if actual is None:
+        return
+    _, attrs = actual
+    for clave, valor in atributos.items():
+        if isinstance(valor, (int, float)) and isinstance(attrs.get(clave), (int, float)):
+            attrs[clave] += valor
+        else:
+            attrs[clave] = valor
+
+
+def incorporar(spans: list):
+    """Agrega a la traza actual spans capturados en otro proceso."""
+    actual = _traza_actual.get()
+    if actual is None:
+        return
+    padre = _span_actual.get()
+    for registro in spans:
+        registro = dict(registro)
+        registro.pop("run_id", None)
+        if registro.get("padre") is None and padre:
+            registro["padre"] = padre[0]
+        actual.agregar(registro)
+
+
+def propagar(funcion):
+    """
+    Envuelve una función para que, al correr en otro thread (pools), sus
+    spans queden en la traza y bajo el span de quien la lanzó.
+    """
+    traza_padre = _traza_actual.get()
+    span_padre = _span_actual.get()
+
+    def envuelta(*args, **kwargs):
+        t1 = _traza_actual.set(traza_padre)
+        t2 = _span_actual.set(span_padre)
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            _span_actual.reset(t2)
+            _traza_actual.reset(t1)
+
+    return envuelta
+
+
+# === Métricas Prometheus ===
+@contextmanager
+def _lock_archivo(path: str, timeout: float = 30.0):
+    """Lock entre procesos con un archivo creado en modo exclusivo."""
+    limite = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > timeout:
+                    os.remove(path)  # Lock abandonado por un proceso muerto
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() > limite:
+                raise TimeoutError(f"No se pudo tomar el lock {path}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(path)
+
+
+def _escribir_atomico(path: str, texto: str):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(texto)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _sumar_spans(estado: dict, spans: list):
+    for s in spans:
+        m = estado["spans"].setdefault(s["nombre"], {
+            "count": 0, "sum": 0.0, "buckets": [0] * len(BUCKETS_SEGUNDOS),
+            "errores": 0, "bytes": 0, "reintentos": 0, "cache_hits": 0, "cache_misses": 0,
+        })
+        m["count"] += 1
+        m["sum"] += s["duracion"]
+        for i, limite in enumerate(BUCKETS_SEGUNDOS):
+            if s["duracion"] <= limite:
+                m["buckets"][i] += 1
+        if not s.get("ok", True):
+            m["errores"] += 1
+        m["bytes"] += int(s.get("bytes") or 0)
+        m["reintentos"] += int(s.get("reintentos") or 0)
+        m["cache_hits"] += int(s.get("cache_hits") or 0) + (s.get("cache") == "hit")
+        m["cache_misses"] += int(s.get("cache_misses") or 0) + (s.get("cache") == "miss")
+
+
+def _formatear_prometheus(estado: dict) -> str:
+    lineas = [
+        "# HELP facelessai_runs_total Corridas trazadas.",
+        "# TYPE facelessai_runs_total counter",
+        f"facelessai_runs_total {estado['runs']}",
+        "# HELP facelessai_span_duration_seconds Duración de los spans por nombre.",
+        "# TYPE facelessai_span_duration_seconds histogram",
+    ]
+    spans = sorted(estado["spans"].items())
+    for nombre, m in spans:
+        for limite, n in zip(BUCKETS_SEGUNDOS, m["buckets"]):
+            lineas.append(f'facelessai_span_duration_seconds_bucket{{span="{nombre}",le="{limite}"}} {n}')
+        lineas.append(f'facelessai_span_duration_seconds_bucket{{span="{nombre}",le="+Inf"}} {m["count"]}')
+        lineas.append(f'facelessai_span_duration_seconds_sum{{span="{nombre}"}} {m["sum"]:.6f}')
+        lineas.append(f'facelessai_span_duration_seconds_count{{span="{nombre}"}} {m["count"]}')
+
+    contadores = [
+        ("errores", "facelessai_span_errors_total", "Spans terminados con error."),
+        ("bytes", "facelessai_span_bytes_total", "Bytes transferidos o escritos."),
+        ("reintentos", "facelessai_span_retries_total", "Reintentos de red."),
+        ("cache_hits", "facelessai_span_cache_hits_total", "Hits de cache."),
+        ("cache_misses", "facelessai_span_cache_misses_total", "Misses de cache."),
+    ]
+    for clave, metrica, ayuda in contadores:
+        lineas.append(f"# HELP {metrica} {ayuda}")
+        lineas.append(f"# TYPE {metrica} counter")
+        for nombre, m in spans:
+            lineas.append(f'{metrica}{{span="{nombre}"}} {m[clave]}')
+
+    return "\n".join(lineas) + "\n"
+
+
+def _leer_estado(path: str) -> dict:
+    """Acumulado de métricas; si el archivo falta o está roto, arranca de cero."""
+    vacio = {"runs": 0, "spans": {}}
+    if not os.path.exists(path):
+        return vacio
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            estado = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  metricas.json ilegible ({e}), se reinician las métricas")
+        return vacio
+    if not isinstance(estado, dict) or not isinstance(estado.get("runs"), int) \
+            or not isinstance(estado.get("spans"), dict):
+        print("⚠️  metricas.json con formato inesperado, se reinician las métricas")
+        return vacio
+    return estado
+
+
+def actualizar_metricas(spans: list, directorio: str = None) -> str:
+    """
+    Suma los spans de una corrida al acumulado y reescribe el textfile de Prometheus.
+
+    Returns:
+        Path del archivo .prom
+    """
+    directorio = directorio or TRACE_DIR
+    os.makedirs(directorio, exist_ok=True)
+    estado_path = os.path.join(directorio, "metricas.json")
+    prom_path = os.path.join(directorio, "facelessai.prom")
+
+    with _lock_metricas, _lock_archivo(estado_path + ".lock"):
+        estado = _leer_estado(estado_path)
+        estado["runs"] += 1
+        _sumar_spans(estado, spans)
+        _escribir_atomico(estado_path, json.dumps(estado, ensure_ascii=False))
+        _escribir_atomico(prom_path, _formatear_prometheus(estado))
+
+    return prom_path
@@ -1,211 +1,200 @@
 """
 Módulo 5: Video Assembler
 Ensambla el video final con imágenes, audio, motions y transiciones.
-Usa MoviePy para composición y efectos Ken Burns.
+Renderiza por pipe directo a ffmpeg, con MoviePy como fallback.
 """
 
 import os
 import numpy as np
 from moviepy.editor import (
     ImageClip,
-    AudioFileClip,
     CompositeVideoClip,
     concatenate_videoclips,
     ColorClip,
     TextClip,
     CompositeAudioClip,
+    VideoClip,
 )
 from moviepy.video.fx.all import resize, crop, fadein, fadeout
 from PIL import Image
 
+from modules.ffmpeg_utils import muxear_audio
+from modules.image_handoff import liberar, obtener_almacen, obtener_encuadrada, publicar
+from modules.media_probe import probar_audio
+from modules.motion_engine import crear_generador_frames, normalizar_motion
+from modules.pipe_renderer import renderizar_pipe
+from modules.filtergraph_renderer import renderizar_filtergraph
+from modules.segment_renderer import obtener_cache_render, renderizar_segmentos_paralelo
+from modules.tracing import span
+
 
 # === Resolución de salida (9:16 para Reels/TikTok) ===
 OUTPUT_WIDTH = 1080
 OUTPUT_HEIGHT = 1920
 FPS = 30
 
+# Guardar también las imágenes 9:16 como _processed.png (el render no las usa)
+GUARDAR_PROCESADAS = os.getenv("GUARDAR_PROCESADAS", "0").strip().lower() in ("1", "true", "si", "sí")
+
+# Cache de segmentos renderizados: sirve para re-renders incrementales, pero
+# obliga a renderizar por segmento + concat, así que es opcional
+RENDER_CACHE = os.getenv("RENDER_CACHE", "0").strip().lower() in ("1", "true", "si", "sí")
+
+# === Perfiles de render ===
+# "final" es la calidad de publicación; "draft" sirve para chequear timing rápido
+PERFILES_RENDER = {
+    "final": {
+        "width": OUTPUT_WIDTH,
+        "height": OUTPUT_HEIGHT,
+        "fps": FPS,
+        "preset": "medium",
+        "bitrate": "5000k",
+        "threads": 4,
+    },
+    "draft": {
+        "width": 540,
+        "height": 960,
+        "fps": 15,
+        "preset": "ultrafast",
+        "bitrate": "1500k",
+        "threads": 4,
+    },
+}
+
+# Backends de render que escriben directo con ffmpeg (MoviePy es el fallback)
+BACKENDS_FFMPEG = {
+    "pipe": renderizar_pipe,
+    "ffmpeg": renderizar_filtergraph,
+}
+
+
+def obtener_perfil(perfil="final") -> dict:
+    """
+    Devuelve la configuración de un perfil de render por nombre (o el dict tal cual).
+    """
+    if isinstance(perfil, dict):
+        return {**PERFILES_RENDER["final"], **perfil}
+    if perfil not in PERFILES_RENDER:
+        raise ValueError(f"Perfil de render desconocido: {perfil} "
+                         f"(disponibles: {', '.join(PERFILES_RENDER)})")
+    return PERFILES_RENDER[perfil]
+
 
-def aplicar_motion(clip, motion_type: str, intensidad: float = 1.15):
+def aplicar_motion(clip, motion_type: str, intensidad: float = 1.15,
+                   size: tuple = (OUTPUT_WIDTH, OUTPUT_HEIGHT)):
     """
     Aplica un efecto de movimiento (Ken Burns) a un ImageClip.
     
+    La imagen se decodifica una sola vez y cada frame se genera con un único
+    resample (recorte + escala) desde los píxeles originales, sin redimensionar
+    la imagen completa en cada frame.
+    
     Args:
         clip: ImageClip de moviepy
         motion_type: Tipo de motion
         intensidad: Factor de zoom máximo (1.0 = sin zoom, 1.2 = 20% zoom)
+        size: (ancho, alto) del frame de salida
     
     Returns:
         VideoClip con el motion aplicado
     """
     
-    w, h = OUTPUT_WIDTH, OUTPUT_HEIGHT
+    w, h = size
     duration = clip.duration
     
-    # Hacer la imagen más grande para permitir movimiento
-    scale = intensidad + 0.05  # Un poco más grande que el zoom máximo
-    big_w, big_h = int(w * scale), int(h * scale)
-    
-    # Redimensionar imagen para que sea más grande que el frame
-    clip_big = clip.resize((big_w, big_h))
-    
-    if motion_type == "zoom_in" or motion_type == "zoom_in_lento":
-        # Zoom IN: empieza normal, termina acercado
-        def zoom_in(t):
-            progress = t / duration
-            current_scale = 1.0 + (intensidad - 1.0) * progress
-            cw = int(w / current_scale)
-            ch = int(h / current_scale)
-            x = (big_w - cw) // 2
-            y = (big_h - ch) // 2
-            return clip_big.get_frame(t)[y:y+ch, x:x+cw]
-        
-        return clip_big.fl(lambda gf, t: zoom_in(t)).resize((w, h))
-    
-    elif motion_type == "zoom_out" or motion_type == "zoom_out_lento":
-        # Zoom OUT: empieza acercado, termina normal
-        def zoom_out(t):
-            progress = t / duration
-            current_scale = intensidad - (intensidad - 1.0) * progress
-            cw = int(w / current_scale)
-            ch = int(h / current_scale)
-            x = (big_w - cw) // 2
-            y = (big_h - ch) // 2
-            return clip_big.get_frame(t)[y:y+ch, x:x+cw]
-        
-        return clip_big.fl(lambda gf, t: zoom_out(t)).resize((w, h))
-    
-    elif motion_type in ("pan_left", "pan_izquierda"):
-        # Pan de derecha a izquierda
-        def pan_l(t):
-            progress = t / duration
-            offset_x = int((big_w - w) * (1 - progress))
-            offset_y = (big_h - h) // 2
-            return clip_big.get_frame(t)[offset_y:offset_y+h, offset_x:offset_x+w]
-        
-        return clip_big.fl(lambda gf, t: pan_l(t)).resize((w, h))
-    
-    elif motion_type in ("pan_right", "pan_derecha"):
-        # Pan de izquierda a derecha
-        def pan_r(t):
-            progress = t / duration
-            offset_x = int((big_w - w) * progress)
-            offset_y = (big_h - h) // 2
-            return clip_big.get_frame(t)[offset_y:offset_y+h, offset_x:offset_x+w]
-        
-        return clip_big.fl(lambda gf, t: pan_r(t)).resize((w, h))
-    
-    elif motion_type in ("ken_burns_up", "ken_burns_arriba"):
-        # Movimiento hacia arriba
-        def kb_up(t):
-            progress = t / duration
-            offset_x = (big_w - w) // 2
-            offset_y = int((big_h - h) * (1 - progress))
-            return clip_big.get_frame(t)[offset_y:offset_y+h, offset_x:offset_x+w]
-        
-        return clip_big.fl(lambda gf, t: kb_up(t)).resize((w, h))
-    
-    elif motion_type in ("ken_burns_down", "ken_burns_abajo"):
-        # Movimiento hacia abajo
-        def kb_down(t):
-            progress = t / duration
-            offset_x = (big_w - w) // 2
-            offset_y = int((big_h - h) * progress)
-            return clip_big.get_frame(t)[offset_y:offset_y+h, offset_x:offset_x+w]
-        
-        return clip_big.fl(lambda gf, t: kb_down(t)).resize((w, h))
+    # ImageClip ya tiene la imagen decodificada en memoria
+    fuente = clip.img if hasattr(clip, "img") else clip.get_frame(0)
+    
+    make_frame = crear_generador_frames(
+        fuente,
+        motion_type,
+        duration=duration,
+        intensidad=intensidad,
+        out_size=(w, h),
+    )
     
-    else:
-        # Static o desconocido: sin movimiento, solo centrar
-        clip_resized = clip.resize((w, h))
-        return clip_resized
+    if normalizar_motion(motion_type) == "static":
+        # Static o desconocido: sin movimiento, un solo frame
+        return ImageClip(make_frame(0)).set_duration(duration)
+    
+    return VideoClip(make_frame, duration=duration)
 
 
 def preparar_imagen(image_path: str, target_size: tuple = (OUTPUT_WIDTH, OUTPUT_HEIGHT)) -> str:
     """
-    Redimensiona y adapta imagen al aspect ratio 9:16.
+    Redimensiona y adapta imagen al aspect ratio 9:16 y la guarda como
+    _processed.png. El render ya no la necesita (usa el frame en memoria de
+    image_handoff); queda como artefacto opcional (GUARDAR_PROCESADAS=1).
     """
-    img = Image.open(image_path)
-    
-    # Calcular crop para 9:16
-    target_ratio = target_size[0] / target_size[1]
-    img_ratio = img.width / img.height
-    
-    if img_ratio > target_ratio:
-        # Imagen más ancha: crop horizontal
-        new_width = int(img.height * target_ratio)
-        left = (img.width - new_width) // 2
-        img = img.crop((left, 0, left + new_width, img.height))
-    else:
-        # Imagen más alta: crop vertical
-        new_height = int(img.width / target_ratio)
-        top = (img.height - new_height) // 2
-        img = img.crop((0, top, img.width, top + new_height))
-    
-    # Redimensionar al tamaño final
-    img = img.resize(target_size, Image.LANCZOS)
+    frame = obtener_encuadrada(image_path, target_size)
     
     # Guardar procesada
     processed_path = image_path.replace(".png", "_processed.png")
-    img.save(processed_path)
+    Image.fromarray(frame).save(processed_path)
     return processed_path
 
 
-def ensamblar_video(
+def planificar_timeline(
     script: dict,
     imagenes: list,
-    audio_path: str,
     edl: dict = None,
-    output_path: str = "assets/output/video_final.mp4",
+    duracion_total: float = None,
     usar_motions: bool = True,
-) -> str:
+    tiempos: list = None,
+) -> list:
     """
-    Ensambla el video final.
+    Arma el plan de render: qué imagen, cuánto dura y qué motion lleva cada segmento.
+    Es la misma timeline para todos los backends de render.
     
     Args:
         script: Guión estructurado
         imagenes: Lista de paths a imágenes
-        audio_path: Path al audio completo
         edl: Edit Decision List (opcional, para motions avanzados)
-        output_path: Path del video final
+        duracion_total: Duración del audio (para segmentos sin timestamps)
         usar_motions: Si aplica motions automáticos
+        tiempos: Duraciones reales del audio por segmento
+                 ([{"id", "inicio", "duracion"}], de generar_audio_del_script).
+                 Si se pasan, reemplazan a tiempo_inicio/tiempo_fin del guión
+                 (los segmentos sin narración vienen como silencio con su
+                 duración del guión). Un segmento que no está en tiempos o
+                 dura 0 se omite con un aviso.
     
     Returns:
-        Path al video generado
+        Lista de dicts {"indice", "imagen", "duracion", "motion", "intensidad"},
+        con "imagen" como frame uint8 ya encuadrado (no un path)
     """
     
     segmentos = script.get("segmentos", [])
     timeline = edl.get("timeline", []) if edl else []
-    
-    if len(imagenes) < len(segmentos):
-        print(f"⚠️  Hay {len(imagenes)} imágenes para {len(segmentos)} segmentos")
-    
-    # Cargar audio para obtener duración real
-    audio = AudioFileClip(audio_path)
-    duracion_total = audio.duration
-    
-    print(f"\n🎬 Ensamblando video...")
-    print(f"   Segmentos: {len(segmentos)}")
-    print(f"   Imágenes: {len(imagenes)}")
-    print(f"   Audio: {duracion_total:.1f}s")
-    
-    clips = []
+    duraciones_reales = {t["id"]: t["duracion"] for t in tiempos} if tiempos else None
+    plan = []
     
     for i, seg in enumerate(segmentos):
         if i >= len(imagenes):
             break
         
         # Calcular duración del segmento
-        dur = seg.get("tiempo_fin", 0) - seg.get("tiempo_inicio", 0)
-        if dur <= 0:
-            dur = duracion_total / len(segmentos)
-        
-        # Preparar imagen
-        img_path = preparar_imagen(imagenes[i])
+        if duraciones_reales is not None:
+            dur = duraciones_reales.get(seg.get("id"), 0)
+            if dur <= 0:
+                print(f"⚠️  Segmento {seg.get('id')} sin tiempo en el audio, se omite")
+                continue
+        else:
+            dur = seg.get("tiempo_fin", 0) - seg.get("tiempo_inicio", 0)
+            if dur <= 0:
+                dur = (duracion_total or 0) / len(segmentos)
         
-        # Crear clip de imagen
-        clip = ImageClip(img_path).set_duration(dur)
+        # Preparar imagen: frame 9:16 decodificado, en memoria si ya se publicó
+        with span("imagen.preparar", indice=i) as s:
+            frame = obtener_almacen().obtener(imagenes[i], (OUTPUT_WIDTH, OUTPUT_HEIGHT))
+            s["cache"] = "hit" if frame is not None else "miss"
+            if frame is None:
+                frame = publicar(imagenes[i])
+            if GUARDAR_PROCESADAS:
+                preparar_imagen(imagenes[i])
         
-        # Aplicar motion
+        motion_type = "static"
+        intensidad = 1.0
         if usar_motions:
             # Buscar motion en EDL primero, luego en script
             motion_type = "zoom_in_lento"  # default
@@ -219,50 +208,187 @@ def ensamblar_video(
                 motion_type = seg["motion"]
             
             print(f"   Seg {i+1}: {motion_type} ({dur:.1f}s)")
-            clip = aplicar_motion(clip, motion_type, intensidad)
-        else:
-            clip = clip.resize((OUTPUT_WIDTH, OUTPUT_HEIGHT))
+        
+        plan.append({
+            "indice": i,
+            "imagen": frame,
+            "duracion": dur,
+            "motion": motion_type,
+            "intensidad": intensidad,
+        })
+    
+    return plan
+
+
+def _ensamblar_moviepy(plan: list, audio_path: str, duracion: float, output_path: str, perfil: dict) -> str:
+    """
+    Backend MoviePy: compone los clips, exporta el video sin audio con
+    write_videofile y muxea la narración al final con ffmpeg.
+    """
+    
+    clips = []
+    for seg in plan:
+        # Crear clip de imagen con su motion
+        clip = ImageClip(seg["imagen"]).set_duration(seg["duracion"])
+        clip = aplicar_motion(clip, seg["motion"], seg["intensidad"],
+                              size=(perfil["width"], perfil["height"]))
         
         # Aplicar fade in/out para transiciones suaves
         clip = clip.fx(fadein, 0.3).fx(fadeout, 0.3)
         
         clips.append(clip)
     
-    if not clips:
-        print("❌ No hay clips para ensamblar")
-        return ""
-    
     # Concatenar clips
     print("   Concatenando clips...")
     video = concatenate_videoclips(clips, method="compose")
     
     # Ajustar duración al audio
-    if video.duration > duracion_total:
-        video = video.subclip(0, duracion_total)
+    if video.duration > duracion:
+        video = video.subclip(0, duracion)
+    
+    print(f"   Exportando video ({perfil['width']}x{perfil['height']})...")
+    solo_video = output_path + ".video.mp4"
+    try:
+        video.write_videofile(
+            solo_video,
+            fps=perfil["fps"],
+            codec="libx264",
+            audio=False,
+            bitrate=perfil["bitrate"],
+            preset=perfil["preset"],
+            threads=perfil["threads"],
+            logger=None,  # Silenciar output de ffmpeg
+        )
+        
+        # El audio recién entra acá, sin recodificar el video
+        with span("encode.mux"):
+            muxear_audio(solo_video, audio_path, output_path)
+    finally:
+        # Limpiar
+        video.close()
+        for c in clips:
+            c.close()
+        if os.path.exists(solo_video):
+            os.remove(solo_video)
     
-    # Agregar audio
-    video = video.set_audio(audio)
+    return output_path
+
+
+def ensamblar_video(
+    script: dict,
+    imagenes: list,
+    audio_path: str,
+    edl: dict = None,
+    output_path: str = "assets/output/video_final.mp4",
+    usar_motions: bool = True,
+    backend: str = "pipe",
+    paralelo: bool = False,
+    workers: int = None,
+    usar_cache: bool = None,
+    perfil="final",
+    tiempos: list = None,
+) -> str:
+    """
+    Ensambla el video final.
     
-    # Exportar
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    Args:
+        script: Guión estructurado
+        imagenes: Lista de paths a imágenes
+        audio_path: Path al audio completo
+        edl: Edit Decision List (opcional, para motions avanzados)
+        output_path: Path del video final
+        usar_motions: Si aplica motions automáticos
+        backend: "pipe" (frames NumPy directo a ffmpeg), "ffmpeg" (filtergraph
+                 nativo, sin Python por frame) o "moviepy".
+                 Si un backend ffmpeg falla, se usa MoviePy como fallback.
+        paralelo: Renderiza cada segmento en su propio proceso y concatena
+                  sin recodificar (solo backends ffmpeg)
+        workers: Procesos para el modo paralelo (default: uno por CPU)
+        usar_cache: Reutiliza los segmentos ya renderizados que no cambiaron
+                    (cache por contenido, solo backends ffmpeg). Renderiza por
+                    segmento + concat aunque no sea paralelo (default: RENDER_CACHE)
+        perfil: Perfil de render ("final", "draft") o dict con
+                width/height/fps/preset/bitrate/threads
+        tiempos: Duraciones reales por segmento (de generar_audio_del_script);
+                 si se pasan, la timeline coincide exacto con el audio
     
-    print(f"   Exportando video ({OUTPUT_WIDTH}x{OUTPUT_HEIGHT})...")
-    video.write_videofile(
-        output_path,
-        fps=FPS,
-        codec="libx264",
-        audio_codec="aac",
-        bitrate="5000k",
-        preset="medium",
-        threads=4,
-        logger=None,  # Silenciar output de ffmpeg
-    )
+    Returns:
+        Path al video generado
+    """
+    
+    segmentos = script.get("segmentos", [])
+    
+    if len(imagenes) < len(segmentos):
+        print(f"⚠️  Hay {len(imagenes)} imágenes para {len(segmentos)} segmentos")
+    
+    # Duración real del audio leída de los headers (el audio se muxea al final)
+    info_audio = probar_audio(audio_path)
+    duracion_total = info_audio["duracion"]
+    
+    print(f"\n🎬 Ensamblando video...")
+    print(f"   Segmentos: {len(segmentos)}")
+    print(f"   Imágenes: {len(imagenes)}")
+    print(f"   Audio: {duracion_total:.1f}s ({info_audio['sample_rate']} Hz, "
+          f"{info_audio['canales']} canal{'es' if info_audio['canales'] > 1 else ''})")
+    print(f"   Backend: {backend}")
+    
+    nombre_perfil = perfil if isinstance(perfil, str) else "custom"
+    perfil = obtener_perfil(perfil)
+    print(f"   Perfil: {nombre_perfil} ({perfil['width']}x{perfil['height']} @ {perfil['fps']}fps)")
+    
+    plan = planificar_timeline(script, imagenes, edl, duracion_total, usar_motions, tiempos)
+    
+    if not plan:
+        print("❌ No hay clips para ensamblar")
+        return ""
+    
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
-    # Limpiar
-    video.close()
-    audio.close()
-    for c in clips:
-        c.close()
+    if usar_cache is None:
+        usar_cache = RENDER_CACHE
+    
+    renderizado = False
+    if backend in BACKENDS_FFMPEG:
+        try:
+            print(f"   Renderizando con ffmpeg ({perfil['width']}x{perfil['height']})...")
+            if paralelo or usar_cache:
+                renderizar_segmentos_paralelo(
+                    plan,
+                    output_path,
+                    audio_path=audio_path,
+                    duracion_max=duracion_total,
+                    width=perfil["width"],
+                    height=perfil["height"],
+                    fps=perfil["fps"],
+                    bitrate=perfil["bitrate"],
+                    preset=perfil["preset"],
+                    workers=workers if paralelo else 1,
+                    backend=backend,
+                    cache=obtener_cache_render() if usar_cache else None,
+                )
+            else:
+                BACKENDS_FFMPEG[backend](
+                    plan,
+                    output_path,
+                    audio_path=audio_path,
+                    duracion_max=duracion_total,
+                    width=perfil["width"],
+                    height=perfil["height"],
+                    fps=perfil["fps"],
+                    bitrate=perfil["bitrate"],
+                    preset=perfil["preset"],
+                    threads=perfil["threads"],
+                )
+            renderizado = True
+        except (OSError, RuntimeError) as e:
+            print(f"⚠️  Falló el backend {backend} ({e}), usando MoviePy...")
+    
+    if not renderizado:
+        with span("render.moviepy", segmentos=len(plan)):
+            _ensamblar_moviepy(plan, audio_path, duracion_total, output_path, perfil)
+    
+    del plan
+    liberar(imagenes)
     
     print(f"\n✅ Video exportado: {output_path}")
     print(f"   Duración: {duracion_total:.1f}s")
@@ -0,0 +1,187 @@
+"""
+🎬 FacelessAI — Worker de trabajos
+==================================
+Proceso aparte que corre los trabajos que encola la web app (guión, EDL,
+refinamientos y pipelines completos), así la sesión de Streamlit no queda
+bloqueada y un refresh del navegador no pierde el trabajo.
+
+USO:
+  python worker.py
+  python worker.py --jobs 3 --cpu 2
+
+Los trabajos se guardan en una cola SQLite (JOBS_DB, default
+assets/jobs/cola.sqlite3) y cada pipeline escribe en assets/jobs/<job_id>/
+con checkpoints: si el worker se corta, al reiniciarlo retoma los trabajos
+que quedaron a medias desde la última etapa terminada.
+
+El worker usa las API keys del .env del servidor.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from main import pipeline, LIMITES_RECURSOS
+from modules.task_graph import Cupo
+from modules.job_queue import ColaJobs, CORRIENDO, TERMINADO, ERROR
+from modules.script_generator import (
+    REFINAR_MODO, generar_script, refinar_con_parche, refinar_script, segmentos_sucios,
+)
+from modules.editing_director import generar_edl
+
+
+JOBS_OUTPUT_DIR = os.getenv("JOBS_OUTPUT_DIR", "assets/jobs")
+POLL_SEGUNDOS = 1.0
+
+
+def _etapa_simple(cola: ColaJobs, job_id: str, etapa: str, semaforo, funcion):
+    """Corre una sola etapa ocupando un cupo del recurso y registra su progreso."""
+    with semaforo:
+        cola.actualizar_etapa(job_id, etapa, CORRIENDO)
+        resultado = funcion()
+    cola.actualizar_etapa(job_id, etapa, TERMINADO, resultado)
+
+
+def correr_pipeline(cola: ColaJobs, job: dict, semaforos: dict):
+    """Pipeline completo; cada etapa reporta inicio y resultado a la cola."""
+
+    def on_evento(evento, etapa, dato):
+        if evento == "inicio":
+            cola.actualizar_etapa(job["id"], etapa, CORRIENDO)
+        elif evento == "fin":
+            cola.actualizar_etapa(job["id"], etapa, TERMINADO, dato)
+        else:
+            cola.actualizar_etapa(job["id"], etapa, ERROR, str(dato))
+
+    params = dict(job["params"])
+    params.setdefault("streaming", False)  # Sin prefetch salvo que el trabajo lo pida, como en batch
+    pipeline(
+        **params,
+        output_dir=JOBS_OUTPUT_DIR,
+        run_id=job["id"],
+        recursos=semaforos,
+        on_evento=on_evento,
+    )
+
+
+def correr_script(cola: ColaJobs, job: dict, semaforos: dict):
+    p = job["params"]
+    _etapa_simple(cola, job["id"], "script", semaforos["llm"], lambda: generar_script(**p))
+
+
+def correr_edl(cola: ColaJobs, job: dict, semaforos: dict):
+    p = job["params"]
+    _etapa_simple(
+        cola, job["id"], "edl", semaforos["llm"],
+        lambda: generar_edl(p["script"], usar_cache=p.get("usar_cache"), director=p.get("director")),
+    )
+
+
+def correr_refinar(cola: ColaJobs, job: dict, semaforos: dict):
+    """Refinamiento (REFINAR_MODO): además del guión, deja qué segmentos cambiaron."""
+    p = job["params"]
+    with semaforos["llm"]:
+        cola.actualizar_etapa(job["id"], "script", CORRIENDO)
+        if (p.get("modo") or REFINAR_MODO) == "parche":
+            script, cambios = refinar_con_parche(p["script"], p["feedback"], usar_cache=p.get("usar_cache"))
+        else:
+            script = refinar_script(p["script"], p["feedback"], usar_cache=p.get("usar_cache"), modo=p.get("modo"))
+            cambios = segmentos_sucios(p["script"], script)
+    cola.actualizar_etapa(job["id"], "cambios", TERMINADO, cambios)
+    cola.actualizar_etapa(job["id"], "script", TERMINADO, script)
+
+
+TIPOS_JOB = {
+    "pipeline": correr_pipeline,
+    "script": correr_script,
+    "edl": correr_edl,
+    "refinar": correr_refinar,
+}
+
+
+def procesar(cola: ColaJobs, job: dict, semaforos: dict):
+    """Corre un trabajo y deja el resultado (o el error) en la cola."""
+    print(f"▶️  Job {job['id']} ({job['tipo']})")
+    inicio = time.time()
+    try:
+        handler = TIPOS_JOB.get(job["tipo"])
+        if handler is None:
+            raise ValueError(f"Tipo de trabajo desconocido: {job['tipo']}")
+        handler(cola, job, semaforos)
+    except Exception as e:
+        traceback.print_exc()
+        cola.terminar(job["id"], error=f"{type(e).__name__}: {e}")
+        print(f"❌ Job {job['id']} falló: {e}")
+        return
+    cola.terminar(job["id"])
+    print(f"✅ Job {job['id']} terminado en {time.time() - inicio:.1f}s")
+
+
+def correr_worker(max_jobs: int = 2, limites: dict = None, cola: ColaJobs = None):
+    """
+    Loop principal: toma trabajos pendientes mientras haya lugar.
+
+    Args:
+        max_jobs: Trabajos corriendo a la vez
+        limites: Cupos globales por recurso, compartidos por todos los trabajos
+                 (default: LIMITES_RECURSOS)
+        cola: Cola a usar (default: JOBS_DB)
+    """
+
+    cola = cola or ColaJobs()
+    limites = dict(limites or LIMITES_RECURSOS)
+    semaforos = {r: Cupo(n) for r, n in limites.items()}
+    lugares = threading.BoundedSemaphore(max_jobs)
+
+    reencolados = cola.reencolar_huerfanos()
+    if reencolados:
+        print(f"♻️  {reencolados} trabajos interrumpidos vuelven a la cola")
+
+    print(f"👷 Worker escuchando {cola.path} ({max_jobs} trabajos a la vez, cupos {limites})")
+
+    def correr(job):
+        try:
+            procesar(cola, job, semaforos)
+        finally:
+            lugares.release()
+
+    with ThreadPoolExecutor(max_workers=max_jobs) as pool:
+        while True:
+            lugares.acquire()
+            job = cola.tomar_siguiente()
+            if job is None:
+                lugares.release()
+                time.sleep(POLL_SEGUNDOS)
+                continue
+            pool.submit(correr, job)
+
+
+# === CLI ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker de trabajos de FacelessAI")
+    parser.add_argument("--jobs", type=int, default=2, help="Trabajos corriendo a la vez")
+    parser.add_argument("--llm", type=int, default=LIMITES_RECURSOS["llm"], help="Etapas de LLM simultáneas")
+    parser.add_argument("--imagenes", type=int, default=LIMITES_RECURSOS["imagenes"], help="Requests a DALL-E en vuelo (global)")
+    parser.add_argument("--tts", type=int, default=LIMITES_RECURSOS["tts"], help="Requests de TTS en vuelo (global)")
+    parser.add_argument("--cpu", type=int, default=LIMITES_RECURSOS["cpu"], help="Renders simultáneos")
+    args = parser.parse_args()
+
+    if not os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY") == "sk-tu-key-aqui":
+        print("❌ Configurá tu OPENAI_API_KEY en el archivo .env")
+        sys.exit(1)
+
+    try:
+        correr_worker(
+            max_jobs=args.jobs,
+            limites={"llm": args.llm, "imagenes": args.imagenes, "tts": args.tts, "cpu": args.cpu},
+        )
+    except KeyboardInterrupt:
+        print("\n👋 Worker detenido")